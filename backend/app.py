@@ -1,21 +1,37 @@
 import os
-import json
 import asyncio
 import logging
-from typing import AsyncGenerator, Optional
+import threading
+import time
+from typing import AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import quote
 
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Header, Query, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from dotenv import load_dotenv
+from pydantic import BaseModel, Field
 
 from utils.callbacks import AsyncQueueCallbackHandler
-from graph import build_super_graph
 from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
+from utils.artifacts import artifact_response, list_artifacts, resolve_artifact
 from utils.context import (
-    init_request_context, update_request_status
+    init_request_context, update_request_status, finish_request, get_request_metadata, record_metric,
+    current_request_id,
 )
+from utils.budget import LatencyBudget, with_budget
+from utils.tool_memo import ToolMemo, CONFIG_KEY as TOOL_MEMO_KEY
+from utils.passage_index import passage_index_for, CONFIG_KEY as PASSAGE_INDEX_KEY
+from utils.dedup import PageDeduplicator, CONFIG_KEY as DEDUP_KEY
+from utils.progress import init_progress
+from utils.profiling import PROFILING_ENABLED, start_profiling, finish_profiling
+from utils.registry import get_registry
+from utils.state_store import get_state_store, get_store_writer
+from utils.http_pool import model_client_kwargs, close_http_clients
+from utils.routing import analyze_task_complexity, direct_answer_messages
+from utils.team_pool import TEAM_EXECUTION, get_team_pool, shutdown_team_pool
+from utils.usage import UsageCallbackHandler
+from utils.sse import StreamEvent, StreamQueue, compress_stream, dumps, frame, negotiate_encoding, token_frame, unframe
 
 # Configure logging for hierarchical agent teams
 logging.basicConfig(
@@ -31,6 +47,111 @@ BAILIAN_API_KEY = os.getenv("BAILIAN_API_KEY")
 BAILIAN_BASE_URL = os.getenv("BAILIAN_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
 BAILIAN_MODEL = os.getenv("BAILIAN_MODEL", "Moonshot-Kimi-K2-Instruct")
 
+# Default end-to-end latency budget per request in seconds (0 disables it)
+REQUEST_LATENCY_BUDGET_S = float(os.getenv("REQUEST_LATENCY_BUDGET_S", "300"))
+
+# Record stream events in the shared state store so any worker can replay them
+STREAM_REPLAY = os.getenv("STREAM_REPLAY", "").lower() in {"1", "true", "yes"}
+STREAM_REPLAY_TTL = float(os.getenv("STATE_REQUEST_TTL", "3600"))
+
+# Build and compile the agent graphs in the background at startup
+WARMUP_GRAPHS = os.getenv("WARMUP_GRAPHS", "1").lower() in {"1", "true", "yes"}
+
+# Answer greetings and simple questions straight from the model, without the agent graph
+DIRECT_ANSWER_FAST_PATH = os.getenv("DIRECT_ANSWER_FAST_PATH", "1").lower() in {"1", "true", "yes"}
+
+# Limits of /api/chat/batch: items per batch, and concurrent model calls or graph runs per stage
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+# /api/chat/ws: streams one connection may run at once, and events a stream may send before the client grants more
+WS_MAX_STREAMS = int(os.getenv("WS_MAX_STREAMS", "32"))
+WS_STREAM_WINDOW = int(os.getenv("WS_STREAM_WINDOW", "256"))
+
+_streaming_llm = None
+_streaming_graph = None
+_streaming_graph_lock = threading.Lock()
+
+
+def get_streaming_llm():
+    """Return the process-wide streaming chat model shared by the graph and the direct-answer path.
+
+    ``LLM_RECORD_PATH`` records its responses and ``LLM_REPLAY_PATH`` replays
+    them instead of calling the provider (see ``utils.llm_replay``).
+    """
+    global _streaming_llm
+    if _streaming_llm is None:
+        with _streaming_graph_lock:
+            if _streaming_llm is None:
+                from langchain_openai import ChatOpenAI
+                from utils.llm_replay import model_from_env
+
+                _streaming_llm = model_from_env(lambda: ChatOpenAI(
+                    api_key=BAILIAN_API_KEY,
+                    base_url=BAILIAN_BASE_URL,
+                    model=BAILIAN_MODEL,
+                    temperature=0.3,
+                    streaming=True,
+                    # Usage arrives in a final chunk; it carries the prompt-cache hits
+                    stream_usage=True,
+                    **model_client_kwargs(),
+                ), streaming=True)
+    return _streaming_llm
+
+
+def get_streaming_graph():
+    """Return the process-wide compiled super graph, building it on first use.
+
+    The model, LangGraph stack and tool dependencies are imported here rather
+    than at module import so workers start quickly. Per-request callbacks are
+    passed in the run config, so one compiled graph serves every request.
+    """
+    global _streaming_graph
+    if _streaming_graph is None:
+        llm_stream = get_streaming_llm()
+        with _streaming_graph_lock:
+            if _streaming_graph is None:
+                from graph import build_super_graph
+                from utils.checkpoints import StoreCheckpointSaver
+
+                # Stage checkpoints go to the shared store, so any worker can look up a run's state
+                _streaming_graph = build_super_graph(llm_stream, StoreCheckpointSaver())
+    return _streaming_graph
+
+
+async def stream_direct_answer(llm, message: str, queue: asyncio.Queue[StreamEvent], callbacks: Optional[list] = None) -> bool:
+    """Stream a direct answer into ``queue`` as final-team tokens.
+
+    Returns ``False`` when the model failed or said nothing before the first
+    token, so the caller can fall back to the full graph; errors after the
+    first token propagate.
+    """
+    sent = False
+    try:
+        async for chunk in llm.astream(direct_answer_messages(message), {"callbacks": callbacks or []}):
+            if chunk.content:
+                await queue.put(token_frame(str(chunk.content), "final", "direct_answer"))
+                sent = True
+    except Exception as e:
+        if sent:
+            raise
+        logger.warning(f"Direct answer failed before the first token: {e}")
+        return False
+    if sent:
+        await queue.put(dumps({"type": "end"}))
+    return sent
+
+
+def build_run_config(conversation_id: Optional[str], budget: Optional[LatencyBudget], callbacks: list) -> dict:
+    """Run config of one graph run: checkpoint thread, latency budget, tool memo, passage index, page dedup and callbacks."""
+    run_config = with_budget(None, budget)
+    run_config["configurable"]["thread_id"] = current_request_id.get()
+    run_config["configurable"][TOOL_MEMO_KEY] = ToolMemo()
+    run_config["configurable"][PASSAGE_INDEX_KEY] = passage_index_for(conversation_id)
+    run_config["configurable"][DEDUP_KEY] = PageDeduplicator()
+    run_config["callbacks"] = callbacks
+    return run_config
+
 app = FastAPI(
     title="Hierarchical Agent Teams",
     description="AI-powered hierarchical agent coordination system",
@@ -47,6 +168,35 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def warm_up() -> None:
+    """Precompile the agent graphs off the event loop so the first request does not pay for it."""
+    if TEAM_EXECUTION == "process":
+        # Workers build their own team graphs while starting
+        await asyncio.to_thread(lambda: get_team_pool().wait_ready())
+    if not WARMUP_GRAPHS:
+        return
+
+    async def build() -> None:
+        try:
+            await asyncio.to_thread(get_streaming_graph)
+            logger.info("Agent graphs warmed up")
+        except Exception as e:
+            logger.warning(f"Graph warm-up failed, building on first request instead: {e}")
+
+    asyncio.create_task(build())
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    await close_http_clients()
+    await asyncio.to_thread(shutdown_team_pool)
+    # Let queued request records and replay events reach the state store
+    writer = get_store_writer()
+    if not writer.store.local:
+        await asyncio.to_thread(writer.flush, 10)
+
+
 @app.get("/api/health")
 async def health() -> dict:
     """Health check endpoint for hierarchical agent teams."""
@@ -67,83 +217,223 @@ async def health() -> dict:
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
 
+@app.get("/api/requests")
+async def list_requests(
+    limit: int = Query(50, ge=1, le=500, description="Maximum requests per section"),
+) -> dict:
+    """Active and recently finished requests handled by this worker, with team/node and timings."""
+    return get_registry().snapshot(limit)
+
+
+@app.get("/api/requests/{request_id}")
+async def get_request(request_id: str) -> dict:
+    """Look up one request, falling back to the shared state store for runs on other workers."""
+    entry = get_registry().get(request_id)
+    if entry is None:
+        entry = await asyncio.to_thread(get_state_store().get_json, f"request:{request_id}")
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Unknown request: {request_id}")
+    return entry
+
+
+@app.get("/api/requests/{request_id}/state")
+async def get_request_state(request_id: str) -> dict:
+    """Latest super graph checkpoint of a run handled by any worker: its step, the stages still to run and the messages so far."""
+    from utils.checkpoints import StoreCheckpointSaver
+
+    saved = await StoreCheckpointSaver().aget_tuple({"configurable": {"thread_id": request_id}})
+    if saved is None:
+        raise HTTPException(status_code=404, detail=f"No checkpoint for request: {request_id}")
+    values = saved.checkpoint["channel_values"]
+    return {
+        "request_id": request_id,
+        "checkpoint_id": saved.checkpoint["id"],
+        "step": saved.metadata.get("step"),
+        "next": sorted(key[len("branch:to:"):] for key in values if key.startswith("branch:to:")),
+        "research_done": bool(values.get("research_done")),
+        "writing_done": bool(values.get("writing_done")),
+        "messages": [
+            {"type": m.type, "name": getattr(m, "name", None), "content": str(m.content)}
+            for m in values.get("messages", [])
+        ],
+    }
+
+
+def _load_profile(request_id: str) -> dict:
+    report = get_state_store().get_json(f"profile:{request_id}")
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"No profile for request: {request_id}")
+    return report
+
+
+@app.get("/api/admin/profiles")
+async def list_profiles() -> dict:
+    """Request ids with a stored profile."""
+    keys = await asyncio.to_thread(get_state_store().keys, "profile:")
+    return {"profiles": [key[len("profile:"):] for key in keys]}
+
+
+@app.get("/api/admin/profiles/{request_id}")
+async def get_profile(request_id: str) -> dict:
+    """Time split by team/node (CPU versus waiting), hottest functions and allocation growth for a profiled run."""
+    report = dict(await asyncio.to_thread(_load_profile, request_id))
+    report.pop("folded", None)
+    return report
+
+
+@app.get("/api/admin/profiles/{request_id}/folded")
+async def get_profile_folded(request_id: str) -> PlainTextResponse:
+    """Sampled stacks in folded format, prefixed with team and node, for flame graph tools."""
+    return PlainTextResponse(
+        (await asyncio.to_thread(_load_profile, request_id))["folded"],
+        headers={"Content-Disposition": f'attachment; filename="profile-{request_id}.folded"'},
+    )
+
+
+async def start_chat_run(
+    message: str,
+    conversation_id: Optional[str] = None,
+    budget_s: Optional[float] = None,
+    profile: bool = False,
+    max_queued: int = 0,
+) -> Tuple[str, StreamQueue, Callable[[], Awaitable[None]]]:
+    """Set up one chat request in the current context.
+
+    Returns its id, the queue its stream events arrive on (JSON strings,
+    pre-framed token events, then ``"[DONE]"``) and the producer coroutine
+    function that runs it. With ``max_queued`` the run pauses while that
+    many events wait in the queue. Shared by the SSE and WebSocket transports.
+    """
+    request_id = init_request_context(conversation_id, message)
+    logger.info(f"Processing hierarchical agent request: {request_id}")
+
+    queue = StreamQueue(max_queued)
+    handler = AsyncQueueCallbackHandler(queue)
+    progress = init_progress(queue)
+
+    # Classify before touching the graph: trivial messages never load or run it
+    direct_llm = None
+    try:
+        if DIRECT_ANSWER_FAST_PATH and analyze_task_complexity(message) == "direct_answer":
+            direct_llm = _streaming_llm or await asyncio.to_thread(get_streaming_llm)
+            streaming_graph = None
+        else:
+            streaming_graph = await asyncio.to_thread(get_streaming_graph)
+    except BaseException:
+        finish_request("failed")
+        raise
+
+    async def producer() -> None:
+        """Execute hierarchical agent workflow with comprehensive error handling."""
+        nonlocal streaming_graph
+        total_budget = REQUEST_LATENCY_BUDGET_S if budget_s is None else budget_s
+        budget = LatencyBudget(total_budget) if total_budget > 0 else None
+        profiler = start_profiling(request_id) if profile else None
+        usage = UsageCallbackHandler()
+        try:
+            update_request_status("processing")
+
+            if direct_llm is not None:
+                record_metric("fast_path", "direct_answer")
+                if await stream_direct_answer(direct_llm, message, queue, [usage]):
+                    update_request_status("completed")
+                    return
+                logger.info(f"Falling back to the agent graph [{request_id}]")
+                streaming_graph = await asyncio.to_thread(get_streaming_graph)
+
+            # Execute hierarchical agent teams workflow
+            callbacks = [handler, usage, profiler.handler] if profiler else [handler, usage]
+            run_config = build_run_config(conversation_id, budget, callbacks)
+            await streaming_graph.ainvoke({
+                "messages": [HumanMessage(content=message)],
+                "metadata": {"conversation_id": conversation_id, "request_id": request_id},
+            }, run_config)
+            
+            update_request_status("completed")
+            logger.info(f"Hierarchical agent workflow completed: {request_id}")
+            
+        except Exception as e:
+            logger.error(f"Hierarchical agent workflow failed [{request_id}]: {e}")
+            update_request_status("failed")
+            
+            error_data = {
+                "type": "error",
+                "message": str(e)
+            }
+            await queue.put(dumps(error_data))
+        finally:
+            # Cancelled runs skip the except above
+            finish_request("cancelled")
+            if progress and progress.dropped:
+                logger.info(f"Dropped {progress.dropped} rate-limited progress events [{request_id}]")
+            # Final event: latency budget consumption and request metrics
+            metadata = get_request_metadata()
+            summary = {
+                "type": "summary",
+                "request_id": request_id,
+                "status": metadata.get("status"),
+                "metrics": metadata.get("metrics", {}),
+            }
+            if budget:
+                summary["budget"] = budget.report()
+            if profiler:
+                await asyncio.to_thread(finish_profiling, profiler)
+                summary["profile"] = f"/api/admin/profiles/{request_id}"
+            if await asyncio.to_thread(list_artifacts, request_id):
+                summary["artifacts"] = f"/api/artifacts/{request_id}"
+            await queue.put(dumps(summary))
+            await queue.put("[DONE]")
+
+    return request_id, queue, producer
+
+
 @app.get("/api/chat/stream")
 async def chat_stream(
     message: str = Query(..., min_length=1, description="User message for hierarchical agent processing"),
     conversation_id: Optional[str] = Query(None, description="Optional conversation identifier"),
+    budget_s: Optional[float] = Query(None, ge=0, description="Latency budget in seconds, 0 to disable"),
+    profile: bool = Query(False, description="Profile this run (requires PROFILING_ENABLED)"),
+    x_profile: Optional[str] = Header(None, description="Set to 1 to profile this run"),
+    accept_encoding: Optional[str] = Header(None),
 ) -> StreamingResponse:
     request_id = None
+    profile = PROFILING_ENABLED and (profile or (x_profile or "").lower() in {"1", "true", "yes"})
+    encoding = negotiate_encoding(accept_encoding)
     
     try:
-        request_id = init_request_context(conversation_id, message)
-        logger.info(f"Processing hierarchical agent request: {request_id}")
-        
-        queue: asyncio.Queue[str] = asyncio.Queue()
-        handler = AsyncQueueCallbackHandler(queue)
-
-        llm_stream = ChatOpenAI(
-            api_key=BAILIAN_API_KEY,
-            base_url=BAILIAN_BASE_URL,
-            model=BAILIAN_MODEL,
-            temperature=0.3,
-            streaming=True,
-            callbacks=[handler],
-        )
-        streaming_graph = build_super_graph(llm_stream)
-
-        async def producer() -> None:
-            """Execute hierarchical agent workflow with comprehensive error handling."""
-            try:
-                update_request_status("processing")
-                
-                # Execute hierarchical agent teams workflow
-                await streaming_graph.ainvoke({
-                    "messages": [HumanMessage(content=message)],
-                    "metadata": {"conversation_id": conversation_id, "request_id": request_id},
-                })
-                
-                update_request_status("completed")
-                logger.info(f"Hierarchical agent workflow completed: {request_id}")
-                
-            except Exception as e:
-                logger.error(f"Hierarchical agent workflow failed [{request_id}]: {e}")
-                update_request_status("failed")
-                
-                error_data = {
-                    "type": "error",
-                    "message": str(e)
-                }
-                await queue.put(json.dumps(error_data, ensure_ascii=False))
-            finally:
-                await queue.put("[DONE]")
+        request_id, queue, producer = await start_chat_run(message, conversation_id, budget_s, profile)
 
         async def event_publisher() -> AsyncGenerator[bytes, None]:
             """Stream hierarchical agent execution events to client."""
             asyncio.create_task(producer())
+            writer = get_store_writer() if STREAM_REPLAY else None
             while True:
                 try:
                     chunk = await queue.get()
+                    if writer is not None:
+                        writer.append(f"stream:{request_id}", unframe(chunk), STREAM_REPLAY_TTL)
+                    yield frame(chunk)
                     if chunk == "[DONE]":
-                        yield b"data: [DONE]\n\n"
                         break
-                    yield f"data: {chunk}\n\n".encode("utf-8")
                 except Exception as e:
                     logger.error(f"Streaming error [{request_id}]: {e}")
-                    error_event = json.dumps({
+                    yield frame(dumps({
                         "type": "stream_error",
                         "error": str(e)
-                    })
-                    yield f"data: {error_event}\n\n".encode("utf-8")
+                    }))
                     break
 
+        headers = {
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Request-ID": request_id or "unknown"
+        }
+        if encoding:
+            headers.update({"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
         return StreamingResponse(
-            event_publisher(), 
+            compress_stream(event_publisher(), encoding),
             media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "X-Request-ID": request_id or "unknown"
-            }
+            headers=headers
         )
         
     except Exception as e:
@@ -152,3 +442,375 @@ async def chat_stream(
             status_code=500,
             detail=f"Hierarchical agent system initialization failed: {str(e)}"
         )
+
+
+@app.get("/api/chat/replay/{request_id}")
+async def chat_replay(
+    request_id: str,
+    after: int = Query(0, ge=0, description="Number of events the client has already received"),
+    accept_encoding: Optional[str] = Header(None),
+) -> StreamingResponse:
+    """Replay a recorded stream from the shared state store, following it until it finishes.
+
+    Works from any worker, so a client can resume a stream after reconnecting elsewhere.
+    """
+    store = get_state_store()
+    if not STREAM_REPLAY:
+        raise HTTPException(status_code=404, detail="Stream replay is disabled")
+    if await asyncio.to_thread(store.get, f"request:{request_id}") is None:
+        raise HTTPException(status_code=404, detail=f"Unknown request: {request_id}")
+
+    async def replay_publisher() -> AsyncGenerator[bytes, None]:
+        position = after
+        idle_after_finish = 0
+        while True:
+            events = await asyncio.to_thread(store.range, f"stream:{request_id}", position)
+            for chunk in events:
+                yield frame(chunk)
+                if chunk == "[DONE]":
+                    return
+            position += len(events)
+            metadata = await asyncio.to_thread(store.get_json, f"request:{request_id}") or {}
+            if not events and metadata.get("status") not in ("active", "processing"):
+                # Allow in-flight events to land before giving up on a finished run
+                idle_after_finish += 1
+                if idle_after_finish > 3:
+                    yield frame("[DONE]")
+                    return
+            await asyncio.sleep(0.2)
+
+    encoding = negotiate_encoding(accept_encoding)
+    headers = {"Cache-Control": "no-cache", "X-Request-ID": request_id}
+    if encoding:
+        headers.update({"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+    return StreamingResponse(
+        compress_stream(replay_publisher(), encoding),
+        media_type="text/event-stream",
+        headers=headers,
+    )
+
+
+@app.get("/api/artifacts/{request_id}")
+async def list_request_artifacts(request_id: str) -> dict:
+    """Files a request generated in its workspace (documents, outlines, charts) with download links."""
+    artifacts = await asyncio.to_thread(list_artifacts, request_id)
+    if artifacts is None:
+        raise HTTPException(status_code=404, detail=f"No artifacts for request: {request_id}")
+    for artifact in artifacts:
+        artifact["url"] = f"/api/artifacts/{request_id}/{quote(artifact['name'])}"
+    return {"request_id": request_id, "artifacts": artifacts}
+
+
+@app.api_route("/api/artifacts/{request_id}/{file_name:path}", methods=["GET", "HEAD"])
+async def download_artifact(request_id: str, file_name: str, request: Request) -> Response:
+    """Download one generated file, with ETag revalidation, byte ranges and gzip for text files."""
+    path = await asyncio.to_thread(resolve_artifact, request_id, file_name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Unknown artifact: {file_name}")
+    return await artifact_response(path, request.headers)
+
+
+class BatchItem(BaseModel):
+    message: str = Field(..., min_length=1)
+    id: Optional[str] = None
+    conversation_id: Optional[str] = None
+
+
+class BatchRequest(BaseModel):
+    messages: List[Union[str, BatchItem]] = Field(..., min_length=1, description="Messages, as strings or items with an id")
+    concurrency: Optional[int] = Field(None, ge=1, description="Concurrent model calls or graph runs per stage")
+    budget_s: Optional[float] = Field(None, ge=0, description="Latency budget per graph run in seconds, 0 to disable")
+
+
+@app.post("/api/chat/batch")
+async def chat_batch(batch: BatchRequest, accept_encoding: Optional[str] = Header(None)) -> StreamingResponse:
+    """Answer many independent messages, streaming one JSON line per result as it completes.
+
+    All messages are classified up front. Direct answers go to the model as
+    one ``abatch`` with bounded concurrency; the rest run through the agent
+    graph, up to ``concurrency`` at a time, each as its own request. The last
+    line is a summary with throughput.
+    """
+    if len(batch.messages) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} messages per batch")
+    items = [BatchItem(message=m) if isinstance(m, str) else m for m in batch.messages]
+    for index, item in enumerate(items):
+        if item.id is None:
+            item.id = str(index)
+    concurrency = min(batch.concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    total_budget = REQUEST_LATENCY_BUDGET_S if batch.budget_s is None else batch.budget_s
+    batch_id = init_request_context(None, f"batch of {len(items)} messages")
+    routes = [analyze_task_complexity(item.message) for item in items]
+    direct = [i for i, route in enumerate(routes) if DIRECT_ANSWER_FAST_PATH and route == "direct_answer"]
+    results: asyncio.Queue[dict] = asyncio.Queue()
+    usages: List[UsageCallbackHandler] = []
+    graph_slots = asyncio.Semaphore(concurrency)
+    tasks: List[asyncio.Task] = []
+
+    async def run_graph(index: int, fallback: bool = False) -> None:
+        # Runs in its own task, so the request context below belongs to this item only
+        item = items[index]
+        result = {"type": "result", "index": index, "id": item.id, "route": routes[index]}
+        if fallback:
+            result["fallback"] = True
+        try:
+            async with graph_slots:
+                started = time.perf_counter()
+                request_id = init_request_context(item.conversation_id, item.message)
+                result["request_id"] = request_id
+                usage = UsageCallbackHandler()
+                usages.append(usage)
+                try:
+                    update_request_status("processing")
+                    graph = await asyncio.to_thread(get_streaming_graph)
+                    budget = LatencyBudget(total_budget) if total_budget > 0 else None
+                    state = await graph.ainvoke({
+                        "messages": [HumanMessage(content=item.message)],
+                        "metadata": {"conversation_id": item.conversation_id, "request_id": request_id},
+                    }, build_run_config(item.conversation_id, budget, [usage]))
+                    result["output"] = str(state["messages"][-1].content)
+                    update_request_status("completed")
+                except Exception as e:
+                    logger.error(f"Batch item {item.id} failed [{request_id}]: {e}")
+                    update_request_status("failed")
+                    result["error"] = str(e)
+                finally:
+                    finish_request("cancelled")
+                result["status"] = get_request_metadata().get("status")
+                result["latency_s"] = round(time.perf_counter() - started, 3)
+                result["metrics"] = get_request_metadata().get("metrics", {})
+                if await asyncio.to_thread(list_artifacts, request_id):
+                    result["artifacts"] = f"/api/artifacts/{request_id}"
+        except Exception as e:
+            result.setdefault("status", "failed")
+            result.setdefault("error", str(e))
+        await results.put(result)
+
+    async def run_direct() -> None:
+        # One batched model call for every direct answer; failed or empty answers fall back to the graph
+        if not direct:
+            return
+        handlers = [UsageCallbackHandler() for _ in direct]
+        usages.extend(handlers)
+        pending = set(range(len(direct)))
+        started = time.perf_counter()
+        try:
+            llm = _streaming_llm or await asyncio.to_thread(get_streaming_llm)
+            answers = llm.abatch_as_completed(
+                [direct_answer_messages(items[i].message) for i in direct],
+                [{"callbacks": [handler], "max_concurrency": concurrency} for handler in handlers],
+                return_exceptions=True,
+            )
+            async for position, output in answers:
+                pending.discard(position)
+                index = direct[position]
+                if isinstance(output, Exception) or not output.content:
+                    logger.info(f"Direct answer for batch item {items[index].id} failed, running the agent graph: {output!r:.200}")
+                    tasks.append(asyncio.create_task(run_graph(index, fallback=True)))
+                    continue
+                await results.put({
+                    "type": "result",
+                    "index": index,
+                    "id": items[index].id,
+                    "route": "direct_answer",
+                    "status": "completed",
+                    "output": str(output.content),
+                    "latency_s": round(time.perf_counter() - started, 3),
+                    "usage": dict(handlers[position].totals),
+                })
+        except Exception as e:
+            logger.error(f"Batched direct answers failed, running the agent graph instead: {e}")
+            for position in pending:
+                tasks.append(asyncio.create_task(run_graph(direct[position], fallback=True)))
+
+    async def result_publisher() -> AsyncGenerator[bytes, None]:
+        started = time.perf_counter()
+        update_request_status("processing")
+        tasks.append(asyncio.create_task(run_direct()))
+        graph_items = set(range(len(items))) - set(direct)
+        tasks.extend(asyncio.create_task(run_graph(i)) for i in sorted(graph_items))
+        completed = failed = 0
+        try:
+            for _ in range(len(items)):
+                result = await results.get()
+                if result.get("status") == "completed":
+                    completed += 1
+                else:
+                    failed += 1
+                yield dumps(result).encode("utf-8") + b"\n"
+            elapsed = time.perf_counter() - started
+            usage = {key: sum(u.totals[key] for u in usages) for key in ("llm_calls", "input_tokens", "output_tokens", "cached_tokens")}
+            routes_taken = {route: routes.count(route) for route in set(routes)}
+            summary = {
+                "type": "summary",
+                "batch_id": batch_id,
+                "items": len(items),
+                "completed": completed,
+                "failed": failed,
+                "routes": routes_taken,
+                "elapsed_s": round(elapsed, 3),
+                "items_per_s": round(len(items) / elapsed, 2) if elapsed else None,
+                "output_tokens_per_s": round(usage["output_tokens"] / elapsed, 1) if elapsed else None,
+                "llm_usage": usage,
+            }
+            record_metric("batch", {k: summary[k] for k in ("items", "completed", "failed", "items_per_s")})
+            record_metric("llm_usage", usage)
+            update_request_status("completed" if not failed else "failed")
+            yield dumps(summary).encode("utf-8") + b"\n"
+        finally:
+            # A client that disconnects cancels the rest of the batch
+            finish_request("cancelled")
+            for task in tasks:
+                task.cancel()
+
+    encoding = negotiate_encoding(accept_encoding)
+    headers = {"Cache-Control": "no-cache", "X-Request-ID": batch_id}
+    if encoding:
+        headers.update({"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+    return StreamingResponse(
+        compress_stream(result_publisher(), encoding),
+        media_type="application/x-ndjson",
+        headers=headers,
+    )
+
+
+class _SocketStream:
+    """Flow-control state of one chat stream multiplexed over a WebSocket."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.credit = window
+        self.granted = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def grant(self, events: int) -> None:
+        self.credit += events
+        self.granted.set()
+
+    async def spend(self) -> None:
+        while self.credit <= 0:
+            self.granted.clear()
+            await self.granted.wait()
+        self.credit -= 1
+
+
+@app.websocket("/api/chat/ws")
+async def chat_socket(websocket: WebSocket) -> None:
+    """Many chat streams over one WebSocket, each with its own flow control.
+
+    Client messages are JSON objects:
+    ``{"type": "start", "stream": "s1", "message": "...", "conversation_id": ..., "budget_s": ..., "window": 256}``
+    starts a stream, ``{"type": "credit", "stream": "s1", "events": 128}`` lets
+    it send that many more events and ``{"type": "cancel", "stream": "s1"}``
+    stops it. The server answers ``{"stream": "s1", "request_id": ...}`` and
+    then ``{"stream": "s1", "event": ...}`` for every event ``/api/chat/stream``
+    would send as ``data:``, ending with ``"[DONE]"``. A stream out of credit
+    waits without holding up the others.
+    """
+    await websocket.accept()
+    streams: Dict[str, _SocketStream] = {}
+    send_lock = asyncio.Lock()
+
+    async def send(text: str) -> None:
+        async with send_lock:
+            await websocket.send_text(text)
+
+    async def send_error(stream_id: Optional[str], message: str) -> None:
+        await send(dumps({"type": "error", "stream": stream_id, "message": message}))
+
+    async def run_stream(stream_id: str, state: _SocketStream, start: dict) -> None:
+        # Runs in its own task, so the request context set up below belongs to this stream only
+        producer_task = None
+        request_id = None
+        queue = None
+        prefix = '{"stream":' + dumps(stream_id) + ',"event":'
+        try:
+            # A stream out of credit pauses its run once a window of events is waiting
+            request_id, queue, producer = await start_chat_run(
+                start["message"], start.get("conversation_id"), start.get("budget_s"), max_queued=state.window,
+            )
+            await send(dumps({"stream": stream_id, "request_id": request_id}))
+            producer_task = asyncio.create_task(producer())
+            writer = get_store_writer() if STREAM_REPLAY else None
+            while True:
+                # Events wait in the bounded queue, not here, while the stream has no credit
+                await state.spend()
+                chunk = await queue.get()
+                payload = unframe(chunk)
+                if writer is not None:
+                    writer.append(f"stream:{request_id}", payload, STREAM_REPLAY_TTL)
+                if chunk == "[DONE]":
+                    await send(prefix + '"[DONE]"}')
+                    break
+                await send(prefix + payload + "}")
+        except asyncio.CancelledError:
+            if producer_task:
+                producer_task.cancel()
+            if request_id:
+                update_request_status("cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"WebSocket stream {stream_id} failed [{request_id}]: {e}")
+            if producer_task:
+                producer_task.cancel()
+            try:
+                await send(prefix + dumps({"type": "stream_error", "error": str(e)}) + "}")
+                await send(prefix + '"[DONE]"}')
+            except Exception:
+                pass
+        finally:
+            if queue is not None:
+                # Unblock a run paused on a full queue; nothing reads it any more
+                queue.close()
+            streams.pop(stream_id, None)
+
+    async def handle_control(control: dict) -> None:
+        kind = control.get("type")
+        stream_id = control.get("stream")
+        stream_id = str(stream_id) if stream_id is not None else None
+        state = streams.get(stream_id)
+        if kind == "start":
+            message = control.get("message")
+            if not stream_id or state is not None:
+                await send_error(stream_id, "A new stream needs an unused stream id")
+            elif not isinstance(message, str) or not message:
+                await send_error(stream_id, "A stream needs a non-empty message")
+            elif len(streams) >= WS_MAX_STREAMS:
+                await send_error(stream_id, f"At most {WS_MAX_STREAMS} streams per connection")
+            else:
+                state = _SocketStream(max(1, int(control.get("window") or WS_STREAM_WINDOW)))
+                streams[stream_id] = state
+                state.task = asyncio.create_task(run_stream(stream_id, state, control))
+        elif kind == "credit" and state is not None:
+            state.grant(max(0, int(control.get("events") or 0)))
+        elif kind == "cancel" and state is not None and not state.task.done():
+            state.task.cancel()
+            await asyncio.wait([state.task])
+            prefix = '{"stream":' + dumps(stream_id) + ',"event":'
+            await send(prefix + dumps({"type": "cancelled"}) + "}")
+            await send(prefix + '"[DONE]"}')
+        elif kind in ("credit", "cancel"):
+            pass  # The stream already finished
+        else:
+            await send_error(stream_id, f"Unknown message type: {kind}")
+
+    try:
+        while True:
+            try:
+                control = await websocket.receive_json()
+            except (ValueError, KeyError):
+                await send_error(None, "Messages must be JSON text")
+                continue
+            if not isinstance(control, dict):
+                await send_error(None, "Messages must be JSON objects")
+                continue
+            try:
+                await handle_control(control)
+            except (TypeError, ValueError) as e:
+                await send_error(control.get("stream"), f"Invalid message: {e}")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Closing the connection cancels its streams
+        for state in list(streams.values()):
+            state.task.cancel()
@@ -0,0 +1,222 @@
+"""Offline batch evaluation of routing, output and cost through ``build_super_graph``.
+
+Runs every prompt of a JSONL file (``{"id": ..., "prompt": ...}`` per line)
+through the super graph with bounded parallelism and writes one result line
+per prompt: route taken, model calls, tokens, latency and output. Run from
+``backend/``:
+
+	# Live run against the configured model, recording its responses
+	python -m benchmarks.batch_eval run prompts.jsonl -o baseline.jsonl --record responses.jsonl
+	# Offline, deterministic re-run from the recorded responses
+	python -m benchmarks.batch_eval run prompts.jsonl -o candidate.jsonl --replay responses.jsonl
+	# Compare two runs
+	python -m benchmarks.batch_eval diff baseline.jsonl candidate.jsonl
+"""
+from __future__ import annotations
+
+import argparse
+import difflib
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+
+from utils.budget import LatencyBudget, with_budget
+from utils.context import get_request_metadata, init_request_context, update_request_status
+from utils.dedup import CONFIG_KEY as DEDUP_KEY, PageDeduplicator
+from utils.passage_index import CONFIG_KEY as PASSAGE_INDEX_KEY, PassageIndex
+from utils.tool_memo import CONFIG_KEY as TOOL_MEMO_KEY, ToolMemo
+from utils.usage import usage_of
+
+# Top-level super graph nodes that make up the route
+ROUTE_NODES = {"supervisor", "research_team", "writing_team"}
+
+
+class UsageCounter(BaseCallbackHandler):
+	"""Counts model calls and tokens for one graph run."""
+
+	def __init__(self):
+		self.llm_calls = 0
+		self.prompt_tokens = 0
+		self.completion_tokens = 0
+		self.cached_tokens = 0
+		self._lock = threading.Lock()
+
+	def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, **kwargs: Any) -> None:
+		with self._lock:
+			self.llm_calls += 1
+
+	def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+		for generations in response.generations:
+			for generation in generations:
+				usage = usage_of(getattr(generation, "message", None))
+				with self._lock:
+					self.prompt_tokens += usage["input_tokens"]
+					self.completion_tokens += usage["output_tokens"]
+					self.cached_tokens += usage["cached_tokens"]
+
+
+def load_jsonl(path: str) -> List[Dict[str, Any]]:
+	with open(path, encoding="utf-8") as f:
+		return [json.loads(line) for line in f if line.strip()]
+
+
+def build_model(record: str = "", replay: str = "", replay_delay: str = "zero"):
+	"""The live model, optionally wrapped to record its responses, or a replay model."""
+	from utils.llm_replay import RecordedChatModel
+
+	if replay:
+		return RecordedChatModel(path=replay, replay_delay=replay_delay)
+	from langchain_openai import ChatOpenAI
+	from utils.http_pool import model_client_kwargs
+
+	llm = ChatOpenAI(
+		api_key=os.getenv("BAILIAN_API_KEY"),
+		base_url=os.getenv("BAILIAN_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"),
+		model=os.getenv("BAILIAN_MODEL", "Moonshot-Kimi-K2-Instruct"),
+		temperature=0.3,
+		**model_client_kwargs(),
+	)
+	return RecordedChatModel(path=record, inner=llm) if record else llm
+
+
+def run_prompt(graph, case: Dict[str, Any], budget_s: float) -> Dict[str, Any]:
+	prompt = case.get("prompt") or case.get("message") or ""
+	request_id = init_request_context(None, prompt)
+	counter = UsageCounter()
+	config = with_budget(None, LatencyBudget(budget_s) if budget_s > 0 else None)
+	config["configurable"][TOOL_MEMO_KEY] = ToolMemo()
+	config["configurable"][PASSAGE_INDEX_KEY] = PassageIndex()
+	config["configurable"][DEDUP_KEY] = PageDeduplicator()
+	config["callbacks"] = [counter]
+	route: List[str] = []
+	output, error = "", None
+	started = time.perf_counter()
+	try:
+		for update in graph.stream({"messages": [HumanMessage(content=prompt)]}, config, stream_mode="updates"):
+			for node, node_update in update.items():
+				if node in ROUTE_NODES:
+					route.append(node)
+				for msg in (node_update or {}).get("messages", []) or []:
+					output = str(getattr(msg, "content", "") or output)
+	except Exception as e:
+		error = f"{type(e).__name__}: {e}"
+	finally:
+		# Moves the request out of the registry's active set
+		update_request_status("failed" if error else "completed")
+	return {
+		"id": case["id"],
+		"prompt": prompt,
+		"request_id": request_id,
+		"route": route,
+		"llm_calls": counter.llm_calls,
+		"prompt_tokens": counter.prompt_tokens,
+		"completion_tokens": counter.completion_tokens,
+		"cached_tokens": counter.cached_tokens,
+		"latency_s": round(time.perf_counter() - started, 4),
+		"output": output,
+		"error": error,
+		"metrics": get_request_metadata().get("metrics", {}),
+	}
+
+
+def run(args: argparse.Namespace) -> None:
+	from graph import build_super_graph
+
+	cases = load_jsonl(args.prompts)
+	for i, case in enumerate(cases):
+		case.setdefault("id", str(i))
+	graph = build_super_graph(build_model(args.record, args.replay, args.replay_delay))
+	started = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=args.parallel) as pool:
+		results = list(pool.map(lambda case: run_prompt(graph, case, args.budget_s), cases))
+	with open(args.output, "w", encoding="utf-8") as f:
+		for result in results:
+			f.write(json.dumps(result, ensure_ascii=False) + "\n")
+	print(f"{len(results)} prompts in {time.perf_counter() - started:.1f}s -> {args.output}")
+	_print_totals(args.output, results)
+
+
+def _totals(results: List[Dict[str, Any]]) -> Dict[str, float]:
+	latencies = sorted(r["latency_s"] for r in results) or [0.0]
+	return {
+		"errors": sum(1 for r in results if r.get("error")),
+		"llm_calls": sum(r["llm_calls"] for r in results),
+		"tokens": sum(r["prompt_tokens"] + r["completion_tokens"] for r in results),
+		"cached_tokens": sum(r.get("cached_tokens", 0) for r in results),
+		"latency_p50_s": statistics.median(latencies),
+		"latency_p95_s": latencies[max(int(len(latencies) * 0.95) - 1, 0)],
+	}
+
+
+def _print_totals(label: str, results: List[Dict[str, Any]]) -> None:
+	totals = _totals(results)
+	print(
+		f"{label}: errors={totals['errors']} llm_calls={totals['llm_calls']} tokens={totals['tokens']} cached={totals['cached_tokens']} "
+		f"latency p50={totals['latency_p50_s']:.2f}s p95={totals['latency_p95_s']:.2f}s"
+	)
+
+
+def diff(args: argparse.Namespace) -> None:
+	base = {r["id"]: r for r in load_jsonl(args.base)}
+	candidate = {r["id"]: r for r in load_jsonl(args.candidate)}
+	for case_id in sorted(base.keys() | candidate.keys(), key=str):
+		a, b = base.get(case_id), candidate.get(case_id)
+		if a is None or b is None:
+			print(f"[{case_id}] only in {'candidate' if a is None else 'base'}")
+			continue
+		changes = []
+		if a["route"] != b["route"]:
+			changes.append(f"route {'>'.join(a['route'])} -> {'>'.join(b['route'])}")
+		if bool(a.get("error")) != bool(b.get("error")):
+			changes.append(f"error {a.get('error')!r} -> {b.get('error')!r}")
+		similarity = difflib.SequenceMatcher(None, a["output"], b["output"]).ratio()
+		if similarity < args.min_similarity:
+			changes.append(f"output similarity {similarity:.2f}")
+		if a["llm_calls"] != b["llm_calls"]:
+			changes.append(f"llm_calls {a['llm_calls']} -> {b['llm_calls']}")
+		tokens_a = a["prompt_tokens"] + a["completion_tokens"]
+		tokens_b = b["prompt_tokens"] + b["completion_tokens"]
+		if tokens_a != tokens_b:
+			changes.append(f"tokens {tokens_a} -> {tokens_b}")
+		if changes:
+			print(f"[{case_id}] {a['prompt'][:60]!r}: " + "; ".join(changes))
+	_print_totals(args.base, list(base.values()))
+	_print_totals(args.candidate, list(candidate.values()))
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	commands = parser.add_subparsers(dest="command", required=True)
+
+	run_parser = commands.add_parser("run", help="Run a JSONL of prompts through the super graph")
+	run_parser.add_argument("prompts")
+	run_parser.add_argument("-o", "--output", required=True)
+	run_parser.add_argument("--parallel", type=int, default=4)
+	run_parser.add_argument("--budget-s", type=float, default=0.0, help="Latency budget per prompt, 0 disables it")
+	source = run_parser.add_mutually_exclusive_group()
+	source.add_argument("--record", default="", help="Record the live model's responses to this file")
+	source.add_argument("--replay", default="", help="Serve model responses from this recording (offline)")
+	run_parser.add_argument("--replay-delay", choices=["zero", "recorded"], default="zero", help="Reproduce recorded model latency when replaying")
+	run_parser.set_defaults(func=run)
+
+	diff_parser = commands.add_parser("diff", help="Compare two result files")
+	diff_parser.add_argument("base")
+	diff_parser.add_argument("candidate")
+	diff_parser.add_argument("--min-similarity", type=float, default=0.9, help="Report outputs less similar than this")
+	diff_parser.set_defaults(func=diff)
+
+	args = parser.parse_args()
+	load_dotenv()
+	args.func(args)
+
+
+if __name__ == "__main__":
+	main()
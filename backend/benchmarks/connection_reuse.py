@@ -0,0 +1,75 @@
+"""Connection reuse and time-to-first-token for model clients against a local mock server.
+
+Compares three ways of building the per-request ``ChatOpenAI``:
+- ``fresh``:   a new httpx client per request (no connection reuse at all)
+- ``default``: ChatOpenAI's own default client (what ``chat_stream`` used to do)
+- ``pooled``:  the process-wide pool from ``utils.http_pool``
+
+Run from ``backend/`` (the mock server is plain HTTP, so TLS handshake
+savings against a real endpoint come on top of what is measured here):
+
+	python -m benchmarks.connection_reuse --requests 200 --concurrency 8
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from benchmarks.mock_openai_server import MockOpenAIServer
+from utils.http_pool import model_client_kwargs
+
+
+def _client_kwargs(mode: str) -> dict:
+	if mode == "fresh":
+		return {"http_client": httpx.Client()}
+	if mode == "pooled":
+		return model_client_kwargs(pooled=True)
+	return {}
+
+
+def _one_request(base_url: str, mode: str) -> float:
+	kwargs = _client_kwargs(mode)
+	llm = ChatOpenAI(api_key="mock", base_url=base_url, model="mock-model", streaming=True, **kwargs)
+	started = time.perf_counter()
+	ttft = None
+	for _ in llm.stream("hello"):
+		if ttft is None:
+			ttft = time.perf_counter() - started
+	if mode == "fresh":
+		kwargs["http_client"].close()
+	return ttft or 0.0
+
+
+def run(mode: str, requests: int, concurrency: int, tokens: int, first_token_delay: float) -> None:
+	server = MockOpenAIServer(tokens=tokens, first_token_delay=first_token_delay).start()
+	started = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=concurrency) as pool:
+		ttfts: List[float] = sorted(pool.map(lambda _: _one_request(server.base_url, mode), range(requests)))
+	elapsed = time.perf_counter() - started
+	server.shutdown()
+	print(
+		f"{mode:>8}: connections={server.connections:4d} for {server.requests} requests  "
+		f"ttft p50={statistics.median(ttfts) * 1000:7.2f} ms  p99={ttfts[int(len(ttfts) * 0.99) - 1] * 1000:7.2f} ms  "
+		f"throughput={requests / elapsed:7.1f} req/s"
+	)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--requests", type=int, default=200)
+	parser.add_argument("--concurrency", type=int, default=8)
+	parser.add_argument("--tokens", type=int, default=20)
+	parser.add_argument("--first-token-delay", type=float, default=0.0)
+	args = parser.parse_args()
+	for mode in ("fresh", "default", "pooled"):
+		run(mode, args.requests, args.concurrency, args.tokens, args.first_token_delay)
+
+
+if __name__ == "__main__":
+	main()
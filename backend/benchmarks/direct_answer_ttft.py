@@ -0,0 +1,102 @@
+"""Time-to-first-token for trivial messages, with and without the direct-answer fast path.
+
+Starts the API with uvicorn against the local mock OpenAI-compatible server
+and streams greetings and short questions through ``/api/chat/stream``:
+- ``graph``: classified inside the super graph's supervisor (the old path)
+- ``fast``:  classified in the API and answered straight from the model
+
+Run from ``backend/``:
+
+	python -m benchmarks.direct_answer_ttft --requests 200 --concurrency 16
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import threading
+import time
+from typing import List
+
+import httpx
+
+from benchmarks.mock_openai_server import MockOpenAIServer
+
+TRIVIAL_MESSAGES = ["hi", "hello there", "thanks!", "你好", "what is an API?", "how are you", "who is Ada Lovelace?"]
+
+
+def _free_port() -> int:
+	with socket.socket() as sock:
+		sock.bind(("127.0.0.1", 0))
+		return sock.getsockname()[1]
+
+
+def _start_api(port: int):
+	import uvicorn
+	import app as api
+
+	server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning"))
+	threading.Thread(target=server.run, daemon=True).start()
+	while not server.started:
+		time.sleep(0.01)
+	return api, server
+
+
+async def _one_request(client: httpx.AsyncClient, message: str) -> float:
+	started = time.perf_counter()
+	async with client.stream("GET", "/api/chat/stream", params={"message": message}) as response:
+		lines = response.aiter_lines()
+		async for line in lines:
+			if line.startswith("data: ") and '"type":"token"' in line:
+				ttft = time.perf_counter() - started
+				async for _ in lines:
+					pass
+				return ttft
+	raise RuntimeError(f"No token streamed for {message!r}")
+
+
+async def _run(base_url: str, requests: int, concurrency: int) -> List[float]:
+	limit = asyncio.Semaphore(concurrency)
+	async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+		async def bounded(i: int) -> float:
+			async with limit:
+				return await _one_request(client, TRIVIAL_MESSAGES[i % len(TRIVIAL_MESSAGES)])
+
+		return sorted(await asyncio.gather(*(bounded(i) for i in range(requests))))
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--requests", type=int, default=200)
+	parser.add_argument("--concurrency", type=int, default=16)
+	parser.add_argument("--tokens", type=int, default=20)
+	parser.add_argument("--first-token-delay", type=float, default=0.05)
+	args = parser.parse_args()
+
+	mock = MockOpenAIServer(tokens=args.tokens, first_token_delay=args.first_token_delay).start()
+	os.environ.update(BAILIAN_API_KEY="mock", BAILIAN_BASE_URL=mock.base_url, BAILIAN_MODEL="mock-model", WARMUP_GRAPHS="0")
+	port = _free_port()
+	api, server = _start_api(port)
+	# Compile up front so neither mode pays for the first build
+	api.get_streaming_graph()
+	print(f"model first-token delay: {args.first_token_delay * 1000:.0f} ms")
+	for mode in ("graph", "fast"):
+		api.DIRECT_ANSWER_FAST_PATH = mode == "fast"
+		model_calls = mock.requests
+		started = time.perf_counter()
+		ttfts = asyncio.run(_run(f"http://127.0.0.1:{port}", args.requests, args.concurrency))
+		elapsed = time.perf_counter() - started
+		print(
+			f"{mode:>6}: ttft p50={statistics.median(ttfts) * 1000:7.2f} ms  "
+			f"p99={ttfts[int(len(ttfts) * 0.99) - 1] * 1000:7.2f} ms  max={ttfts[-1] * 1000:7.2f} ms  "
+			f"model calls/request={(mock.requests - model_calls) / args.requests:.2f}  "
+			f"throughput={args.requests / elapsed:7.1f} req/s"
+		)
+	server.should_exit = True
+	mock.shutdown()
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,62 @@
+"""Import-time profile of the API worker, and what deferring the heavy imports saves.
+
+Runs ``python -X importtime`` in fresh interpreters: once for ``import app``
+(what a worker pays before serving) and once for the modules that are now
+loaded on first use or by the warm-up hook. Run from ``backend/``:
+
+	python -m benchmarks.import_profile --top 15
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Loaded lazily by get_streaming_graph() and the tools instead of at import
+DEFERRED_MODULES = ["langchain_openai", "graph", "langchain_experimental.utilities", "httpx"]
+
+
+def profile(code: str) -> Tuple[float, List[Tuple[float, str]]]:
+	"""Return total import seconds and (cumulative seconds, module) for top-level imports."""
+	env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+	proc = subprocess.run(
+		[sys.executable, "-X", "importtime", "-c", code],
+		capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+	)
+	if proc.returncode != 0:
+		raise SystemExit(proc.stderr.strip().splitlines()[-1])
+	rows: Dict[str, float] = {}
+	total = 0.0
+	for line in proc.stderr.splitlines():
+		if not line.startswith("import time:") or "self [us]" in line:
+			continue
+		self_us, cumulative_us, name = line[len("import time:"):].split("|")
+		total += int(self_us) / 1e6
+		# Top-level imports are indented by a single space; nested ones by more
+		if len(name) - len(name.lstrip()) == 1:
+			rows[name.strip()] = int(cumulative_us) / 1e6
+	top = sorted(((seconds, name) for name, seconds in rows.items()), reverse=True)
+	return total, top
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--top", type=int, default=15)
+	args = parser.parse_args()
+
+	startup_total, startup_top = profile("import app")
+	print(f"import app: {startup_total * 1000:,.0f} ms")
+	for seconds, name in startup_top[:args.top]:
+		print(f"  {seconds * 1000:10,.1f} ms  {name}")
+
+	deferred_code = "import app; " + "; ".join(f"import {m}" for m in DEFERRED_MODULES)
+	with_deferred_total, _ = profile(deferred_code)
+	saved = with_deferred_total - startup_total
+	print(f"\nimport app + deferred modules: {with_deferred_total * 1000:,.0f} ms")
+	print(f"deferred until first use / warm-up: {saved * 1000:,.0f} ms ({', '.join(DEFERRED_MODULES)})")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,77 @@
+"""Memory and time per active request: add_messages state versus the append-only MessageLog.
+
+Replays the message traffic of a run without calling a model: every hop
+appends an agent output to the state, and every few hops an LLM call
+materializes the history (ReAct ``call_model`` and supervisor routers).
+Run from ``backend/``:
+
+	python -m benchmarks.message_memory --hops 200 --content-kb 8 --requests 20
+"""
+from __future__ import annotations
+
+import argparse
+import time
+import tracemalloc
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langgraph.graph.message import add_messages
+
+from utils.messages import agent_output, append_messages, to_langchain
+
+
+def run_baseline(hops: int, content: str, llm_every: int):
+	state = add_messages([], [HumanMessage(content="user request")])
+	for hop in range(hops):
+		output = HumanMessage(content=content, name=f"agent_{hop % 3}")
+		state = add_messages(state, [output])
+		if hop % llm_every == 0:
+			msgs = list(state)
+			_ = [SystemMessage(content="prompt"), *msgs]
+			_ = [{"role": "system", "content": "router"}] + state
+	return state
+
+
+def run_compact(hops: int, content: str, llm_every: int):
+	state = append_messages([], [HumanMessage(content="user request")])
+	system = SystemMessage(content="prompt")
+	for hop in range(hops):
+		state = append_messages(state, [agent_output(f"agent_{hop % 3}", content)])
+		if hop % llm_every == 0:
+			msgs = to_langchain(state)
+			msgs.insert(0, system)
+			_ = [{"role": "system", "content": "router"}] + to_langchain(state)
+	return state
+
+
+def measure(fn, requests: int, hops: int, content: str, llm_every: int):
+	tracemalloc.start()
+	started = time.perf_counter()
+	# Keep every request's state alive, as concurrent requests would
+	states = [fn(hops, content + str(i), llm_every) for i in range(requests)]
+	elapsed = time.perf_counter() - started
+	current, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	del states
+	return current / requests, peak / requests, elapsed / requests
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--hops", type=int, default=200)
+	parser.add_argument("--content-kb", type=int, default=8)
+	parser.add_argument("--requests", type=int, default=20)
+	parser.add_argument("--llm-every", type=int, default=2, help="Materialize the history every N hops")
+	args = parser.parse_args()
+
+	content = "x" * (args.content_kb * 1024)
+	print(f"hops={args.hops} content={args.content_kb}KB requests={args.requests}")
+	for label, fn in (("add_messages", run_baseline), ("MessageLog", run_compact)):
+		retained, peak, seconds = measure(fn, args.requests, args.hops, content, args.llm_every)
+		print(
+			f"{label:>12}: retained {retained / 1024:,.1f} KB/request, "
+			f"peak {peak / 1024:,.1f} KB/request, {seconds * 1000:,.2f} ms/request"
+		)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,138 @@
+"""Minimal in-process Redis stand-in for exercising RedisStateStore without a Redis server.
+
+Implements the subset of RESP commands the state store uses. Run standalone with:
+
+	python -m benchmarks.mini_redis --port 6390
+"""
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class _Data:
+	def __init__(self):
+		self.values: Dict[str, Tuple[Any, Optional[float]]] = {}
+		self.lock = threading.Lock()
+
+	def live(self, key: str) -> Any:
+		entry = self.values.get(key)
+		if entry is None:
+			return None
+		value, expires_at = entry
+		if expires_at is not None and expires_at <= time.time():
+			del self.values[key]
+			return None
+		return value
+
+
+def _encode(value: Any) -> bytes:
+	if value is None:
+		return b"$-1\r\n"
+	if isinstance(value, bool):
+		return b"+OK\r\n"
+	if isinstance(value, int):
+		return b":%d\r\n" % value
+	if isinstance(value, list):
+		return b"*%d\r\n" % len(value) + b"".join(_encode(v) for v in value)
+	data = value.encode("utf-8")
+	return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+	data: _Data
+
+	def _read_command(self) -> Optional[List[str]]:
+		line = self.rfile.readline()
+		if not line:
+			return None
+		count = int(line[1:-2])
+		args = []
+		for _ in range(count):
+			size = int(self.rfile.readline()[1:-2])
+			args.append(self.rfile.read(size + 2)[:-2].decode("utf-8"))
+		return args
+
+	def handle(self) -> None:
+		while True:
+			args = self._read_command()
+			if args is None:
+				return
+			try:
+				reply = self._dispatch(args[0].upper(), args[1:])
+			except Exception as e:
+				self.wfile.write(f"-ERR {e}\r\n".encode())
+				continue
+			self.wfile.write(_encode(reply))
+
+	def _dispatch(self, command: str, args: List[str]) -> Any:
+		data = self.data
+		with data.lock:
+			if command in ("PING", "AUTH", "SELECT"):
+				return True
+			if command == "GET":
+				value = data.live(args[0])
+				return value if isinstance(value, str) else None
+			if command == "SET":
+				expires_at = None
+				if len(args) >= 4 and args[2].upper() == "PX":
+					expires_at = time.time() + int(args[3]) / 1000
+				elif len(args) >= 4 and args[2].upper() == "EX":
+					expires_at = time.time() + int(args[3])
+				data.values[args[0]] = (args[1], expires_at)
+				return True
+			if command == "DEL":
+				return sum(1 for key in args if data.values.pop(key, None) is not None)
+			if command == "RPUSH":
+				items = data.live(args[0])
+				if not isinstance(items, list):
+					items = []
+					data.values[args[0]] = (items, None)
+				items.extend(args[1:])
+				return len(items)
+			if command == "LRANGE":
+				items = data.live(args[0]) or []
+				start, end = int(args[1]), int(args[2])
+				stop = len(items) + end + 1 if end < 0 else end + 1
+				return list(items[start:stop])
+			if command == "PEXPIRE":
+				value = data.live(args[0])
+				if value is None:
+					return 0
+				data.values[args[0]] = (value, time.time() + int(args[1]) / 1000)
+				return 1
+			if command == "KEYS":
+				return [key for key in list(data.values) if fnmatch.fnmatchcase(key, args[0]) and data.live(key) is not None]
+		raise ValueError(f"unknown command '{command}'")
+
+
+class MiniRedisServer(socketserver.ThreadingTCPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+	def __init__(self, host: str = "127.0.0.1", port: int = 0):
+		handler = type("Handler", (_Handler,), {"data": _Data()})
+		super().__init__((host, port), handler)
+
+	@property
+	def url(self) -> str:
+		host, port = self.server_address[:2]
+		return f"redis://{host}:{port}/0"
+
+	def start(self) -> "MiniRedisServer":
+		threading.Thread(target=self.serve_forever, daemon=True).start()
+		return self
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=6390)
+	cli = parser.parse_args()
+	server = MiniRedisServer(cli.host, cli.port)
+	print(f"Mini Redis listening on {server.url}")
+	server.serve_forever()
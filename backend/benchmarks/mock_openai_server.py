@@ -0,0 +1,139 @@
+"""Local OpenAI-compatible chat completions server for offline benchmarks.
+
+Serves ``POST /v1/chat/completions`` (streaming and non-streaming) over
+HTTP/1.1 keep-alive with configurable latency, and counts accepted TCP
+connections so connection reuse can be measured. Usage reports prompt-cache
+hits the way OpenAI does: prompts of at least 1024 tokens reuse the longest
+previously seen prefix, in 128-token steps. Run standalone with:
+
+	python -m benchmarks.mock_openai_server --port 8900 --tokens 50 --token-delay 0.005
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+	server: "MockOpenAIServer"
+
+	def log_message(self, format: str, *args) -> None:  # noqa: A002
+		pass
+
+	def _send_json(self, status: int, payload: dict) -> None:
+		body = json.dumps(payload).encode("utf-8")
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def _write_chunk(self, data: bytes) -> None:
+		self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+		self.wfile.flush()
+
+	def do_POST(self) -> None:  # noqa: N802
+		length = int(self.headers.get("Content-Length", 0))
+		request = json.loads(self.rfile.read(length) or b"{}")
+		if not self.path.rstrip("/").endswith("/chat/completions"):
+			self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+			return
+		self.server.requests += 1
+		model = request.get("model", "mock-model")
+		tokens = [f"token{i} " for i in range(self.server.tokens)]
+		usage = {
+			"prompt_tokens": sum(len(str(m.get("content", ""))) // 4 for m in request.get("messages", [])),
+			"completion_tokens": len(tokens),
+		}
+		usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+		usage["prompt_tokens_details"] = {"cached_tokens": self.server.cached_prefix(request.get("messages", []))}
+		time.sleep(self.server.first_token_delay)
+
+		if not request.get("stream"):
+			time.sleep(self.server.token_delay * len(tokens))
+			self._send_json(200, {
+				"id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+				"choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+				"usage": usage,
+			})
+			return
+
+		self.send_response(200)
+		self.send_header("Content-Type", "text/event-stream")
+		self.send_header("Transfer-Encoding", "chunked")
+		self.end_headers()
+		base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+		for i, token in enumerate(tokens):
+			delta = {"role": "assistant", "content": token} if i == 0 else {"content": token}
+			chunk = dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}])
+			self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+			time.sleep(self.server.token_delay)
+		final = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+		self._write_chunk(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+		if (request.get("stream_options") or {}).get("include_usage"):
+			self._write_chunk(f"data: {json.dumps(dict(base, choices=[], usage=usage))}\n\n".encode("utf-8"))
+		self._write_chunk(b"data: [DONE]\n\n")
+		self._write_chunk(b"")
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+	def __init__(self, host: str = "127.0.0.1", port: int = 0, tokens: int = 20, token_delay: float = 0.0, first_token_delay: float = 0.0):
+		super().__init__((host, port), _Handler)
+		self.tokens = tokens
+		self.token_delay = token_delay
+		self.first_token_delay = first_token_delay
+		self.connections = 0
+		self.requests = 0
+		self._prefixes: set = set()
+		self._prefix_lock = threading.Lock()
+
+	def cached_prefix(self, messages: list) -> int:
+		"""Tokens of the longest cached prefix of ``messages`` (4 characters per token); caches the rest."""
+		text = "".join(f"{m.get('role')}\n{m.get('content', '')}\n" for m in messages)
+		if len(text) < 4 * 1024:
+			return 0
+		steps = range(4 * 1024, len(text) + 1, 4 * 128)
+		running, start, digests = hashlib.sha1(), 0, []
+		for end in steps:
+			running.update(text[start:end].encode("utf-8"))
+			start = end
+			digests.append(running.copy().digest())
+		with self._prefix_lock:
+			hits = [end for end, digest in zip(steps, digests) if digest in self._prefixes]
+			self._prefixes.update(digests)
+		return max(hits, default=0) // 4
+
+	def get_request(self):
+		conn = super().get_request()
+		self.connections += 1
+		return conn
+
+	@property
+	def base_url(self) -> str:
+		host, port = self.server_address[:2]
+		return f"http://{host}:{port}/v1"
+
+	def start(self) -> "MockOpenAIServer":
+		threading.Thread(target=self.serve_forever, daemon=True).start()
+		return self
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=8900)
+	parser.add_argument("--tokens", type=int, default=20)
+	parser.add_argument("--token-delay", type=float, default=0.0)
+	parser.add_argument("--first-token-delay", type=float, default=0.0)
+	cli = parser.parse_args()
+	server = MockOpenAIServer(cli.host, cli.port, cli.tokens, cli.token_delay, cli.first_token_delay)
+	print(f"Mock OpenAI server listening on {server.base_url}")
+	server.serve_forever()
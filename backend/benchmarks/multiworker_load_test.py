@@ -0,0 +1,114 @@
+"""Multi-worker load test for the shared state store.
+
+Each worker process simulates API requests the way ``app.py`` records them:
+a registry entry, status updates and a stream of events kept for replay. Workers then look up runs recorded by *other* workers, which only
+succeeds when the backend is genuinely shared. Run from ``backend/``:
+
+	python -m benchmarks.multiworker_load_test --backend sqlite --workers 4
+	python -m benchmarks.multiworker_load_test --backend redis   # uses the local stand-in
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from utils.state_store import create_state_store
+
+
+def _worker(worker_id: int, backend: str, url: str, requests: int, events: int, barrier, results) -> None:
+	store = create_state_store(backend, url)
+	latencies: List[float] = []
+
+	def timed(fn, *args):
+		started = time.perf_counter()
+		value = fn(*args)
+		latencies.append(time.perf_counter() - started)
+		return value
+
+	for i in range(requests):
+		request_id = f"w{worker_id}-{i}"
+		metadata = {"request_id": request_id, "status": "processing", "start_time": time.time()}
+		timed(store.set_json, f"request:{request_id}", metadata, 600)
+		for n in range(events):
+			chunk = json.dumps({"type": "token", "content": f"token {n}", "team": "final"})
+			timed(store.append, f"stream:{request_id}", chunk, 600)
+		metadata["status"] = "completed"
+		timed(store.set_json, f"request:{request_id}", metadata, 600)
+
+	# Once every worker has written, look up runs recorded elsewhere
+	barrier.wait()
+	peers = [w for w in range(barrier.parties) if w != worker_id]
+	found = 0
+	for peer in peers:
+		for i in range(requests):
+			request_id = f"w{peer}-{i}"
+			record = timed(store.get_json, f"request:{request_id}")
+			replay = timed(store.range, f"stream:{request_id}")
+			if record and record["status"] == "completed" and len(replay) == events:
+				found += 1
+	results.put({"worker": worker_id, "latencies": latencies, "found": found, "expected": len(peers) * requests})
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--backend", choices=["sqlite", "redis"], default="sqlite")
+	parser.add_argument("--url", default="", help="SQLite path or redis:// URL (defaults to a temp file / local stand-in)")
+	parser.add_argument("--workers", type=int, default=4)
+	parser.add_argument("--requests", type=int, default=50, help="Requests per worker")
+	parser.add_argument("--events", type=int, default=100, help="Stream events per request")
+	args = parser.parse_args()
+
+	url = args.url
+	server = None
+	tmpdir = None
+	if not url and args.backend == "sqlite":
+		tmpdir = tempfile.TemporaryDirectory()
+		url = os.path.join(tmpdir.name, "state.sqlite3")
+	elif not url:
+		from benchmarks.mini_redis import MiniRedisServer
+		server = MiniRedisServer().start()
+		url = server.url
+	create_state_store(args.backend, url)  # Create the schema before workers race for it
+
+	ctx = mp.get_context("spawn")
+	barrier = ctx.Barrier(args.workers)
+	results = ctx.Queue()
+	started = time.perf_counter()
+	procs = [
+		ctx.Process(target=_worker, args=(w, args.backend, url, args.requests, args.events, barrier, results))
+		for w in range(args.workers)
+	]
+	for proc in procs:
+		proc.start()
+	reports: List[Dict] = [results.get() for _ in procs]
+	for proc in procs:
+		proc.join()
+	elapsed = time.perf_counter() - started
+
+	latencies = sorted(lat for report in reports for lat in report["latencies"])
+	found = sum(report["found"] for report in reports)
+	expected = sum(report["expected"] for report in reports)
+	print(f"backend={args.backend} workers={args.workers} requests/worker={args.requests} events/request={args.events}")
+	print(f"operations: {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:,.0f} ops/s)")
+	print(
+		f"latency ms: p50={statistics.median(latencies) * 1000:.3f} "
+		f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.3f} max={latencies[-1] * 1000:.3f}"
+	)
+	print(f"cross-worker lookups: {found}/{expected} runs visible with complete replay")
+
+	if server is not None:
+		server.shutdown()
+	if tmpdir is not None:
+		tmpdir.cleanup()
+	if found != expected:
+		raise SystemExit(1)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,72 @@
+"""Indexing throughput and query latency of the in-process passage index.
+
+Indexes synthetic pages into ``utils.passage_index.PassageIndex`` and times
+top-k queries against it, and compares the characters a writer would see
+from ``search_passages`` with the whole scraped pages. Run from ``backend/``:
+
+	python -m benchmarks.passage_index --pages 300 --queries 500
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+
+from utils.passage_index import PassageIndex
+
+VOCABULARY = (
+	"market growth revenue battery lithium supply chain regulation policy subsidy demand forecast "
+	"solar wind grid storage capacity price cost efficiency emissions carbon hydrogen electric vehicle "
+	"charging network adoption consumer survey manufacturer factory export import tariff 市场 电池 储能 政策"
+).split()
+
+
+def _page(rng: random.Random, words: int) -> str:
+	sentences = []
+	for _ in range(words // 12):
+		sentences.append(" ".join(rng.choice(VOCABULARY) for _ in range(12)) + ".")
+	return "\n\n".join(" ".join(sentences[i:i + 6]) for i in range(0, len(sentences), 6))
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--pages", type=int, default=300)
+	parser.add_argument("--words-per-page", type=int, default=1500)
+	parser.add_argument("--queries", type=int, default=500)
+	parser.add_argument("-k", type=int, default=5)
+	args = parser.parse_args()
+
+	rng = random.Random(7)
+	pages = [_page(rng, args.words_per_page) for _ in range(args.pages)]
+	index = PassageIndex()
+	started = time.perf_counter()
+	for i, page in enumerate(pages):
+		index.add(page, source=f"https://example.com/{i}")
+	indexing = time.perf_counter() - started
+	print(f"indexed {len(index)} passages from {args.pages} pages in {indexing:.2f}s ({len(index) / indexing:,.0f} passages/s)")
+
+	queries = [" ".join(rng.choice(VOCABULARY) for _ in range(6)) for _ in range(args.queries)]
+	timings = []
+	returned_chars = 0
+	for query in queries:
+		started = time.perf_counter()
+		hits = index.search([query], k=args.k)[0]
+		timings.append(time.perf_counter() - started)
+		returned_chars += sum(len(hit["text"]) for hit in hits)
+	timings.sort()
+	print(
+		f"query top-{args.k}: p50={statistics.median(timings) * 1000:.2f} ms  "
+		f"p99={timings[int(len(timings) * 0.99) - 1] * 1000:.2f} ms"
+	)
+
+	started = time.perf_counter()
+	index.search(queries, k=args.k)
+	batched = time.perf_counter() - started
+	print(f"batched {len(queries)} queries: {batched * 1000:.1f} ms ({batched / len(queries) * 1000:.3f} ms/query)")
+	page_chars = sum(len(p) for p in pages) / len(pages)
+	print(f"chars per lookup: {returned_chars / len(queries):,.0f} (passages) vs {page_chars:,.0f} (one whole page)")
+
+
+if __name__ == "__main__":
+	main()
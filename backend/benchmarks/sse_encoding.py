@@ -0,0 +1,95 @@
+"""CPU per token and egress bytes of the SSE event encoding.
+
+Encodes a synthetic stream of final-team tokens the way the API used to
+(``json.dumps`` of a dict, then an f-string and ``.encode``) and with the
+pre-framed templates of ``utils.sse`` on the stdlib and orjson backends,
+then measures the bytes on the wire uncompressed and with gzip/brotli
+flushed after every event. Run from ``backend/``:
+
+	python -m benchmarks.sse_encoding --tokens 200000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Callable, List
+
+from utils import sse
+
+WORDS = (
+	"The market for grid storage grew quickly last year , driven by lithium prices and new policy . "
+	"储能 市场 在 过去 一年 快速 增长 ， 主要 受 锂价 和 政策 推动 。 **Key findings** :\n- "
+).split(" ")
+
+
+def _tokens(n: int) -> List[str]:
+	rng = random.Random(3)
+	return [rng.choice(WORDS) + rng.choice(("", " ")) for _ in range(n)]
+
+
+def _baseline(token: str) -> bytes:
+	payload = {"type": "token", "content": token}
+	payload["team"] = "final"
+	payload["node"] = "doc_writer"
+	chunk = json.dumps(payload, ensure_ascii=False)
+	return f"data: {chunk}\n\n".encode("utf-8")
+
+
+def _templated(token: str) -> bytes:
+	return sse.frame(sse.token_frame(token, "final", "doc_writer"))
+
+
+def _time(encode: Callable[[str], bytes], tokens: List[str]) -> float:
+	started = time.process_time()
+	for token in tokens:
+		encode(token)
+	return (time.process_time() - started) / len(tokens)
+
+
+async def _wire_bytes(frames: List[bytes], encoding) -> int:
+	async def source():
+		for data in frames:
+			yield data
+
+	return sum([len(data) async for data in sse.compress_stream(source(), encoding)])
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--tokens", type=int, default=200_000)
+	args = parser.parse_args()
+
+	tokens = _tokens(args.tokens)
+	orjson = sse.orjson
+	results = [("json.dumps + f-string", _time(_baseline, tokens))]
+	sse.orjson = None
+	sse._token_suffix.cache_clear()
+	results.append(("template, stdlib json", _time(_templated, tokens)))
+	sse.orjson = orjson
+	sse._token_suffix.cache_clear()
+	if orjson is not None:
+		results.append(("template, orjson", _time(_templated, tokens)))
+	else:
+		print("orjson is not installed; skipping its backend")
+	base = results[0][1]
+	for name, per_token in results:
+		print(f"{name:<24} {per_token * 1e6:6.2f} us/token  ({base / per_token:4.1f}x)")
+
+	frames = [_templated(token) for token in tokens]
+	# Same events as before, only without the whitespace between JSON separators
+	assert all(json.loads(f[6:]) == json.loads(_baseline(t)[6:]) for f, t in zip(frames[:1000], tokens))
+	identity = sum(len(data) for data in frames)
+	print(f"\negress for {len(tokens):,} tokens: identity {identity / len(tokens):.1f} B/token")
+	for encoding in ("gzip", "br"):
+		if encoding == "br" and sse.brotli is None:
+			print("br: brotli is not installed; skipping")
+			continue
+		wire = asyncio.run(_wire_bytes(frames, encoding))
+		print(f"{encoding:<4} flushed per event: {wire / len(tokens):.1f} B/token ({wire / identity:.0%} of identity)")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,179 @@
+"""Many concurrent conversations over SSE (one connection each) versus one multiplexed WebSocket.
+
+Starts the API with uvicorn in a child process against the local mock
+OpenAI-compatible server and sends the same trivial messages through
+``/api/chat/stream`` (one EventSource-style HTTP stream per message) and
+through ``/api/chat/ws`` (every message a stream on a single connection,
+granting credit as events are consumed). Reports wall time, events per
+second, connections opened and the API process's peak RSS growth per
+concurrent conversation. Run from ``backend/``:
+
+	python -m benchmarks.ws_multiplex --conversations 200 --tokens 50
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict
+
+import httpx
+import websockets
+
+from benchmarks.mock_openai_server import MockOpenAIServer
+
+TRIVIAL_MESSAGES = ["hi", "hello there", "thanks!", "你好", "what is an API?", "how are you", "who is Ada Lovelace?"]
+
+
+def _free_port() -> int:
+	with socket.socket() as sock:
+		sock.bind(("127.0.0.1", 0))
+		return sock.getsockname()[1]
+
+
+def _rss_bytes(pid: int) -> int:
+	with open(f"/proc/{pid}/status") as f:
+		for line in f:
+			if line.startswith("VmRSS:"):
+				return int(line.split()[1]) * 1024
+	return 0
+
+
+class _PeakRss:
+	"""Samples a process's resident set size in the background and keeps the peak."""
+
+	def __init__(self, pid: int, interval: float = 0.005):
+		self.pid = pid
+		self.baseline = _rss_bytes(pid)
+		self.peak = self.baseline
+		self._interval = interval
+		self._stop = threading.Event()
+		self._thread = threading.Thread(target=self._sample, daemon=True)
+
+	def _sample(self) -> None:
+		while not self._stop.is_set():
+			self.peak = max(self.peak, _rss_bytes(self.pid))
+			time.sleep(self._interval)
+
+	def __enter__(self) -> "_PeakRss":
+		self._thread.start()
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self._stop.set()
+		self._thread.join()
+
+
+async def _sse(base_url: str, conversations: int) -> Dict[str, int]:
+	# One connection per open conversation, as the browser's EventSource does
+	limits = httpx.Limits(max_connections=conversations, max_keepalive_connections=conversations)
+	async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+		async def one(i: int) -> int:
+			events = 0
+			async with client.stream("GET", "/api/chat/stream", params={"message": TRIVIAL_MESSAGES[i % len(TRIVIAL_MESSAGES)]}) as response:
+				async for line in response.aiter_lines():
+					if line.startswith("data: "):
+						events += 1
+			return events
+
+		counts = await asyncio.gather(*(one(i) for i in range(conversations)))
+	return {"events": sum(counts), "connections": conversations}
+
+
+async def _websocket(base_url: str, conversations: int, window: int) -> Dict[str, int]:
+	events = 0
+	async with websockets.connect(base_url.replace("http", "ws", 1) + "/api/chat/ws", max_size=None) as ws:
+		for i in range(conversations):
+			await ws.send(json.dumps({
+				"type": "start", "stream": str(i), "window": window,
+				"message": TRIVIAL_MESSAGES[i % len(TRIVIAL_MESSAGES)],
+			}))
+		unacknowledged: Dict[str, int] = {}
+		open_streams = conversations
+		while open_streams:
+			frame = json.loads(await ws.recv())
+			if "event" not in frame:
+				if frame.get("type") == "error":
+					raise RuntimeError(frame["message"])
+				continue
+			events += 1
+			stream = frame["stream"]
+			if frame["event"] == "[DONE]":
+				open_streams -= 1
+				continue
+			# Grant credit in half-window steps, like an HTTP/2 receiver
+			unacknowledged[stream] = unacknowledged.get(stream, 0) + 1
+			if unacknowledged[stream] >= window // 2:
+				await ws.send(json.dumps({"type": "credit", "stream": stream, "events": unacknowledged.pop(stream)}))
+	return {"events": events, "connections": 1}
+
+
+def _start_api(port: int, env: Dict[str, str]) -> subprocess.Popen:
+	api = subprocess.Popen(
+		[sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+		env=env,
+		stdout=subprocess.DEVNULL,
+		stderr=subprocess.DEVNULL,
+	)
+	while True:
+		try:
+			httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1)
+			return api
+		except httpx.TransportError:
+			if api.poll() is not None:
+				raise SystemExit("The API failed to start")
+			time.sleep(0.1)
+
+
+def _measure(name: str, env: Dict[str, str], transport: Callable[[str, int], Dict[str, int]], conversations: int) -> None:
+	# A fresh API process per transport, so neither inherits the other's heap
+	port = _free_port()
+	base_url = f"http://127.0.0.1:{port}"
+	api = _start_api(port, env)
+	try:
+		# Warm up so imports and the model client do not count
+		transport(base_url, 4)
+		with _PeakRss(api.pid) as rss:
+			started = time.perf_counter()
+			result = transport(base_url, conversations)
+			elapsed = time.perf_counter() - started
+	finally:
+		api.terminate()
+		api.wait()
+	growth = max(rss.peak - rss.baseline, 0)
+	print(
+		f"{name:<10} {elapsed:6.2f}s  {result['events'] / elapsed:8,.0f} events/s  "
+		f"{result['connections']:4d} connections  peak RSS +{growth / 2**20:6.1f} MiB "
+		f"({growth / conversations / 1024:6.1f} KiB/conversation)"
+	)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--conversations", type=int, default=200, help="Concurrent conversations per transport")
+	parser.add_argument("--tokens", type=int, default=50)
+	parser.add_argument("--token-delay", type=float, default=0.005)
+	parser.add_argument("--window", type=int, default=64, help="WebSocket flow-control window in events")
+	args = parser.parse_args()
+
+	mock = MockOpenAIServer(tokens=args.tokens, token_delay=args.token_delay).start()
+	env = dict(
+		os.environ, BAILIAN_API_KEY="mock", BAILIAN_BASE_URL=mock.base_url, BAILIAN_MODEL="mock-model",
+		WARMUP_GRAPHS="0", WS_MAX_STREAMS=str(args.conversations),
+	)
+	print(f"{args.conversations} concurrent conversations, {args.tokens} tokens each")
+	try:
+		_measure("SSE", env, lambda url, n: asyncio.run(_sse(url, n)), args.conversations)
+		_measure("WebSocket", env, lambda url, n: asyncio.run(_websocket(url, n, args.window)), args.conversations)
+	finally:
+		mock.shutdown()
+
+
+if __name__ == "__main__":
+	main()
@@ -1,34 +1,56 @@
 from __future__ import annotations
 
-from typing import Literal, Tuple
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import List, Literal, Optional, Tuple
 
-from langchain_core.messages import HumanMessage
 from utils.react_agent_factory import create_react_agent
 from langgraph.types import Command
+from langchain_core.runnables import RunnableConfig
 
 from document_teams.document_team_tools import (
 	create_outline,
 	read_document,
+	search_passages,
 	write_document,
 	edit_document,
 	python_repl_tool,
 )
 from utils.supervisor import make_team_supervisor_node, State
 from utils.context import current_team, current_node
+from utils.messages import agent_output
+from utils.progress import emit_progress
+from utils.budget import stage_budget, with_budget
+
+logger = logging.getLogger(__name__)
+
+NOTE_TAKER_PROMPT = (
+	"You can read documents and create outlines for the document writer. "
+	"Use search_passages to look up details in the scraped web pages. "
+	"Don't ask follow-up questions."
+)
 
 
 def build_document_team(llm) -> Tuple:
-	
+	doc_writer_prompt = (
+		"You can read, write and edit documents based on note-taker's outlines. "
+		"Use search_passages to fetch supporting details and sources from the scraped web pages. "
+		"Don't ask follow-up questions."
+	)
+	if os.getenv("STREAM_DELIVERABLE", "1").lower() in {"1", "true", "yes"}:
+		# The writer's reply is streamed to the user as the final deliverable
+		doc_writer_prompt += " Finish by replying with the complete document text."
+
 	doc_writer_agent = create_react_agent(
 		llm,
-		tools=[write_document, edit_document, read_document],
-		prompt=(
-			"You can read, write and edit documents based on note-taker's outlines. "
-			"Don't ask follow-up questions."
-		),
+		tools=[write_document, edit_document, read_document, search_passages],
+		prompt=doc_writer_prompt,
 	)
 
-	def doc_writing_node(state: State) -> Command[Literal["supervisor"]]:
+	def doc_writing_node(state: State, config: RunnableConfig) -> Command[Literal["supervisor"]]:
 		# Don't override team context if it's already set to "final"
 		current_team_value = current_team.get("")
 		if current_team_value != "final":
@@ -36,31 +58,33 @@ def build_document_team(llm) -> Tuple:
 		else:
 			token = None
 		token_node = current_node.set("doc_writer")
+		budget = stage_budget(config, "doc_writer", "agent")
 		try:
-			result = doc_writer_agent.invoke(state)
+			emit_progress("node_start")
+			result = doc_writer_agent.invoke(state, with_budget(config, budget))
 			return Command(
 				update={
 					"messages": [
-						HumanMessage(content=result["messages"][-1].content, name="doc_writer")
+						agent_output("doc_writer", result["messages"][-1].content)
 					]
 				},
 				goto="supervisor",
 			)
 		finally:
+			if budget:
+				budget.finish()
+			emit_progress("node_end")
 			current_node.reset(token_node)
 			if token:
 				current_team.reset(token)
 
 	note_taking_agent = create_react_agent(
 		llm,
-		tools=[create_outline, read_document],
-		prompt=(
-			"You can read documents and create outlines for the document writer. "
-			"Don't ask follow-up questions."
-		),
+		tools=[create_outline, read_document, search_passages],
+		prompt=NOTE_TAKER_PROMPT,
 	)
 
-	def note_taking_node(state: State) -> Command[Literal["supervisor"]]:
+	def note_taking_node(state: State, config: RunnableConfig) -> Command[Literal["supervisor"]]:
 		# Don't override team context if it's already set to "final"
 		current_team_value = current_team.get("")
 		if current_team_value != "final":
@@ -68,17 +92,22 @@ def build_document_team(llm) -> Tuple:
 		else:
 			token = None
 		token_node = current_node.set("note_taker")
+		budget = stage_budget(config, "note_taker", "agent")
 		try:
-			result = note_taking_agent.invoke(state)
+			emit_progress("node_start")
+			result = note_taking_agent.invoke(state, with_budget(config, budget))
 			return Command(
 				update={
 					"messages": [
-						HumanMessage(content=result["messages"][-1].content, name="note_taker")
+						agent_output("note_taker", result["messages"][-1].content)
 					]
 				},
 				goto="supervisor",
 			)
 		finally:
+			if budget:
+				budget.finish()
+			emit_progress("node_end")
 			current_node.reset(token_node)
 			if token:
 				current_team.reset(token)
@@ -87,7 +116,7 @@ def build_document_team(llm) -> Tuple:
 		llm, tools=[read_document, python_repl_tool]
 	)
 
-	def chart_generating_node(state: State) -> Command[Literal["supervisor"]]:
+	def chart_generating_node(state: State, config: RunnableConfig) -> Command[Literal["supervisor"]]:
 		# Don't override team context if it's already set to "final"
 		current_team_value = current_team.get("")
 		if current_team_value != "final":
@@ -95,19 +124,22 @@ def build_document_team(llm) -> Tuple:
 		else:
 			token = None
 		token_node = current_node.set("chart_generator")
+		budget = stage_budget(config, "chart_generator", "agent")
 		try:
-			result = chart_generating_agent.invoke(state)
+			emit_progress("node_start")
+			result = chart_generating_agent.invoke(state, with_budget(config, budget))
 			return Command(
 				update={
 					"messages": [
-						HumanMessage(
-							content=result["messages"][-1].content, name="chart_generator"
-						)
+						agent_output("chart_generator", result["messages"][-1].content)
 					]
 				},
 				goto="supervisor",
 			)
 		finally:
+			if budget:
+				budget.finish()
+			emit_progress("node_end")
 			current_node.reset(token_node)
 			if token:
 				current_team.reset(token)
@@ -121,4 +153,91 @@ def build_document_team(llm) -> Tuple:
 		doc_writing_node,
 		note_taking_node,
 		chart_generating_node,
-	) 
\ No newline at end of file
+	)
+
+
+class OutlinePrefetcher:
+	"""Draft the writing team's outline in the background while research is still running.
+
+	Partial research results are fed in as they stream out of the research graph.
+	Drafts run one at a time on a single worker; each draft amends the previous
+	outline with every finding received so far, so later research is folded in
+	before ``doc_writer`` runs.
+	"""
+
+	def __init__(self, llm, request_messages: List):
+		self._agent = create_react_agent(
+			llm,
+			tools=[create_outline, read_document, search_passages],
+			prompt=NOTE_TAKER_PROMPT,
+		)
+		self._request_messages = list(request_messages)
+		self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outline-prefetch")
+		self._futures: List = []
+		self._findings: List[str] = []
+		self._drafted_upto = 0
+		self._outline = ""
+		self._intervals: List[Tuple[float, float]] = []
+
+	def feed(self, name: str, content: str) -> None:
+		"""Queue a (re)draft including a new partial research result."""
+		if not content:
+			return
+		self._findings.append(f"{name}: {content}")
+		ctx = copy_context()
+		self._futures.append(self._executor.submit(ctx.run, self._draft))
+
+	def _draft(self) -> None:
+		upto = len(self._findings)
+		if upto <= self._drafted_upto:
+			return  # An earlier queued draft already covered these findings
+		instruction = (
+			"Partial research findings so far:\n" + "\n\n".join(self._findings[:upto])
+		)
+		if self._outline:
+			instruction += (
+				"\n\nCurrent outline draft (amend it with the new findings):\n" + self._outline
+			)
+		token = current_team.set("document_team")
+		token_node = current_node.set("note_taker")
+		started = time.time()
+		try:
+			result = self._agent.invoke({
+				"messages": self._request_messages + [agent_output("research_team", instruction)],
+			})
+			self._outline = result["messages"][-1].content
+			self._drafted_upto = upto
+		except Exception as e:
+			logger.warning(f"Outline prefetch draft failed: {e}")
+		finally:
+			self._intervals.append((started, time.time()))
+			current_node.reset(token_node)
+			current_team.reset(token)
+
+	def collect(self, research_start: float, research_end: float) -> Tuple[Optional[str], dict]:
+		"""Stop queued drafts, wait for the running one and return the outline with overlap stats."""
+		for future in self._futures:
+			future.cancel()
+		self._executor.shutdown(wait=True)
+		collected = time.time()
+
+		overlap = sum(
+			max(0.0, min(end, research_end) - max(start, research_start))
+			for start, end in self._intervals
+		)
+		stats = {
+			"drafts": len(self._intervals),
+			"overlap_s": round(overlap, 3),
+			"wait_s": round(max(0.0, collected - research_end), 3),
+			"stale": self._drafted_upto < len(self._findings),
+		}
+		if not self._outline:
+			return None, stats
+
+		outline = self._outline
+		if stats["stale"]:
+			outline += (
+				"\n\n(This outline was drafted from partial research. "
+				"Reconcile it with the complete research findings before writing.)"
+			)
+		return outline, stats
@@ -11,4 +11,5 @@ def build_document_graph(llm):
 	builder.add_node("note_taker", note_taking_node)
 	builder.add_node("chart_generator", chart_generating_node)
 	builder.add_edge(START, "supervisor")
-	return builder.compile()
\ No newline at end of file
+	# Runs inside a super graph step; only the super graph is checkpointed
+	return builder.compile(checkpointer=False)
\ No newline at end of file
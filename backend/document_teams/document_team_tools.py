@@ -1,12 +1,27 @@
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from tempfile import TemporaryDirectory
 from typing import Annotated, Dict, List, Optional
 
-from langchain_experimental.utilities import PythonREPL
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 
-_TEMP_DIRECTORY = TemporaryDirectory()
-WORKING_DIRECTORY = Path(_TEMP_DIRECTORY.name)
+from utils.artifacts import request_workspace
+from utils.context import current_request_id
+from utils.passage_index import get_passage_index
+from utils.repl_cache import get_repl_cache
+
+
+def _workspace() -> Path:
+    """Workspace of the current request, so its files can be listed and downloaded from /api/artifacts."""
+    return request_workspace()
+
+
+def __getattr__(name: str):
+    # Keep ``WORKING_DIRECTORY`` importable while deferring its creation; it resolves per request
+    if name == "WORKING_DIRECTORY":
+        return _workspace()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 @tool
@@ -15,7 +30,7 @@ def create_outline(
     file_name: Annotated[str, "File path to save the outline."],
 ) -> Annotated[str, "Path of the saved outline file."]:
     """Create and save an outline."""
-    with (WORKING_DIRECTORY / file_name).open("w") as file:
+    with (_workspace() / file_name).open("w") as file:
         for i, point in enumerate(points):
             file.write(f"{i + 1}. {point}\n")
     return f"Outline saved to {file_name}"
@@ -28,7 +43,7 @@ def read_document(
     end: Annotated[Optional[int], "The end line. Default is None"] = None,
 ) -> str:
     """Read the specified document."""
-    with (WORKING_DIRECTORY / file_name).open("r") as file:
+    with (_workspace() / file_name).open("r") as file:
         lines = file.readlines()
     if start is None:
         start = 0
@@ -41,7 +56,7 @@ def write_document(
     file_name: Annotated[str, "File path to save the document."],
 ) -> Annotated[str, "Path of the saved document file."]:
     """Create and save a text document."""
-    with (WORKING_DIRECTORY / file_name).open("w") as file:
+    with (_workspace() / file_name).open("w") as file:
         file.write(content)
     return f"Document saved to {file_name}"
 
@@ -56,7 +71,7 @@ def edit_document(
 ) -> Annotated[str, "Path of the edited document file."]:
     """Edit a document by inserting text at specific line numbers."""
 
-    with (WORKING_DIRECTORY / file_name).open("r") as file:
+    with (_workspace() / file_name).open("r") as file:
         lines = file.readlines()
 
     sorted_inserts = sorted(inserts.items())
@@ -67,15 +82,51 @@ def edit_document(
         else:
             return f"Error: Line number {line_number} is out of range."
 
-    with (WORKING_DIRECTORY / file_name).open("w") as file:
+    with (_workspace() / file_name).open("w") as file:
         file.writelines(lines)
 
     return f"Document edited and saved to {file_name}"
 
 
+@tool
+def search_passages(
+    query: Annotated[str, "What to look up in the scraped web pages."],
+    config: RunnableConfig,
+    k: Annotated[int, "Number of passages to return."] = 5,
+) -> str:
+    """Search the web pages scraped during research and return the most relevant passages with their source URLs."""
+    index = get_passage_index(config)
+    if index is None or not len(index):
+        return "No scraped pages are available to search."
+    hits = index.search([query], k=max(1, min(k, 20)))[0]
+    if not hits:
+        return f"No passages match: {query}"
+    return "\n\n".join(f"[{hit['source']}] (score {hit['score']})\n{hit['text']}" for hit in hits)
+
+
 # Warning: This executes code locally, which can be unsafe when not sandboxed
 
-repl = PythonREPL()
+# One REPL per request keeps variables and ``WORKING_DIRECTORY`` from leaking between concurrent runs
+_REPLS: "OrderedDict[str, object]" = OrderedDict()
+_MAX_REPLS = 64
+_REPLS_LOCK = threading.Lock()
+
+
+def _get_repl():
+    """The current request's REPL, created on first use; langchain_experimental is slow to import."""
+    from langchain_experimental.utilities import PythonREPL
+
+    request_id = current_request_id.get("")
+    with _REPLS_LOCK:
+        repl = _REPLS.get(request_id)
+        if repl is None:
+            repl = PythonREPL(_globals={"WORKING_DIRECTORY": str(_workspace())})
+            _REPLS[request_id] = repl
+            if len(_REPLS) > _MAX_REPLS:
+                _REPLS.popitem(last=False)
+        else:
+            _REPLS.move_to_end(request_id)
+    return repl
 
 
 @tool
@@ -83,22 +134,29 @@ def python_repl_tool(
     code: Annotated[str, "The python code to execute to generate your chart."],
 ):
     """Use this to execute python code. If you want to see the output of a value,
-    you should print it out with `print(...)`. This is visible to the user."""
+    you should print it out with `print(...)`. This is visible to the user.
+    Save charts and other files under the `WORKING_DIRECTORY` path variable so the user can download them."""
     try:
-        result = repl.run(code)
+        cache = get_repl_cache()
+        if cache is not None:
+            # Identical chart code on identical input files returns the stored output and files
+            result = cache.run(code, _workspace(), _get_repl())
+        else:
+            result = _get_repl().run(code)
     except BaseException as e:
         return f"Failed to execute. Error: {repr(e)}"
     return f"Successfully executed:\n\`\`\`python\n{code}\n\`\`\`\nStdout: {result}"
 
 
 # Convenient export for team wiring
-DOCUMENT_TEAM_TOOLS = [create_outline, read_document, write_document, edit_document, python_repl_tool]
+DOCUMENT_TEAM_TOOLS = [create_outline, read_document, write_document, edit_document, search_passages, python_repl_tool]
 __all__ = [
     "WORKING_DIRECTORY",
     "create_outline",
     "read_document",
     "write_document",
     "edit_document",
+    "search_passages",
     "python_repl_tool",
     "DOCUMENT_TEAM_TOOLS",
 ] 
\ No newline at end of file
@@ -1,23 +1,100 @@
-from typing import Tuple
+from typing import Any, Callable, Dict, Optional, Tuple
+import os
+import time
 from utils.supervisor import State, make_supervisor_node
 from langgraph.graph import StateGraph, START
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import AIMessage
 from langgraph.types import Command
+from langchain_core.runnables import RunnableConfig
 from research_teams.research_graph import build_research_graph
 from document_teams.document_graph import build_document_graph
-from utils.context import current_team
+from document_teams.document_agent import OutlinePrefetcher
+from utils.context import current_team, current_node, record_metric
+from utils.progress import emit_progress
+from utils.messages import agent_output, append_messages
+from utils.budget import get_budget, iterate_within, stage_budget, with_budget
+from utils.condense import condense_research
+from utils.team_pool import run_team
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def build_super_graph(llm):
+def build_team_runners(llm) -> Dict[str, Callable[[list, RunnableConfig], Any]]:
+	"""Team subgraph runs keyed by super graph node, each ``(messages, config) -> result``.
+
+	Built in the API process for inline execution and once per worker process
+	when ``TEAM_EXECUTION=process`` (see ``utils.team_pool``).
+	"""
+	research_graph = build_research_graph(llm)
+	paper_writing_graph = build_document_graph(llm)
+
+	pipeline_writing = os.getenv("PIPELINE_WRITING", "").lower() in {"1", "true", "yes"}
+
+	def run_research(messages: list, config: RunnableConfig) -> Tuple[Any, Optional[str]]:
+		"""Stream research updates, feeding partial results to the outline prefetcher when pipelined.
+
+		Stops waiting for the research graph once its latency budget is spent,
+		even in the middle of a long tool call, and stops the graph itself at
+		the next step of any of its agents.
+		"""
+		budget = get_budget(config)
+		prefetcher = OutlinePrefetcher(llm, messages[:1]) if pipeline_writing else None
+		research_start = time.time()
+		last = messages[-1]
+		# Agent steps inside the team are streamed too, only so the stream can be stopped between them
+		updates = iterate_within(budget, lambda: research_graph.stream(
+			{"messages": messages}, config, stream_mode="updates", subgraphs=True
+		))
+		for namespace, update in updates:
+			if namespace:
+				continue
+			for node_update in update.values():
+				for msg in (node_update or {}).get("messages", []):
+					last = msg
+					if prefetcher and getattr(msg, "name", None):
+						prefetcher.feed(msg.name, msg.content)
+		if budget and budget.expired():
+			logger.warning("Research team exceeded its latency budget, continuing with partial research")
+			record_metric("research_degraded", True)
+		if not prefetcher:
+			return last, None
+		outline, stats = prefetcher.collect(research_start, time.time())
+		logger.info(f"Writing team prefetch overlapped research by {stats['overlap_s']}s: {stats}")
+		record_metric("pipeline_writing", stats)
+		return last, outline
+
+	def run_writing(messages: list, config: RunnableConfig) -> Any:
+		"""Run the document team and return its final message."""
+		return paper_writing_graph.invoke({"messages": messages}, config)["messages"][-1]
+
+	return {"research_team": run_research, "writing_team": run_writing}
+
+
+def build_super_graph(llm, checkpointer=None):
 	"""Build hierarchical agent teams super graph with intelligent routing.
 	
 	Implements three-layer architecture:
 	1. Super Graph (this) - Top-level task coordinator
 	2. Team Graphs - Specialized teams (Research/Document)
 	3. Individual Agents - Tool-based reactive agents
+
+	Long research output is condensed into a cited brief before it is handed
+	to the writing team (``CONDENSE_RESEARCH``).
+
+	With ``PIPELINE_WRITING`` enabled the writing team's outline is drafted
+	from partial research results while the research team is still running.
+
+	A ``LatencyBudget`` in the run config is split across the teams. When
+	research runs out of its share the workflow moves on to writing with the
+	research gathered so far.
+
+	With ``TEAM_EXECUTION=process`` the team subgraphs run in a pool of worker
+	processes instead of this one.
+
+	A ``checkpointer`` records the super graph's state after each step, keyed
+	by the ``thread_id`` in the run config. The team subgraphs are not
+	checkpointed.
 	"""
 	logger.info("Building hierarchical agent teams super graph")
 	
@@ -25,33 +102,48 @@ def build_super_graph(llm):
 	teams_supervisor_node = make_supervisor_node(llm, ["research_team", "writing_team"])
 
 	# Build specialized team graphs
-	research_graph = build_research_graph(llm)
-	paper_writing_graph = build_document_graph(llm)
+	teams = build_team_runners(llm)
+
+	condense = os.getenv("CONDENSE_RESEARCH", "1").lower() in {"1", "true", "yes"}
+
+	def condense_stage(state: State, config: RunnableConfig, content: str) -> str:
+		"""Condense long research into a cited brief so writing-team prompts stay small."""
+		budget = stage_budget(config, "condense")
+		node_token = current_node.set("condense")
+		try:
+			brief, stats = condense_research(llm, content, state["messages"][0].content, budget)
+		finally:
+			if budget:
+				budget.finish()
+			current_node.reset(node_token)
+		if "output_chars" in stats:
+			logger.info(f"Condensed research from {stats['input_chars']} to {stats['output_chars']} chars: {stats}")
+		record_metric("research_condensed", stats)
+		return brief
 
-	def call_research_team(state: State) -> Command[str]:
+	def call_research_team(state: State, config: RunnableConfig) -> Command[str]:
 		"""Execute research team with context tracking and error handling."""
+		budget = stage_budget(config, "research_team")
 		try:
 			# Set context for research phase
 			token = current_team.set("research_team")
+			emit_progress("node_start")
 			
 			logger.info("Starting research team execution")
 			
 			# Execute research team graph
-			resp = research_graph.invoke({
-				"messages": state["messages"],
-			})
-			
-			last = resp["messages"][-1]
+			last, outline = run_team(teams, "research_team", state["messages"], with_budget(config, budget))
 			
 			logger.info("Research team completed successfully")
-			
-			return Command(
-				update={
-					"messages": [HumanMessage(content=last.content, name="research_team")],
-					"research_done": True
-				},
-				goto="supervisor",
-			)
+
+			content = condense_stage(state, config, last.content) if condense else last.content
+			update = {
+				"messages": [agent_output("research_team", content)],
+				"research_done": True
+			}
+			if outline:
+				update["outline_draft"] = outline
+			return Command(update=update, goto="supervisor")
 			
 		except Exception as e:
 			logger.error(f"Research team execution failed: {e}")
@@ -65,28 +157,33 @@ def build_super_graph(llm):
 				goto="supervisor",
 			)
 		finally:
+			if budget:
+				budget.finish()
+			emit_progress("node_end")
 			current_team.reset(token)
 
-	def call_writing_team(state: State) -> Command[str]:
+	def call_writing_team(state: State, config: RunnableConfig) -> Command[str]:
 		"""Execute document team as final stage with comprehensive output."""
+		budget = stage_budget(config, "writing_team")
 		try:
 			# Mark as final team for output filtering
 			token = current_team.set("final")
+			emit_progress("node_start", stage="writing_team")
 			
 			logger.info("Starting writing team execution")
 			
-			# Execute document team graph
-			resp = paper_writing_graph.invoke({
-				"messages": state["messages"],
-			})
-			
-			last = resp["messages"][-1]
+			# Execute document team graph, handing over any prefetched outline
+			messages = state["messages"]
+			if state.get("outline_draft"):
+				# On a copy, so the outline stays out of the super graph's own log
+				messages = append_messages(list(messages), [agent_output("outline_draft", state["outline_draft"])])
+			last = run_team(teams, "writing_team", messages, with_budget(config, budget))
 			
 			logger.info("Writing team completed successfully")
 			
 			return Command(
 				update={
-					"messages": [HumanMessage(content=last.content, name="writing_team")],
+					"messages": [agent_output("writing_team", last.content)],
 					"writing_done": True
 				},
 				goto="supervisor",
@@ -104,6 +201,9 @@ def build_super_graph(llm):
 				goto="supervisor",
 			)
 		finally:
+			if budget:
+				budget.finish()
+			emit_progress("node_end", stage="writing_team")
 			current_team.reset(token)
 
 	# Build hierarchical super graph
@@ -116,4 +216,4 @@ def build_super_graph(llm):
 	master.add_edge(START, "supervisor")
 	
 	logger.info("Hierarchical agent teams super graph built successfully")
-	return master.compile()
\ No newline at end of file
+	return master.compile(checkpointer=checkpointer)
\ No newline at end of file
@@ -2,52 +2,65 @@ from __future__ import annotations
 
 from typing import Literal, Tuple
 
-from langchain_core.messages import HumanMessage
 from utils.react_agent_factory import create_react_agent
 from langgraph.types import Command
+from langchain_core.runnables import RunnableConfig
 
 from research_teams.research_team_tools import search_web, scrape_webpages
 from utils.supervisor import make_team_supervisor_node, State
 from utils.context import current_team, current_node
+from utils.messages import agent_output
+from utils.progress import emit_progress
+from utils.budget import stage_budget, with_budget
 
 
 def build_research_team(llm) -> Tuple:
 	# ReAct-style tools-based agents
 	search_agent = create_react_agent(llm, tools=[search_web])
 
-	def search_node(state: State) -> Command[Literal["supervisor"]]:
+	def search_node(state: State, config: RunnableConfig) -> Command[Literal["supervisor"]]:
 		token = current_team.set("research_team")
 		token_node = current_node.set("search")
+		budget = stage_budget(config, "search", "agent")
 		try:
-			result = search_agent.invoke(state)
+			emit_progress("node_start")
+			result = search_agent.invoke(state, with_budget(config, budget))
 			return Command(
 				update={
 					"messages": [
-						HumanMessage(content=result["messages"][-1].content, name="search")
+						agent_output("search", result["messages"][-1].content)
 					]
 				},
 				goto="supervisor",
 			)
 		finally:
+			if budget:
+				budget.finish()
+			emit_progress("node_end")
 			current_node.reset(token_node)
 			current_team.reset(token)
 			
 	web_scraper_agent = create_react_agent(llm, tools=[scrape_webpages])
 	
-	def web_scraper_node(state: State) -> Command[Literal["supervisor"]]:
+	def web_scraper_node(state: State, config: RunnableConfig) -> Command[Literal["supervisor"]]:
 		token = current_team.set("research_team")
 		token_node = current_node.set("web_scraper")
+		budget = stage_budget(config, "web_scraper", "agent")
 		try:
-			result = web_scraper_agent.invoke(state)
+			emit_progress("node_start")
+			result = web_scraper_agent.invoke(state, with_budget(config, budget))
 			return Command(
 				update={
 					"messages": [
-						HumanMessage(content=result["messages"][-1].content, name="web_scraper")
+						agent_output("web_scraper", result["messages"][-1].content)
 					]
 				},
 				goto="supervisor",
 			)
 		finally:
+			if budget:
+				budget.finish()
+			emit_progress("node_end")
 			current_node.reset(token_node)
 			current_team.reset(token)
 
@@ -10,4 +10,5 @@ def build_research_graph(llm):
 	builder.add_node("search", search_node)
 	builder.add_node("web_scraper", web_scraper_node)
 	builder.add_edge(START, "supervisor")
-	return builder.compile()
\ No newline at end of file
+	# Runs inside a super graph step; only the super graph is checkpointed
+	return builder.compile(checkpointer=False)
\ No newline at end of file
@@ -1,8 +1,23 @@
 from __future__ import annotations
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import List
-import httpx
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 
+from utils.budget import get_budget
+from utils.dedup import get_page_dedup, record_savings
+from utils.passage_index import get_passage_index, visible_text
+from utils.state_store import get_state_store, get_store_writer
+
+# Per-URL timeout, further capped by the remaining latency budget
+SCRAPE_TIMEOUT_S = 15.0
+SCRAPE_MAX_PARALLEL = 8
+# Seconds a fetched page is shared with other requests and workers through the state store; 0 disables
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "0"))
+PAGE_CACHE_MAX_CHARS = 1_000_000
+
 
 @tool
 def search_web(query: str) -> str:
@@ -16,17 +31,58 @@ def search_web(query: str) -> str:
 	)
 
 
+def _fetch(url: str, timeout: float) -> str:
+	key = f"page:{hashlib.sha256(url.encode('utf-8')).hexdigest()}"
+	if PAGE_CACHE_TTL > 0:
+		cached = get_state_store().get_json(key)
+		if cached is not None:
+			return cached
+	import httpx  # Deferred until the first scrape to keep worker startup fast
+
+	resp = httpx.get(url, timeout=timeout)
+	resp.raise_for_status()
+	if PAGE_CACHE_TTL > 0 and len(resp.text) <= PAGE_CACHE_MAX_CHARS:
+		get_store_writer().set_json(key, resp.text, PAGE_CACHE_TTL)
+	return resp.text
+
+
 @tool
-def scrape_webpages(urls: List[str]) -> str:
+def scrape_webpages(urls: List[str], config: RunnableConfig) -> str:
 	"""Fetch the provided web pages using httpx and return their raw text content concatenated."""
-	texts: List[str] = []
-	for url in urls:
+	if not urls:
+		return ""
+	# Fetch concurrently so the slowest URL, not their sum, bounds the wait
+	budget = get_budget(config)
+	timeout = min(SCRAPE_TIMEOUT_S, budget.remaining()) if budget else SCRAPE_TIMEOUT_S
+	executor = ThreadPoolExecutor(max_workers=min(len(urls), SCRAPE_MAX_PARALLEL))
+	try:
+		futures = [executor.submit(_fetch, url, timeout) for url in urls]
+		wait(futures, timeout=timeout + 1)
+	finally:
+		executor.shutdown(wait=False, cancel_futures=True)
+	index = get_passage_index(config)
+	dedup = get_page_dedup(config)
+	texts = []
+	for url, future in zip(urls, futures):
+		if not future.done() or future.cancelled():
+			texts.append(f"<Document url=\"{url}\">\nERROR: latency budget exhausted before fetch completed\n</Document>")
+			continue
 		try:
-			resp = httpx.get(url, timeout=15)
-			resp.raise_for_status()
-			texts.append(f"<Document url=\"{url}\">\n{resp.text[:10000]}\n</Document>")
+			page = future.result()
 		except Exception as e:
 			texts.append(f"<Document url=\"{url}\">\nERROR: {e}\n</Document>")
+			continue
+		text = visible_text(page)
+		duplicate_of = dedup.check(text, url) if dedup is not None else None
+		if duplicate_of:
+			# Mirrored or syndicated copy of a page already returned: keep the citation, not the text
+			record_savings(page[:10000], "pages_collapsed")
+			texts.append(f"<Document url=\"{url}\">\nNear-duplicate of {duplicate_of}; content omitted.\n</Document>")
+			continue
+		if index is not None:
+			# The whole page is searchable by the writing team, not just the excerpt below
+			index.add(text, source=url)
+		texts.append(f"<Document url=\"{url}\">\n{page[:10000]}\n</Document>")
 	return "\n\n".join(texts)
 
 
@@ -0,0 +1,68 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+PythonREPL = pytest.importorskip("langchain_experimental.utilities").PythonREPL
+
+from utils import repl_cache  # noqa: E402
+from utils.repl_cache import ReplCache  # noqa: E402
+
+outcomes = []
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+	monkeypatch.setattr(repl_cache, "record_cache_use", lambda outcome, saved_s=0.0: outcomes.append(outcome))
+	outcomes.clear()
+	return ReplCache(tmp_path / "cache", max_bytes=1 << 20)
+
+
+def _repl(workspace: Path) -> PythonREPL:
+	return PythonREPL(_globals={"WORKING_DIRECTORY": str(workspace)}, _locals={})
+
+
+def test_hit_binds_names_for_follow_up_calls(cache, tmp_path):
+	code = "data = [1, 2, 3]\nprint(sum(data))"
+	first, second = tmp_path / "a", tmp_path / "b"
+	first.mkdir()
+	second.mkdir()
+
+	assert cache.run(code, first, _repl(first)).strip() == "6"
+	repl = _repl(second)
+	assert cache.run(code, second, repl).strip() == "6"
+	assert outcomes == ["misses", "hits"]
+	assert repl.run("print(max(data))").strip() == "3"
+
+
+def test_runs_reading_the_workspace_path_are_not_shared(cache, tmp_path):
+	code = 'import pathlib\np = pathlib.Path(WORKING_DIRECTORY) / "out.txt"\np.write_text("x")\nprint("saved", p)'
+	first, second = tmp_path / "a", tmp_path / "b"
+	first.mkdir()
+	second.mkdir()
+
+	cache.run(code, first, _repl(first))
+	repl = _repl(second)
+	assert cache.run(code, second, repl).strip() == f"saved {second / 'out.txt'}"
+	assert outcomes == ["uncacheable", "uncacheable"]
+	assert repl.run("print(p.parent)").strip() == str(second)
+
+
+def test_hit_imports_bound_modules(cache, tmp_path):
+	code = "import math\nroot = math.sqrt(16)\nprint(root)"
+	cache.run(code, tmp_path, _repl(tmp_path))
+	repl = _repl(tmp_path)
+	cache.run(code, tmp_path, repl)
+	assert outcomes == ["misses", "hits"]
+	assert repl.run("print(math.floor(root))").strip() == "4"
+
+
+def test_runs_binding_unpicklable_names_are_not_stored(cache, tmp_path):
+	code = "def double(x):\n    return 2 * x\nprint(double(2))"
+	cache.run(code, tmp_path, _repl(tmp_path))
+	repl = _repl(tmp_path)
+	assert cache.run(code, tmp_path, repl).strip() == "4"
+	assert outcomes == ["misses", "misses"]
+	assert repl.run("print(double(5))").strip() == "10"
@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import gzip
+import mimetypes
+import os
+import re
+import shutil
+import threading
+from email.utils import formatdate
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from .context import current_request_id
+from .sse import accepts_encoding
+
+# Serve gzip-encoded copies of text artifacts to clients that accept them: "gzip" or "off"
+ARTIFACT_COMPRESSION = os.getenv("ARTIFACT_COMPRESSION", "gzip").lower()
+ARTIFACT_GZIP_LEVEL = int(os.getenv("ARTIFACT_GZIP_LEVEL", "6"))
+ARTIFACT_MIN_COMPRESS_BYTES = 1024
+
+# Compressed copies live next to the originals in this hidden directory, left out of listings
+_COMPRESSED_DIR = ".gz"
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_COMPRESSIBLE = ("text/", "application/json", "application/xml", "application/javascript", "image/svg+xml")
+
+_TEMP_DIRECTORY: Optional[TemporaryDirectory] = None
+_WORKSPACE_ROOT: Optional[Path] = None
+_WORKSPACE_LOCK = threading.Lock()
+
+
+def workspace_root() -> Path:
+	"""Workspace for generated documents, created on first use rather than at import."""
+	global _TEMP_DIRECTORY, _WORKSPACE_ROOT
+	if _WORKSPACE_ROOT is None:
+		with _WORKSPACE_LOCK:
+			if _WORKSPACE_ROOT is None:
+				# Set WORKSPACE_DIR to a shared volume when running several workers or nodes
+				if os.getenv("WORKSPACE_DIR"):
+					workspace = Path(os.environ["WORKSPACE_DIR"])
+					workspace.mkdir(parents=True, exist_ok=True)
+				else:
+					_TEMP_DIRECTORY = TemporaryDirectory()
+					workspace = Path(_TEMP_DIRECTORY.name)
+				_WORKSPACE_ROOT = workspace
+	return _WORKSPACE_ROOT
+
+
+def request_workspace(request_id: Optional[str] = None) -> Path:
+	"""Directory holding the files a request generates; the workspace root outside of a request."""
+	request_id = request_id if request_id is not None else current_request_id.get("")
+	if not request_id:
+		return workspace_root()
+	if not _REQUEST_ID.match(request_id):
+		raise ValueError(f"Invalid request id: {request_id!r}")
+	directory = workspace_root() / request_id
+	directory.mkdir(exist_ok=True)
+	return directory
+
+
+def _existing_workspace(request_id: str) -> Optional[Path]:
+	if not _REQUEST_ID.match(request_id):
+		return None
+	directory = workspace_root() / request_id
+	return directory if directory.is_dir() else None
+
+
+def etag_of(stat_result: os.stat_result) -> str:
+	"""Strong validator from inode, modification time and size; changes whenever a tool rewrites the file."""
+	return f'"{stat_result.st_ino:x}-{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def media_type_of(path: Path) -> str:
+	return mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+
+def _hidden(relative: Path) -> bool:
+	return any(part.startswith(".") for part in relative.parts)
+
+
+def list_artifacts(request_id: str) -> Optional[List[Dict]]:
+	"""Files a request wrote to its workspace, or None when it has none."""
+	directory = _existing_workspace(request_id)
+	if directory is None:
+		return None
+	artifacts = []
+	for path in sorted(directory.rglob("*")):
+		relative = path.relative_to(directory)
+		if _hidden(relative) or not path.is_file():
+			continue
+		stat_result = path.stat()
+		artifacts.append({
+			"name": relative.as_posix(),
+			"size": stat_result.st_size,
+			"modified": stat_result.st_mtime,
+			"media_type": media_type_of(path),
+			"etag": etag_of(stat_result),
+		})
+	return artifacts
+
+
+def resolve_artifact(request_id: str, name: str) -> Optional[Path]:
+	"""Path of one artifact, or None if it does not exist or lies outside the request's workspace."""
+	directory = _existing_workspace(request_id)
+	if directory is None:
+		return None
+	path = (directory / name).resolve()
+	if not path.is_relative_to(directory.resolve()) or not path.is_file():
+		return None
+	if _hidden(path.relative_to(directory.resolve())):
+		return None
+	return path
+
+
+def _matches(header: str, etag: str) -> bool:
+	# Weak comparison, as If-None-Match requires
+	tags = [tag.strip() for tag in header.split(",")]
+	return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+	"""``(start, end)`` inclusive of a single ``bytes=`` range; (-1, -1) when unsatisfiable; None to ignore it."""
+	unit, _, spec = header.partition("=")
+	if unit.strip().lower() != "bytes" or "," in spec:
+		# Multipart byte ranges are not worth it here; the full file is a valid answer
+		return None
+	first, dash, last = spec.strip().partition("-")
+	if not dash:
+		return None
+	try:
+		if not first:
+			length = int(last)
+			if length <= 0:
+				return (-1, -1)
+			return (max(0, size - length), size - 1)
+		start = int(first)
+		end = int(last) if last else size - 1
+	except ValueError:
+		return None
+	if start >= size or end < start:
+		return (-1, -1)
+	return (start, min(end, size - 1))
+
+
+def _compressed_copy(path: Path, stat_result: os.stat_result) -> Path:
+	"""Gzip copy of ``path``, written once per version of the file and reused for later downloads."""
+	target = path.parent / _COMPRESSED_DIR / (path.name + ".gz")
+	try:
+		if target.stat().st_mtime_ns == stat_result.st_mtime_ns:
+			return target
+	except FileNotFoundError:
+		pass
+	target.parent.mkdir(exist_ok=True)
+	partial = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}")
+	with path.open("rb") as source, gzip.GzipFile(partial, "wb", compresslevel=ARTIFACT_GZIP_LEVEL, mtime=0) as sink:
+		shutil.copyfileobj(source, sink, 1024 * 1024)
+	# Stamp the copy with the original's mtime so a rewrite of the original invalidates it
+	os.utime(partial, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns))
+	os.replace(partial, target)
+	return target
+
+
+class FileRangeResponse(Response):
+	"""Sends ``count`` bytes of a file from ``offset``.
+
+	Uses the ASGI ``http.response.zerocopysend`` extension (``sendfile``) when
+	the server offers it, and otherwise reads the file in large chunks off the
+	event loop.
+	"""
+
+	chunk_size = 256 * 1024
+
+	def __init__(self, path: Path, offset: int, count: int, status_code: int, headers: Mapping[str, str], media_type: str):
+		self.path = path
+		self.offset = offset
+		self.count = count
+		self.status_code = status_code
+		self.media_type = media_type
+		self.background = None
+		self.init_headers({**headers, "content-length": str(count)})
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+		await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+		if scope["method"].upper() == "HEAD" or not self.count:
+			await send({"type": "http.response.body", "body": b"", "more_body": False})
+			return
+		with self.path.open("rb") as file:
+			if "http.response.zerocopysend" in scope.get("extensions", {}):
+				await send({
+					"type": "http.response.zerocopysend",
+					"file": file,
+					"offset": self.offset,
+					"count": self.count,
+					"more_body": False,
+				})
+				return
+			fd = file.fileno()
+			position, remaining = self.offset, self.count
+			while remaining:
+				chunk = await anyio.to_thread.run_sync(os.pread, fd, min(self.chunk_size, remaining), position)
+				if not chunk:
+					break
+				position += len(chunk)
+				remaining -= len(chunk)
+				await send({"type": "http.response.body", "body": chunk, "more_body": bool(remaining)})
+			if remaining:
+				# The file shrank while being sent; end the body rather than hang the client
+				await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def artifact_response(path: Path, request_headers: Mapping[str, str]) -> Response:
+	"""Conditional, ranged and optionally gzip-encoded download of a workspace file."""
+	stat_result = await anyio.to_thread.run_sync(path.stat)
+	media_type = media_type_of(path)
+	etag = etag_of(stat_result)
+	size = stat_result.st_size
+	compressible = (
+		ARTIFACT_COMPRESSION == "gzip"
+		and media_type.startswith(_COMPRESSIBLE)
+		and size >= ARTIFACT_MIN_COMPRESS_BYTES
+	)
+	headers = {
+		"accept-ranges": "bytes",
+		"cache-control": "private, no-cache",
+		"last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+	}
+	if compressible:
+		headers["vary"] = "Accept-Encoding"
+
+	byte_range = None
+	range_header = request_headers.get("range")
+	if_range = request_headers.get("if-range")
+	# If-Range needs a strong match; weak tags and dates never validate, so the full file is sent
+	if range_header and (if_range is None or if_range.strip() == etag):
+		byte_range = _parse_range(range_header, size)
+	encoded = compressible and byte_range is None and accepts_encoding(request_headers.get("accept-encoding"), "gzip")
+	if encoded:
+		# The gzip representation gets its own validator
+		etag = etag[:-1] + '-gz"'
+	headers["etag"] = etag
+
+	if_none_match = request_headers.get("if-none-match")
+	if if_none_match and _matches(if_none_match, etag):
+		return Response(status_code=304, headers=headers)
+	if byte_range == (-1, -1):
+		return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+	if byte_range is not None:
+		start, end = byte_range
+		headers["content-range"] = f"bytes {start}-{end}/{size}"
+		return FileRangeResponse(path, start, end - start + 1, 206, headers, media_type)
+	if encoded:
+		path = await anyio.to_thread.run_sync(_compressed_copy, path, stat_result)
+		headers["content-encoding"] = "gzip"
+		size = path.stat().st_size
+	return FileRangeResponse(path, 0, size, 200, headers, media_type)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from contextvars import copy_context
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Share of the parent's remaining time a stage may use when it starts.
+# Research gets half of what is left so writing always has time to run.
+STAGE_SHARES: Dict[str, float] = {
+	"supervisor": 0.1,
+	"research_team": 0.5,
+	"condense": 0.3,
+	"writing_team": 1.0,
+	"agent": 0.8,
+	"tool": 0.5,
+}
+
+CONFIG_KEY = "latency_budget"
+
+
+class LatencyBudget:
+	"""Request deadline split hierarchically across supervisors, teams, agents and tools.
+
+	A child stage gets a share of its parent's remaining time and never
+	outlives the parent's deadline. Finished stages are recorded in a ledger
+	shared by the whole tree so the consumption can be reported per request.
+	"""
+
+	def __init__(self, total_s: float, stage: str = "request", deadline: Optional[float] = None, ledger: Optional[List[dict]] = None):
+		self.stage = stage
+		self.started = time.monotonic()
+		self.deadline = deadline if deadline is not None else self.started + total_s
+		self.allotted = max(0.0, self.deadline - self.started)
+		self.ledger: List[dict] = ledger if ledger is not None else []
+
+	def remaining(self) -> float:
+		return max(0.0, self.deadline - time.monotonic())
+
+	def expired(self) -> bool:
+		return time.monotonic() >= self.deadline
+
+	def child(self, stage: str, kind: Optional[str] = None) -> "LatencyBudget":
+		"""Budget for a sub-stage, sized by the share configured for ``kind`` (defaults to ``stage``)."""
+		share = STAGE_SHARES.get(kind or stage, 1.0)
+		deadline = min(self.deadline, time.monotonic() + self.remaining() * share)
+		return LatencyBudget(0.0, stage=stage, deadline=deadline, ledger=self.ledger)
+
+	def finish(self) -> None:
+		used = time.monotonic() - self.started
+		self.ledger.append({
+			"stage": self.stage,
+			"allotted_s": round(self.allotted, 3),
+			"used_s": round(used, 3),
+			"exceeded": used > self.allotted,
+		})
+
+	def __enter__(self) -> "LatencyBudget":
+		return self
+
+	def __exit__(self, *exc: Any) -> None:
+		self.finish()
+
+	def report(self) -> Dict[str, Any]:
+		used = time.monotonic() - self.started
+		return {
+			"total_s": round(self.allotted, 3),
+			"used_s": round(used, 3),
+			"remaining_s": round(self.remaining(), 3),
+			"exceeded": [entry["stage"] for entry in self.ledger if entry["exceeded"]],
+			"stages": self.ledger,
+		}
+
+
+def get_budget(config: Optional[Dict[str, Any]] = None) -> Optional[LatencyBudget]:
+	"""Return the latency budget carried in a run config, or in the current run's config."""
+	if config is None:
+		from langchain_core.runnables.config import ensure_config
+		config = ensure_config()
+	return (config.get("configurable") or {}).get(CONFIG_KEY)
+
+
+def stage_budget(config: Optional[Dict[str, Any]], stage: str, kind: Optional[str] = None) -> Optional[LatencyBudget]:
+	"""Child budget for ``stage`` of the budget in ``config``, or None when the run has no budget."""
+	budget = get_budget(config)
+	return budget.child(stage, kind) if budget else None
+
+
+def with_budget(config: Optional[Dict[str, Any]], budget: Optional[LatencyBudget]) -> Dict[str, Any]:
+	"""Copy of ``config`` carrying ``budget`` for a nested graph, agent or tool invocation."""
+	config = dict(config or {})
+	config["configurable"] = {**(config.get("configurable") or {}), CONFIG_KEY: budget}
+	return config
+
+
+def iterate_within(budget: Optional[LatencyBudget], make_iterator: Callable[[], Iterable[T]]) -> Iterator[T]:
+	"""Items of ``make_iterator()`` until it ends or ``budget`` runs out.
+
+	With a budget the iterator runs on a helper thread, so one slow step (a
+	long tool call) cannot hold the caller past the deadline. Once the
+	deadline passes or the caller stops reading, the helper closes the
+	iterator at its next item instead of running it to the end, so a graph
+	stream should yield often (``subgraphs=True``).
+	"""
+	if budget is None:
+		yield from make_iterator()
+		return
+	items: "queue.Queue[tuple]" = queue.Queue()
+	stop = threading.Event()
+
+	def produce() -> None:
+		iterator = iter(make_iterator())
+		try:
+			for item in iterator:
+				if stop.is_set() or budget.expired():
+					return
+				items.put(("item", item))
+		except BaseException as e:
+			items.put(("error", e))
+			return
+		finally:
+			# Raises GeneratorExit in a graph stream, so it schedules no further steps
+			close = getattr(iterator, "close", None)
+			if close is not None:
+				close()
+		items.put(("done", None))
+
+	threading.Thread(target=copy_context().run, args=(produce,), name=f"{budget.stage}-iterator", daemon=True).start()
+	try:
+		while True:
+			try:
+				kind, item = items.get(timeout=budget.remaining())
+			except queue.Empty:
+				return
+			if kind == "error":
+				raise item
+			if kind == "done":
+				return
+			yield item
+	finally:
+		stop.set()
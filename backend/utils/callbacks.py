@@ -1,20 +1,28 @@
 from __future__ import annotations
 
 import asyncio
-import json
-from typing import Any, Dict, Set
+from typing import Any, Dict, Optional, Set
 
 from langchain_core.callbacks.base import AsyncCallbackHandler
 from langchain_core.outputs import LLMResult
 from .context import current_team, current_node
+from .sse import StreamEvent, dumps, token_frame
+from .tool_calling import ToolCallFilter
 
 
 class AsyncQueueCallbackHandler(AsyncCallbackHandler):
 
-    def __init__(self, queue: asyncio.Queue[str]):
+    def __init__(self, queue: asyncio.Queue[StreamEvent]):
         self.queue = queue
+        # The stream's event loop, for events relayed from other threads (team worker processes)
+        try:
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.loop = None
         self._suppress_runs: Set[str] = set()
         self._buffers: Dict[str, str] = {}
+        # Text-protocol tool calls are for the agent loop, not the reader
+        self._tool_call_filters: Dict[str, ToolCallFilter] = {}
 
     def _is_supervisor_prompt(self, messages: Any) -> bool:
         try:
@@ -97,80 +105,65 @@ class AsyncQueueCallbackHandler(AsyncCallbackHandler):
         elif run_id:
             # initialize buffer for this run
             self._buffers[run_id] = ""
+            self._tool_call_filters[run_id] = ToolCallFilter()
         return None
 
-    async def on_chat_model_stream(self, chunk: Any, **kwargs: Any) -> None:  # type: ignore[override]
+    def _discard_run(self, run_id: str) -> Optional[ToolCallFilter]:
+        self._buffers.pop(run_id, None)
+        return self._tool_call_filters.pop(run_id, None)
+
+    # Chat models report tokens and completion through the LLM callbacks
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:  # type: ignore[override]
         run_id = str(kwargs.get("run_id", ""))
         if run_id and run_id in self._suppress_runs:
             return
 
         # STRICT CHECK: only allow streaming from final team
         team = current_team.get("")
-        if team != "final":
+        if team != "final" or not token:
             return
 
-        content = getattr(chunk, "content", None)
-        if content:
-            text = str(content)
-
-            # Check if this chunk contains routing JSON or supervisor keywords
-            current_buffer = self._buffers.get(run_id, "") + text
-            if (self._contains_routing_json(current_buffer) or
-                self._contains_supervisor_keywords(current_buffer)):
-                # Mark this run for suppression
-                if run_id:
-                    self._suppress_runs.add(run_id)
+        # Check if the text so far contains routing JSON or supervisor keywords
+        current_buffer = self._buffers.get(run_id, "") + token
+        if (self._contains_routing_json(current_buffer) or
+            self._contains_supervisor_keywords(current_buffer)):
+            # Mark this run for suppression
+            if run_id:
+                self._suppress_runs.add(run_id)
+                self._discard_run(run_id)
+            return
+
+        if run_id:
+            self._buffers[run_id] = current_buffer
+
+        tool_call_filter = self._tool_call_filters.get(run_id)
+        if tool_call_filter is not None:
+            token = tool_call_filter.feed(token)
+            if not token:
                 return
 
-            if run_id:
-                self._buffers[run_id] = current_buffer
-
-            payload: Dict[str, Any] = {
-                "type": "token",
-                "content": text,
-            }
-            if team:
-                payload["team"] = team
-            node = current_node.get("")
-            if node:
-                payload["node"] = node
-            await self.queue.put(json.dumps(payload, ensure_ascii=False))
-
-    async def on_chat_model_end(self, response: Any, **kwargs: Any) -> None:  # type: ignore[override]
+        await self.queue.put(token_frame(token, team, current_node.get("")))
+
+    async def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:  # type: ignore[override]
         run_id = str(kwargs.get("run_id", ""))
+        tool_call_filter = self._discard_run(run_id)
         if run_id and run_id in self._suppress_runs:
             self._suppress_runs.discard(run_id)
             return  # Don't send end event for suppressed runs
-        # Clean up buffer
-        text = self._buffers.pop(run_id, "") if run_id else ""
 
         # Only send end event for final team
         team = current_team.get("")
-        if team == "final":
-            payload: Dict[str, Any] = {"type": "end"}
-            await self.queue.put(json.dumps(payload, ensure_ascii=False))
-
-    async def on_chat_model_error(self, error: Exception, **kwargs: Any) -> None:  # type: ignore[override]
-        payload: Dict[str, Any] = {"type": "error", "message": str(error)}
-        await self.queue.put(json.dumps(payload, ensure_ascii=False))
-
-    # --- Legacy LLM callbacks (for completeness) ---
-    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:  # type: ignore[override]
-        # Apply same filtering as chat model
-        team = current_team.get("")
-        if team != "final":
-            return
-        payload: Dict[str, Any] = {"type": "token", "content": token}
-        await self.queue.put(json.dumps(payload, ensure_ascii=False))
-
-    async def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:  # type: ignore[override]
-        # Apply same filtering as chat model
-        team = current_team.get("")
         if team != "final":
             return
+        rest = tool_call_filter.flush() if tool_call_filter is not None else ""
+        if rest:
+            await self.queue.put(token_frame(rest, team, current_node.get("")))
         payload: Dict[str, Any] = {"type": "end"}
-        await self.queue.put(json.dumps(payload, ensure_ascii=False))
+        await self.queue.put(dumps(payload))
 
     async def on_llm_error(self, error: Exception, **kwargs: Any) -> None:  # type: ignore[override]
+        run_id = str(kwargs.get("run_id", ""))
+        self._discard_run(run_id)
+        self._suppress_runs.discard(run_id)
         payload: Dict[str, Any] = {"type": "error", "message": str(error)}
-        await self.queue.put(json.dumps(payload, ensure_ascii=False))
+        await self.queue.put(dumps(payload))
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.base import (
+	WRITES_IDX_MAP,
+	BaseCheckpointSaver,
+	ChannelVersions,
+	Checkpoint,
+	CheckpointMetadata,
+	CheckpointTuple,
+	get_checkpoint_id,
+	get_checkpoint_metadata,
+)
+
+from .context import REQUEST_TTL_SECONDS
+from .state_store import StateStore, get_state_store, get_store_writer
+
+def _encode(typed: Tuple[str, bytes]) -> List[str]:
+	return [typed[0], base64.b64encode(typed[1]).decode("ascii")]
+
+
+def _decode(encoded: List[str]) -> Tuple[str, bytes]:
+	return encoded[0], base64.b64decode(encoded[1])
+
+
+class StoreCheckpointSaver(BaseCheckpointSaver):
+	"""LangGraph checkpointer over the shared state store, so any worker can look up a run's state.
+
+	Keys, per thread (the request id) and checkpoint namespace:
+	- ``checkpoint:<thread>:<ns>:<id>``   a checkpoint with its metadata and parent
+	- ``checkpoints:<thread>:<ns>``       checkpoint ids, oldest first
+	- ``writes:<thread>:<ns>:<id>``       pending writes of the tasks of a checkpoint
+
+	Writes go through the background ``StoreWriter``, so the graph does not
+	wait on SQLite or Redis between steps, and expire after ``STATE_REQUEST_TTL``.
+	"""
+
+	def __init__(self, store: Optional[StateStore] = None, ttl: float = REQUEST_TTL_SECONDS):
+		# Message logs and other non-JSON state values are pickled
+		super().__init__(serde=JsonPlusSerializer(pickle_fallback=True))
+		self.store = store or get_state_store()
+		self.ttl = ttl
+
+	def _tuple(self, thread_id: str, ns: str, checkpoint_id: str) -> Optional[CheckpointTuple]:
+		saved = self.store.get_json(f"checkpoint:{thread_id}:{ns}:{checkpoint_id}")
+		if saved is None:
+			return None
+		# Replays of a task's write keep the first one, as in LangGraph's own savers
+		writes: Dict[Tuple[str, int], Tuple[str, str, Any]] = {}
+		for write in self.store.range(f"writes:{thread_id}:{ns}:{checkpoint_id}"):
+			task_id, index, channel, value = json.loads(write)
+			writes.setdefault((task_id, index), (task_id, channel, self.serde.loads_typed(_decode(value))))
+		parent_id = saved["parent"]
+		return CheckpointTuple(
+			config={"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}},
+			checkpoint=self.serde.loads_typed(_decode(saved["checkpoint"])),
+			metadata=self.serde.loads_typed(_decode(saved["metadata"])),
+			pending_writes=list(writes.values()),
+			parent_config=(
+				{"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": parent_id}}
+				if parent_id else None
+			),
+		)
+
+	def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+		thread_id = config["configurable"]["thread_id"]
+		ns = config["configurable"].get("checkpoint_ns", "")
+		checkpoint_id = get_checkpoint_id(config)
+		if not checkpoint_id:
+			ids = self.store.range(f"checkpoints:{thread_id}:{ns}", -1)
+			if not ids:
+				return None
+			checkpoint_id = ids[0]
+		return self._tuple(thread_id, ns, checkpoint_id)
+
+	def list(
+		self,
+		config: Optional[RunnableConfig],
+		*,
+		filter: Optional[Dict[str, Any]] = None,
+		before: Optional[RunnableConfig] = None,
+		limit: Optional[int] = None,
+	) -> Iterator[CheckpointTuple]:
+		if config is None:
+			raise ValueError("Listing checkpoints needs a thread_id")
+		thread_id = config["configurable"]["thread_id"]
+		namespaces = [config["configurable"]["checkpoint_ns"]] if "checkpoint_ns" in config["configurable"] else [
+			key[len(f"checkpoints:{thread_id}:"):] for key in self.store.keys(f"checkpoints:{thread_id}:")
+		]
+		wanted = get_checkpoint_id(config)
+		before_id = get_checkpoint_id(before) if before else None
+		for ns in namespaces:
+			# Checkpoint ids are time-ordered, so newest first is the reverse of insertion
+			for checkpoint_id in reversed(self.store.range(f"checkpoints:{thread_id}:{ns}")):
+				if (wanted and checkpoint_id != wanted) or (before_id and checkpoint_id >= before_id):
+					continue
+				item = self._tuple(thread_id, ns, checkpoint_id)
+				if item is None:
+					continue
+				if filter and any(item.metadata.get(key) != value for key, value in filter.items()):
+					continue
+				if limit is not None:
+					if limit <= 0:
+						return
+					limit -= 1
+				yield item
+
+	def put(
+		self,
+		config: RunnableConfig,
+		checkpoint: Checkpoint,
+		metadata: CheckpointMetadata,
+		new_versions: ChannelVersions,
+	) -> RunnableConfig:
+		thread_id = config["configurable"]["thread_id"]
+		ns = config["configurable"].get("checkpoint_ns", "")
+		writer = get_store_writer()
+		writer.set_json(f"checkpoint:{thread_id}:{ns}:{checkpoint['id']}", {
+			"checkpoint": _encode(self.serde.dumps_typed(checkpoint)),
+			"metadata": _encode(self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))),
+			"parent": config["configurable"].get("checkpoint_id"),
+		}, self.ttl)
+		writer.append(f"checkpoints:{thread_id}:{ns}", checkpoint["id"], self.ttl)
+		return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+	def put_writes(
+		self,
+		config: RunnableConfig,
+		writes: Sequence[Tuple[str, Any]],
+		task_id: str,
+		task_path: str = "",
+	) -> None:
+		thread_id = config["configurable"]["thread_id"]
+		ns = config["configurable"].get("checkpoint_ns", "")
+		key = f"writes:{thread_id}:{ns}:{config['configurable']['checkpoint_id']}"
+		writer = get_store_writer()
+		for index, (channel, value) in enumerate(writes):
+			write = [task_id, WRITES_IDX_MAP.get(channel, index), channel, _encode(self.serde.dumps_typed(value))]
+			writer.append(key, json.dumps(write, ensure_ascii=False), self.ttl)
+
+	def delete_thread(self, thread_id: str) -> None:
+		for prefix in ("checkpoint:", "checkpoints:", "writes:"):
+			for key in self.store.keys(f"{prefix}{thread_id}:"):
+				self.store.delete(key)
+
+	# The writes are queued, so only reads are moved off the event loop
+	async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+		return await asyncio.to_thread(self.get_tuple, config)
+
+	async def alist(
+		self,
+		config: Optional[RunnableConfig],
+		*,
+		filter: Optional[Dict[str, Any]] = None,
+		before: Optional[RunnableConfig] = None,
+		limit: Optional[int] = None,
+	) -> AsyncIterator[CheckpointTuple]:
+		items = await asyncio.to_thread(lambda: [*self.list(config, filter=filter, before=before, limit=limit)])
+		for item in items:
+			yield item
+
+	async def aput(
+		self,
+		config: RunnableConfig,
+		checkpoint: Checkpoint,
+		metadata: CheckpointMetadata,
+		new_versions: ChannelVersions,
+	) -> RunnableConfig:
+		return self.put(config, checkpoint, metadata, new_versions)
+
+	async def aput_writes(
+		self,
+		config: RunnableConfig,
+		writes: Sequence[Tuple[str, Any]],
+		task_id: str,
+		task_path: str = "",
+	) -> None:
+		self.put_writes(config, writes, task_id, task_path)
+
+	async def adelete_thread(self, thread_id: str) -> None:
+		await asyncio.to_thread(self.delete_thread, thread_id)
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, Dict, List, Optional, Tuple
+
+from .budget import LatencyBudget
+from .prompts import PromptTemplate
+
+logger = logging.getLogger(__name__)
+
+# Research longer than this is condensed before it reaches the writing team
+CONDENSE_THRESHOLD_CHARS = int(os.getenv("CONDENSE_THRESHOLD_CHARS", "6000"))
+CONDENSE_CHUNK_CHARS = int(os.getenv("CONDENSE_CHUNK_CHARS", "4000"))
+CONDENSE_MAX_PARALLEL = int(os.getenv("CONDENSE_MAX_PARALLEL", "4"))
+
+_URL_RE = re.compile(r"https?://[^\s)\]>\"'，。]+")
+
+MAP_PROMPT = PromptTemplate(
+	"You condense research notes for a writing team working on the request below. "
+	"Summarize the notes into concise bullet points. Keep every fact, figure, name and date "
+	"relevant to the request and drop boilerplate. Cite sources with their bracketed numbers, "
+	"e.g. [2]; never invent numbers.",
+	"Request:\n{request}\n\nSources:\n{sources}\n\nNotes (part {part} of {parts}):\n{chunk}",
+)
+
+REDUCE_PROMPT = PromptTemplate(
+	"Merge the partial research summaries below into one compact brief for a writing team working "
+	"on the request. Remove duplicates, group related points under short headings "
+	"and keep every source citation such as [2] attached to the facts it supports.",
+	"Request:\n{request}\n\n{summaries}",
+)
+
+
+def split_chunks(text: str, size: int = CONDENSE_CHUNK_CHARS) -> List[str]:
+	"""Split ``text`` on paragraph boundaries into chunks of at most ``size`` characters."""
+	chunks: List[str] = []
+	current = ""
+	for paragraph in re.split(r"\n\s*\n", text):
+		while len(paragraph) > size:
+			if current:
+				chunks.append(current)
+				current = ""
+			chunks.append(paragraph[:size])
+			paragraph = paragraph[size:]
+		if current and len(current) + len(paragraph) + 2 > size:
+			chunks.append(current)
+			current = ""
+		current = f"{current}\n\n{paragraph}" if current else paragraph
+	if current.strip():
+		chunks.append(current)
+	return chunks
+
+
+def number_sources(text: str) -> List[str]:
+	"""URLs in ``text`` in order of first appearance; citation ``[n]`` refers to entry ``n - 1``."""
+	seen: Dict[str, None] = {}
+	for url in _URL_RE.findall(text):
+		seen.setdefault(url.rstrip(".,;"), None)
+	return list(seen)
+
+
+def condense_research(llm: Any, text: str, request: str, budget: Optional[LatencyBudget] = None) -> Tuple[str, Dict[str, Any]]:
+	"""Map-reduce ``text`` into a brief with numbered source references.
+
+	Chunks are summarized concurrently (``CONDENSE_MAX_PARALLEL`` at a time),
+	then merged into a single brief. The source list is appended verbatim, so
+	citations survive even if the model drops a URL. Text under
+	``CONDENSE_THRESHOLD_CHARS``, or an exhausted budget, returns ``text``
+	unchanged; a failed chunk falls back to its raw text.
+	"""
+	stats: Dict[str, Any] = {"input_chars": len(text)}
+	if len(text) <= CONDENSE_THRESHOLD_CHARS:
+		return text, dict(stats, skipped="short")
+	if budget and budget.expired():
+		return text, dict(stats, skipped="budget")
+
+	started = time.time()
+	sources = number_sources(text)
+	chunks = split_chunks(text)
+
+	def summarize(part: int, chunk: str) -> str:
+		if budget and budget.expired():
+			return chunk
+		cited = [f"[{i + 1}] {url}" for i, url in enumerate(sources) if url in chunk]
+		messages = MAP_PROMPT.messages(request=request, sources="\n".join(cited) or "(none)", part=part + 1, parts=len(chunks), chunk=chunk)
+		try:
+			return llm.invoke(messages).content.strip() or chunk
+		except Exception as e:
+			logger.warning(f"Condensing research chunk {part + 1}/{len(chunks)} failed, keeping it verbatim: {e}")
+			return chunk
+
+	with ThreadPoolExecutor(max_workers=max(1, min(CONDENSE_MAX_PARALLEL, len(chunks))), thread_name_prefix="condense") as pool:
+		# One copy of the caller's context per chunk so callbacks and team/node attribution follow the calls
+		futures = [pool.submit(copy_context().run, summarize, part, chunk) for part, chunk in enumerate(chunks)]
+		summaries = [future.result() for future in futures]
+
+	brief = "\n\n".join(summaries)
+	if len(summaries) > 1 and not (budget and budget.expired()):
+		messages = REDUCE_PROMPT.messages(request=request, summaries="\n\n---\n\n".join(summaries))
+		try:
+			brief = llm.invoke(messages).content.strip() or brief
+		except Exception as e:
+			logger.warning(f"Reducing research summaries failed, using the concatenated summaries: {e}")
+	if sources:
+		brief += "\n\nSources:\n" + "\n".join(f"[{i + 1}] {url}" for i, url in enumerate(sources))
+
+	if len(brief) >= len(text):
+		return text, dict(stats, skipped="no_gain")
+	stats.update({
+		"output_chars": len(brief),
+		"chunks": len(chunks),
+		"sources": len(sources),
+		"elapsed_s": round(time.time() - started, 3),
+	})
+	return brief, stats
@@ -1,8 +1,12 @@
 from contextvars import ContextVar
+import os
 import uuid
 import time
 import logging
 
+from .registry import FINISHED_STATUSES, get_registry
+from .state_store import get_store_writer
+
 logger = logging.getLogger(__name__)
 
 # Core context variables for hierarchical agent teams
@@ -13,6 +17,20 @@ current_request_id: ContextVar[str] = ContextVar("current_request_id", default="
 # Minimal request metadata tracking
 _request_metadata: ContextVar[dict] = ContextVar("request_metadata", default=None)
 
+# How long request records are kept in the shared state store
+REQUEST_TTL_SECONDS = float(os.getenv("STATE_REQUEST_TTL", "3600"))
+
+
+def _persist_metadata(metadata: dict) -> None:
+	"""Mirror request metadata into the shared state store so other workers can look it up.
+
+	The write is queued for a background thread, so callers on the event loop do not wait on the store.
+	"""
+	try:
+		get_store_writer().set_json(f"request:{metadata['request_id']}", metadata, REQUEST_TTL_SECONDS)
+	except Exception as e:
+		logger.warning(f"Failed to persist request metadata: {e}")
+
 
 def init_request_context(conversation_id: str = None, user_message: str = None) -> str:
 	"""Initialize minimal request context."""
@@ -28,19 +46,46 @@ def init_request_context(conversation_id: str = None, user_message: str = None)
 		"status": "active"
 	}
 	_request_metadata.set(metadata)
+	get_registry().start(metadata)
+	_persist_metadata(metadata)
 	
 	logger.info(f"Initialized request context: {request_id}")
 	return request_id
 
 
+def restore_request_context(metadata: dict) -> None:
+	"""Adopt a request's metadata in another process (a team worker) without registering it there."""
+	current_request_id.set(metadata.get("request_id", ""))
+	_request_metadata.set(metadata)
+
+
 def update_request_status(status: str) -> None:
 	"""Update request status."""
 	metadata = _request_metadata.get()
 	if metadata:
 		metadata["status"] = status
 		metadata["updated_time"] = time.time()
+		get_registry().update_status(metadata["request_id"], status)
+		_persist_metadata(metadata)
+
+
+def finish_request(status: str) -> None:
+	"""Give the current request ``status`` unless it already finished; for cleanup in ``finally`` blocks.
+
+	Requests that never reach a terminal status would stay in the registry's active set for good.
+	"""
+	metadata = _request_metadata.get()
+	if metadata and metadata.get("status") not in FINISHED_STATUSES:
+		update_request_status(status)
 
 
 def get_request_metadata() -> dict:
 	"""Get current request metadata."""
-	return dict(_request_metadata.get() or {})
\ No newline at end of file
+	return dict(_request_metadata.get() or {})
+
+def record_metric(name: str, value) -> None:
+	"""Record a named metric on the current request (e.g. latency or savings)."""
+	metadata = _request_metadata.get()
+	if metadata is not None:
+		metadata.setdefault("metrics", {})[name] = value
+
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .context import get_request_metadata, record_metric
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1").lower() in {"1", "true", "yes"}
+# Pages: maximum Hamming distance between 64-bit SimHashes to count as near-duplicates
+DEDUP_PAGE_DISTANCE = int(os.getenv("DEDUP_PAGE_DISTANCE", "6"))
+# Paragraphs are too short for SimHash to be stable: minimum MinHash-estimated Jaccard similarity
+DEDUP_PARAGRAPH_SIMILARITY = float(os.getenv("DEDUP_PARAGRAPH_SIMILARITY", "0.6"))
+MINHASH_PERMUTATIONS = 64
+# Shorter paragraphs (headings, list items) are never collapsed
+DEDUP_MIN_PARAGRAPH_CHARS = int(os.getenv("DEDUP_MIN_PARAGRAPH_CHARS", "80"))
+
+# Outputs that are the user's deliverable are never rewritten
+DEDUP_EXEMPT = {"doc_writer", "writing_team", "outline_draft"}
+
+CONFIG_KEY = "page_dedup"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[一-鿿]")
+_CJK_RE = re.compile(r"[一-鿿]")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_BITS = np.arange(64, dtype=np.uint64)
+_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(20240607)
+_PERM_A = _rng.integers(1, 1 << 31, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 31, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_metrics_lock = threading.Lock()
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+	"""64-bit hashes of the word 3-shingles of ``text`` (character 3-grams for CJK)."""
+	tokens = _TOKEN_RE.findall(text.lower())
+	shingles = {" ".join(tokens[i:i + 3]) for i in range(max(1, len(tokens) - 2))} if tokens else set()
+	digests = b"".join(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in shingles)
+	return np.frombuffer(digests, dtype=">u8").astype(np.uint64)
+
+
+def simhash(text: str) -> int:
+	"""64-bit SimHash of ``text``; near-duplicate pages differ in few bits."""
+	hashes = _shingle_hashes(text)
+	if not len(hashes):
+		return 0
+	ones = ((hashes[:, None] >> _BITS) & np.uint64(1)).sum(axis=0)
+	return int(sum(1 << int(bit) for bit in np.flatnonzero(ones * 2 > len(hashes))))
+
+
+def minhash(text: str) -> np.ndarray:
+	"""MinHash signature; the share of equal positions estimates the Jaccard similarity of two texts."""
+	hashes = _shingle_hashes(text) & np.uint64(0xFFFFFFFF)
+	if not len(hashes):
+		return np.zeros(MINHASH_PERMUTATIONS, dtype=np.uint64)
+	return ((hashes[None, :] * _PERM_A[:, None] + _PERM_B[:, None]) % _PRIME).min(axis=1)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+	return float(np.mean(a == b))
+
+
+def distance(a: int, b: int) -> int:
+	return bin(a ^ b).count("1")
+
+
+def estimate_tokens(text: str) -> int:
+	"""Rough token count: one per CJK character, one per four other characters."""
+	cjk = len(_CJK_RE.findall(text))
+	return cjk + (len(text) - cjk) // 4
+
+
+def record_savings(chars: str, kind: str) -> None:
+	"""Add removed text to the request's ``dedup`` metric (bytes and estimated tokens saved)."""
+	with _metrics_lock:
+		stats = dict(get_request_metadata().get("metrics", {}).get("dedup") or {})
+		stats["bytes_saved"] = stats.get("bytes_saved", 0) + len(chars.encode("utf-8"))
+		stats["tokens_saved"] = stats.get("tokens_saved", 0) + estimate_tokens(chars)
+		stats[kind] = stats.get(kind, 0) + 1
+		record_metric("dedup", stats)
+
+
+def paragraph_fingerprints(text: str) -> List[np.ndarray]:
+	return [minhash(p) for p in _PARAGRAPH_RE.split(text) if len(p.strip()) >= DEDUP_MIN_PARAGRAPH_CHARS]
+
+
+def collapse_paragraphs(text: str, seen: List[np.ndarray]) -> Tuple[str, str]:
+	"""Drop paragraphs of ``text`` that near-duplicate ``seen`` or an earlier paragraph of ``text``.
+
+	Runs of dropped paragraphs collapse into one marker. Returns the new text
+	and the removed text.
+	"""
+	seen = list(seen)
+	kept: List[str] = []
+	removed: List[str] = []
+	run = 0
+	for paragraph in _PARAGRAPH_RE.split(text):
+		if len(paragraph.strip()) >= DEDUP_MIN_PARAGRAPH_CHARS:
+			fingerprint = minhash(paragraph)
+			if any(similarity(fingerprint, s) >= DEDUP_PARAGRAPH_SIMILARITY for s in seen):
+				removed.append(paragraph)
+				run += 1
+				continue
+			seen.append(fingerprint)
+		if run:
+			kept.append(f"[{run} near-duplicate paragraph(s) omitted]")
+			run = 0
+		kept.append(paragraph)
+	if run:
+		kept.append(f"[{run} near-duplicate paragraph(s) omitted]")
+	if not removed:
+		return text, ""
+	return "\n\n".join(kept), "\n\n".join(removed)
+
+
+class PageDeduplicator:
+	"""Per-request SimHashes of scraped pages, so mirrored or syndicated pages are collapsed."""
+
+	def __init__(self):
+		self._pages: List[Tuple[int, str]] = []
+		self._lock = threading.Lock()
+
+	def __getstate__(self) -> Dict[str, Any]:
+		return {"pages": list(self._pages)}
+
+	def __setstate__(self, state: Dict[str, Any]) -> None:
+		self._pages = state["pages"]
+		self._lock = threading.Lock()
+
+	def merge(self, other: "PageDeduplicator") -> int:
+		"""Register the pages of ``other`` (e.g. seen in a worker process) not already here."""
+		with other._lock:
+			pages = list(other._pages)
+		with self._lock:
+			known = set(self._pages)
+			added = [page for page in pages if page not in known]
+			self._pages.extend(added)
+		return len(added)
+
+	def check(self, text: str, url: str) -> Optional[str]:
+		"""Return the URL of an earlier near-duplicate of ``text``, or register it and return ``None``."""
+		fingerprint = simhash(text)
+		with self._lock:
+			for other, other_url in self._pages:
+				if other_url != url and distance(fingerprint, other) <= DEDUP_PAGE_DISTANCE:
+					return other_url
+			self._pages.append((fingerprint, url))
+		return None
+
+
+def get_page_dedup(config: Optional[Dict[str, Any]]) -> Optional[PageDeduplicator]:
+	"""Return the page deduplicator carried in a run config, if any."""
+	return ((config or {}).get("configurable") or {}).get(CONFIG_KEY)
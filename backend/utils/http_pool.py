@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_async_client = None
+_lock = threading.Lock()
+
+
+def _http2_enabled() -> bool:
+	if os.getenv("LLM_HTTP2", "1").lower() not in {"1", "true", "yes"}:
+		return False
+	try:
+		import h2  # noqa: F401  httpx needs the h2 package for HTTP/2
+	except ImportError:
+		return False
+	return True
+
+
+def _client_options() -> Dict[str, Any]:
+	import httpx
+
+	return {
+		"http2": _http2_enabled(),
+		"limits": httpx.Limits(
+			max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100")),
+			max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20")),
+			keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_S", "60")),
+		),
+		"timeout": httpx.Timeout(float(os.getenv("LLM_HTTP_TIMEOUT_S", "120")), connect=10.0),
+	}
+
+
+def get_http_client():
+	"""Process-wide pooled ``httpx.Client`` shared by all synchronous model calls."""
+	global _client
+	if _client is None:
+		with _lock:
+			if _client is None:
+				import httpx
+
+				options = _client_options()
+				_client = httpx.Client(**options)
+				logger.info(f"Created shared LLM HTTP pool (http2={options['http2']})")
+	return _client
+
+
+def get_async_http_client():
+	"""Process-wide pooled ``httpx.AsyncClient`` for async model calls on the server's event loop."""
+	global _async_client
+	if _async_client is None:
+		with _lock:
+			if _async_client is None:
+				import httpx
+
+				_async_client = httpx.AsyncClient(**_client_options())
+	return _async_client
+
+
+def model_client_kwargs(pooled: Optional[bool] = None) -> Dict[str, Any]:
+	"""Keyword arguments that make an OpenAI-compatible chat model use the shared pool.
+
+	Disabled with ``LLM_HTTP_POOL=0``, in which case every model client opens
+	its own connections.
+	"""
+	if pooled is None:
+		pooled = os.getenv("LLM_HTTP_POOL", "1").lower() in {"1", "true", "yes"}
+	if not pooled:
+		return {}
+	return {"http_client": get_http_client(), "http_async_client": get_async_http_client()}
+
+
+async def close_http_clients() -> None:
+	"""Close the shared pools on shutdown."""
+	global _client, _async_client
+	if _async_client is not None:
+		await _async_client.aclose()
+		_async_client = None
+	if _client is not None:
+		_client.close()
+		_client = None
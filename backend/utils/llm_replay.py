@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage, message_chunk_to_message, message_to_dict, messages_from_dict
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import ConfigDict, PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+# Inter-token timing when replaying: "zero" serves everything at once, "recorded"
+# reproduces the recorded time to first token and gaps between chunks
+REPLAY_DELAYS = ("zero", "recorded")
+
+
+class ReplayMissError(KeyError):
+	"""Raised in replay mode when no response was recorded for a conversation."""
+
+
+def message_key(messages: Sequence[Any]) -> str:
+	"""Stable hash of a model input: roles, whitespace-normalized content and tool calls (ids ignored)."""
+	normalized = []
+	for m in messages:
+		if isinstance(m, dict):
+			role, content, tool_calls = m.get("role"), m.get("content"), m.get("tool_calls")
+		else:
+			role, content, tool_calls = m.type, m.content, getattr(m, "tool_calls", None)
+		calls = [[c.get("name"), c.get("args")] for c in tool_calls or []]
+		normalized.append([role, " ".join(str(content or "").split()), calls])
+	payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+	return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def _open(path: str, mode: str):
+	# ``.gz`` recordings are appended as gzip members, which readers concatenate
+	if path.endswith(".gz"):
+		return gzip.open(path, mode + "t", encoding="utf-8")
+	return open(path, mode, encoding="utf-8")
+
+
+class ResponseLog:
+	"""JSONL (optionally gzipped) file of recorded responses keyed by ``message_key``.
+
+	Each line holds the final message, its duration and, for streamed calls,
+	the chunks as compact ``[offset_ms, content, tool_call_chunks]`` triples.
+	Repeated requests for the same key are answered in recording order, with
+	the last response repeated once they run out.
+	"""
+
+	def __init__(self, path: str):
+		self.path = path
+		self._responses: Dict[str, List[Dict[str, Any]]] = {}
+		self._served: Dict[str, int] = {}
+		self._lock = threading.Lock()
+		if os.path.exists(path):
+			with _open(path, "r") as f:
+				for line in f:
+					if line.strip():
+						entry = json.loads(line)
+						entry["message"] = messages_from_dict([entry["message"]])[0]
+						self._responses.setdefault(entry["key"], []).append(entry)
+
+	def __len__(self) -> int:
+		return sum(len(v) for v in self._responses.values())
+
+	def next(self, key: str) -> Optional[Dict[str, Any]]:
+		with self._lock:
+			responses = self._responses.get(key)
+			if not responses:
+				return None
+			index = self._served.get(key, 0)
+			self._served[key] = index + 1
+			return responses[min(index, len(responses) - 1)]
+
+	def add(self, key: str, message: BaseMessage, duration_s: float, chunks: Optional[List[list]] = None) -> None:
+		entry: Dict[str, Any] = {"key": key, "duration_ms": round(duration_s * 1000, 1), "message": message_to_dict(message)}
+		if chunks is not None:
+			entry["chunks"] = chunks
+		line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+		with self._lock:
+			self._responses.setdefault(key, []).append(dict(entry, message=message))
+			with _open(self.path, "a") as f:
+				f.write(line + "\n")
+
+
+class RecordedChatModel(BaseChatModel):
+	"""Chat model that records a live model's responses, or replays them without a network.
+
+	With ``inner`` set every response, including streamed chunks and their
+	timing, is appended to ``path``; without it, responses are served from
+	``path`` (streamed when ``streaming`` is on, paced by ``replay_delay``) and
+	an unrecorded conversation raises ``ReplayMissError``. Pass it anywhere
+	``build_super_graph(llm)`` takes its model.
+	"""
+
+	model_config = ConfigDict(arbitrary_types_allowed=True)
+
+	path: str
+	inner: Optional[Any] = None
+	streaming: bool = False
+	replay_delay: str = "zero"
+	replay_speed: float = 1.0
+
+	_log: ResponseLog = PrivateAttr()
+
+	def __init__(self, **data: Any):
+		super().__init__(**data)
+		if "streaming" not in data and self.inner is not None:
+			self.streaming = bool(getattr(self.inner, "streaming", False))
+		if self.replay_delay not in REPLAY_DELAYS:
+			raise ValueError(f"replay_delay must be one of {REPLAY_DELAYS}, got {self.replay_delay!r}")
+		self._log = ResponseLog(self.path)
+		logger.info(f"{'Recording' if self.recording else 'Replaying'} model responses: {self.path} ({len(self._log)} recorded)")
+
+	@property
+	def recording(self) -> bool:
+		return self.inner is not None
+
+	@property
+	def _llm_type(self) -> str:
+		return "recorded-chat-model"
+
+	def bind_tools(self, tools: Sequence[Any], *, tool_choice: Optional[Any] = None, **kwargs: Any):
+		formatted = [convert_to_openai_tool(t) for t in tools]
+		if tool_choice is not None:
+			kwargs["tool_choice"] = tool_choice
+		return self.bind(tools=formatted, **kwargs)
+
+	def _replay_entry(self, messages: List[BaseMessage]) -> Dict[str, Any]:
+		key = message_key(messages)
+		entry = self._log.next(key)
+		if entry is None:
+			raise ReplayMissError(f"No recorded response for conversation {key} in {self.path}")
+		return entry
+
+	def _sleep_until(self, started: float, offset_ms: float) -> None:
+		if self.replay_delay == "recorded":
+			remaining = started + offset_ms / 1000 / self.replay_speed - time.perf_counter()
+			if remaining > 0:
+				time.sleep(remaining)
+
+	def _generate(
+		self,
+		messages: List[BaseMessage],
+		stop: Optional[List[str]] = None,
+		run_manager: Optional[CallbackManagerForLLMRun] = None,
+		**kwargs: Any,
+	) -> ChatResult:
+		if self.recording:
+			started = time.perf_counter()
+			result = self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+			self._log.add(message_key(messages), result.generations[0].message, time.perf_counter() - started)
+			return result
+		started = time.perf_counter()
+		entry = self._replay_entry(messages)
+		self._sleep_until(started, entry.get("duration_ms", 0))
+		return ChatResult(generations=[ChatGeneration(message=entry["message"].model_copy(deep=True))])
+
+	def _stream(
+		self,
+		messages: List[BaseMessage],
+		stop: Optional[List[str]] = None,
+		run_manager: Optional[CallbackManagerForLLMRun] = None,
+		**kwargs: Any,
+	) -> Iterator[ChatGenerationChunk]:
+		started = time.perf_counter()
+		if self.recording:
+			chunks: List[list] = []
+			final: Optional[AIMessageChunk] = None
+			for chunk in self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+				message = chunk.message
+				chunks.append([round((time.perf_counter() - started) * 1000, 1), message.content, getattr(message, "tool_call_chunks", None) or []])
+				final = message if final is None else final + message
+				yield chunk
+			if final is not None:
+				self._log.add(message_key(messages), message_chunk_to_message(final), time.perf_counter() - started, chunks)
+			return
+
+		entry = self._replay_entry(messages)
+		recorded = entry.get("chunks")
+		message = entry["message"]
+		if recorded is None:
+			# Recorded without streaming: serve the whole message as one chunk
+			calls = [
+				tool_call_chunk(name=c["name"], args=json.dumps(c["args"]), id=c.get("id"), index=i)
+				for i, c in enumerate(getattr(message, "tool_calls", None) or [])
+			]
+			recorded = [[entry.get("duration_ms", 0), message.content, calls]]
+		for i, (offset_ms, content, calls) in enumerate(recorded):
+			self._sleep_until(started, offset_ms)
+			last = i == len(recorded) - 1
+			chunk = ChatGenerationChunk(message=AIMessageChunk(
+				content=content,
+				tool_call_chunks=calls,
+				usage_metadata=getattr(message, "usage_metadata", None) if last else None,
+			))
+			if run_manager and content:
+				run_manager.on_llm_new_token(str(content), chunk=chunk)
+			yield chunk
+
+
+def model_from_env(build_llm: Callable[[], Any], streaming: bool = False) -> Any:
+	"""The model built by ``build_llm``, recorded or replaced per ``LLM_RECORD_PATH`` / ``LLM_REPLAY_PATH``.
+
+	In replay mode the live model is never built, so no API key or network is needed.
+	"""
+	replay_path = os.getenv("LLM_REPLAY_PATH", "")
+	if replay_path:
+		return RecordedChatModel(
+			path=replay_path,
+			streaming=streaming,
+			replay_delay=os.getenv("LLM_REPLAY_DELAY", "zero"),
+			replay_speed=float(os.getenv("LLM_REPLAY_SPEED", "1")),
+		)
+	llm = build_llm()
+	record_path = os.getenv("LLM_RECORD_PATH", "")
+	return RecordedChatModel(path=record_path, inner=llm) if record_path else llm
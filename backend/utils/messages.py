@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import threading
+from collections.abc import Sequence
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Optional, Union
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, convert_to_messages
+
+from .dedup import DEDUP_ENABLED, DEDUP_EXEMPT, collapse_paragraphs, paragraph_fingerprints, record_savings
+
+_LC_TYPES = {"user": "human", "assistant": "ai"}
+
+
+class MessageRecord:
+	"""Slotted stand-in for a LangChain message inside graph state.
+
+	Team nodes append agent outputs as records instead of building a pydantic
+	message per hop. The content string is shared with the source message,
+	not copied, and the LangChain message is only built (once) when the record
+	crosses the LLM boundary.
+	"""
+
+	__slots__ = ("role", "content", "name", "_lc", "_fingerprints")
+
+	def __init__(self, role: str, content: str, name: Optional[str] = None):
+		self.role = role
+		self.content = content
+		self.name = name
+		self._lc: Optional[BaseMessage] = None
+		# Paragraph fingerprints for near-duplicate collapsing, computed once when first appended
+		self._fingerprints: Optional[list] = None
+
+	@property
+	def type(self) -> str:
+		return _LC_TYPES.get(self.role, self.role)
+
+	def to_langchain(self) -> BaseMessage:
+		if self._lc is None:
+			cls = AIMessage if self.role == "assistant" else HumanMessage
+			self._lc = cls(content=self.content, name=self.name)
+		return self._lc
+
+	def __repr__(self) -> str:
+		return f"MessageRecord(role={self.role!r}, name={self.name!r}, content={self.content[:40]!r})"
+
+
+class _Buffer:
+	__slots__ = ("items", "lock")
+
+	def __init__(self, items: List[Any]):
+		self.items = items
+		self.lock = threading.Lock()
+
+
+class MessageLog(Sequence):
+	"""Immutable view over a prefix of an append-only message buffer.
+
+	Appending to the newest view extends the shared buffer in place and
+	returns a longer view, so each graph hop costs O(new messages) instead of
+	copying the whole history. Appending to an older view forks a copy, which
+	keeps every view's contents stable.
+	"""
+
+	__slots__ = ("_buffer", "_length")
+
+	def __init__(self, items: Iterable[Any] = ()):
+		self._buffer = _Buffer(list(items))
+		self._length = len(self._buffer.items)
+
+	@classmethod
+	def _view(cls, buffer: _Buffer, length: int) -> "MessageLog":
+		view = cls.__new__(cls)
+		view._buffer = buffer
+		view._length = length
+		return view
+
+	def extend(self, messages: Iterable[Any]) -> "MessageLog":
+		messages = list(messages)
+		buffer = self._buffer
+		with buffer.lock:
+			if len(buffer.items) == self._length:
+				buffer.items.extend(messages)
+				return self._view(buffer, len(buffer.items))
+		return MessageLog(list(self) + messages)
+
+	def __len__(self) -> int:
+		return self._length
+
+	def __getitem__(self, index: Union[int, slice]) -> Any:
+		if isinstance(index, slice):
+			return self._buffer.items[:self._length][index]
+		if index < 0:
+			index += self._length
+		if not 0 <= index < self._length:
+			raise IndexError("MessageLog index out of range")
+		return self._buffer.items[index]
+
+	def __iter__(self) -> Iterator[Any]:
+		return islice(self._buffer.items, self._length)
+
+	def __add__(self, other: Iterable[Any]) -> List[Any]:
+		return list(self) + list(other)
+
+	def __radd__(self, other: Iterable[Any]) -> List[Any]:
+		return list(other) + list(self)
+
+	def __repr__(self) -> str:
+		return f"MessageLog({list(self)!r})"
+
+	def __reduce__(self):
+		# Only this view's messages, not the shared buffer and its lock (checkpoints pickle state)
+		return MessageLog, (list(self),)
+
+
+def _collapse_duplicates(left: MessageLog, right: List[Any]) -> List[Any]:
+	"""Replace paragraphs of new agent outputs that repeat earlier ones with a short marker.
+
+	Only ``MessageRecord`` outputs are touched, and never the deliverables in
+	``DEDUP_EXEMPT``; fingerprints are cached on each record so every hop
+	only fingerprints the new messages.
+	"""
+	seen: Optional[list] = None
+	result = []
+	for m in right:
+		if isinstance(m, MessageRecord) and m._fingerprints is None:
+			if seen is None:
+				seen = []
+				for earlier in left:
+					if isinstance(earlier, MessageRecord):
+						if earlier._fingerprints is None:
+							earlier._fingerprints = paragraph_fingerprints(earlier.content)
+						seen.extend(earlier._fingerprints)
+			if m.role == "user" and m.name not in DEDUP_EXEMPT:
+				content, removed = collapse_paragraphs(m.content, seen)
+				if removed:
+					record_savings(removed, "paragraphs_collapsed")
+					m = MessageRecord(m.role, content, name=m.name)
+			m._fingerprints = paragraph_fingerprints(m.content)
+			seen.extend(m._fingerprints)
+		result.append(m)
+	return result
+
+
+def append_messages(left: Any, right: Any) -> MessageLog:
+	"""Graph state reducer appending messages to a ``MessageLog``.
+
+	Replaces ``add_messages`` for state that only ever appends: no id
+	assignment or merge pass over the full history on every hop. With
+	``DEDUP_ENABLED``, near-duplicate paragraphs of new agent outputs are
+	collapsed against the history.
+	"""
+	if isinstance(right, (BaseMessage, MessageRecord, dict, str)):
+		right = [right]
+	if not isinstance(left, MessageLog):
+		if not left and isinstance(right, MessageLog):
+			# A subgraph starts from a copy of its parent's log. Sharing the buffer
+			# would save nothing: the subgraph's appends would grow it past the
+			# parent's view, and the parent's next append would fork a copy anyway.
+			return MessageLog(right)
+		left = MessageLog(left or ())
+	right = [m if isinstance(m, (BaseMessage, MessageRecord)) else convert_to_messages([m])[0] for m in right]
+	if DEDUP_ENABLED:
+		right = _collapse_duplicates(left, right)
+	return left.extend(right)
+
+
+def to_langchain(messages: Iterable[Any]) -> List[Any]:
+	"""Materialize messages as LangChain messages at the LLM boundary."""
+	return [m.to_langchain() if isinstance(m, MessageRecord) else m for m in messages]
+
+
+def agent_output(name: str, content: str) -> MessageRecord:
+	"""Record an agent's or team's output for its supervisor."""
+	return MessageRecord("user", content, name=name)
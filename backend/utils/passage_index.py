@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PASSAGE_INDEX_DIM = int(os.getenv("PASSAGE_INDEX_DIM", "1024"))
+PASSAGE_CHUNK_CHARS = int(os.getenv("PASSAGE_CHUNK_CHARS", "800"))
+PASSAGE_CHUNK_OVERLAP = 100
+# "request" gives every request its own index; "conversation" shares one across a conversation's requests
+PASSAGE_INDEX_SCOPE = os.getenv("PASSAGE_INDEX_SCOPE", "request").lower()
+PASSAGE_INDEX_MAX_CONVERSATIONS = int(os.getenv("PASSAGE_INDEX_MAX_CONVERSATIONS", "64"))
+
+CONFIG_KEY = "passage_index"
+
+# Latin words and numbers, plus single CJK characters (paired into bigrams below)
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[一-鿿]")
+_TAG_RE = re.compile(r"<(script|style)[^>]*>.*?</\1>|<[^>]+>", re.DOTALL | re.IGNORECASE)
+
+
+def visible_text(html: str) -> str:
+	"""Crude HTML-to-text for indexing: drop scripts, styles and tags, collapse whitespace."""
+	text = _TAG_RE.sub(" ", html)
+	return re.sub(r"[ \t\r\f\v]+", " ", re.sub(r"\n\s*\n+", "\n\n", text)).strip()
+
+
+def chunk_text(text: str, size: int = PASSAGE_CHUNK_CHARS, overlap: int = PASSAGE_CHUNK_OVERLAP) -> List[str]:
+	"""Split ``text`` into passages of about ``size`` characters with ``overlap`` between neighbours."""
+	text = text.strip()
+	if len(text) <= size:
+		return [text] if text else []
+	passages = []
+	start = 0
+	while start < len(text):
+		end = min(start + size, len(text))
+		if end < len(text):
+			# Prefer to break at a paragraph, sentence or word boundary
+			cut = max(text.rfind("\n", start, end), text.rfind(". ", start, end), text.rfind(" ", start, end))
+			if cut > start + size // 2:
+				end = cut + 1
+		passages.append(text[start:end].strip())
+		if end >= len(text):
+			break
+		start = max(end - overlap, start + 1)
+	return [p for p in passages if p]
+
+
+def _features(text: str) -> List[str]:
+	tokens = _TOKEN_RE.findall(text.lower())
+	# CJK has no spaces: use character bigrams alongside the words
+	bigrams = [a + b for a, b in zip(tokens, tokens[1:]) if len(a) == 1 and len(b) == 1 and a >= "一" and b >= "一"]
+	return tokens + bigrams
+
+
+class HashingEmbedder:
+	"""Signed feature hashing into a fixed-width, L2-normalized vector; CPU-only and stateless.
+
+	Stable across processes (CRC32 rather than Python's salted ``hash``).
+	"""
+
+	def __init__(self, dim: int = PASSAGE_INDEX_DIM):
+		self.dim = dim
+
+	def embed(self, texts: List[str]) -> np.ndarray:
+		rows, cols, signs = [], [], []
+		for row, text in enumerate(texts):
+			for feature in _features(text):
+				h = zlib.crc32(feature.encode("utf-8"))
+				rows.append(row)
+				cols.append(h % self.dim)
+				signs.append(1.0 if h & 0x80000000 else -1.0)
+		matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+		if rows:
+			np.add.at(matrix, (np.asarray(rows), np.asarray(cols)), np.asarray(signs, dtype=np.float32))
+		# Sublinear term frequency, then unit length so a dot product is the cosine
+		matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+		norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+		return matrix / np.maximum(norms, 1e-12)
+
+
+class PassageIndex:
+	"""Passages and their vectors in a growable NumPy matrix with batched cosine top-k search."""
+
+	def __init__(self, embedder: Optional[HashingEmbedder] = None):
+		self.embedder = embedder or HashingEmbedder()
+		self._vectors = np.zeros((256, self.embedder.dim), dtype=np.float32)
+		self._passages: List[Dict[str, str]] = []
+		self._seen: set = set()
+		self._lock = threading.Lock()
+
+	def __len__(self) -> int:
+		return len(self._passages)
+
+	def __getstate__(self) -> Dict[str, Any]:
+		# Shipped to and from team worker processes; the lock stays behind
+		with self._lock:
+			n = len(self._passages)
+			return {"embedder": self.embedder, "vectors": self._vectors[:n].copy(), "passages": list(self._passages)}
+
+	def __setstate__(self, state: Dict[str, Any]) -> None:
+		self.embedder = state["embedder"]
+		self._vectors = state["vectors"]
+		self._passages = state["passages"]
+		self._seen = {(p["source"], p["text"]) for p in self._passages}
+		self._lock = threading.Lock()
+
+	def _insert(self, vectors: np.ndarray, passages: List[Dict[str, Any]]) -> int:
+		# Filtering and inserting under one lock, so concurrent adds of a passage keep a single copy
+		with self._lock:
+			rows = []
+			for i, passage in enumerate(passages):
+				key = (passage["source"], passage["text"])
+				if key not in self._seen:
+					self._seen.add(key)
+					rows.append(i)
+			if not rows:
+				return 0
+			n = len(self._passages)
+			if n + len(rows) > len(self._vectors):
+				capacity = max(len(self._vectors) * 2, n + len(rows))
+				grown = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+				grown[:n] = self._vectors[:n]
+				self._vectors = grown
+			self._vectors[n:n + len(rows)] = vectors[rows]
+			self._passages.extend(passages[i] for i in rows)
+		return len(rows)
+
+	def merge(self, other: "PassageIndex") -> int:
+		"""Add the passages of ``other`` (e.g. indexed in a worker process) not already here."""
+		with other._lock:
+			n = len(other._passages)
+			vectors = other._vectors[:n]
+			passages = other._passages[:n]
+		return self._insert(vectors, passages)
+
+	def add(self, text: str, source: str = "") -> int:
+		"""Chunk, embed and add ``text``; returns the number of new passages."""
+		# Passages already indexed are skipped before the costly embedding; _insert rechecks under the lock
+		passages = [p for p in dict.fromkeys(chunk_text(text)) if (source, p) not in self._seen]
+		if not passages:
+			return 0
+		vectors = self.embedder.embed(passages)
+		return self._insert(vectors, [{"text": passage, "source": source} for passage in passages])
+
+	def search(self, queries: List[str], k: int = 5) -> List[List[Dict[str, Any]]]:
+		"""Top-``k`` passages per query, by cosine similarity, best first."""
+		with self._lock:
+			n = len(self._passages)
+			matrix = self._vectors[:n]
+			passages = self._passages[:n]
+		if not n or not queries:
+			return [[] for _ in queries]
+		scores = self.embedder.embed(queries) @ matrix.T
+		k = min(k, n)
+		top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+		results = []
+		for row, candidates in enumerate(top):
+			ranked = candidates[np.argsort(-scores[row, candidates])]
+			results.append([
+				dict(passages[i], score=round(float(scores[row, i]), 4))
+				for i in ranked if scores[row, i] > 0
+			])
+		return results
+
+
+_conversation_indexes: "OrderedDict[str, PassageIndex]" = OrderedDict()
+_conversation_lock = threading.Lock()
+
+
+def passage_index_for(conversation_id: Optional[str] = None) -> PassageIndex:
+	"""A fresh index per request, or the conversation's shared one when ``PASSAGE_INDEX_SCOPE=conversation``."""
+	if PASSAGE_INDEX_SCOPE != "conversation" or not conversation_id:
+		return PassageIndex()
+	with _conversation_lock:
+		index = _conversation_indexes.pop(conversation_id, None) or PassageIndex()
+		_conversation_indexes[conversation_id] = index
+		while len(_conversation_indexes) > PASSAGE_INDEX_MAX_CONVERSATIONS:
+			_conversation_indexes.popitem(last=False)
+	return index
+
+
+def get_passage_index(config: Optional[Dict[str, Any]]) -> Optional[PassageIndex]:
+	"""Return the passage index carried in a run config, if any."""
+	return ((config or {}).get("configurable") or {}).get(CONFIG_KEY)
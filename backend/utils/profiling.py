@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .context import current_node, current_team
+from .state_store import get_state_store
+
+logger = logging.getLogger(__name__)
+
+# Per-request profiling is only honoured when enabled for the deployment
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "").lower() in {"1", "true", "yes"}
+PROFILE_SAMPLE_INTERVAL_S = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000
+PROFILE_TTL_SECONDS = float(os.getenv("STATE_REQUEST_TTL", "3600"))
+PROFILE_MAX_DEPTH = 48
+
+# A sample whose innermost frame is one of these is waiting, not burning CPU
+_WAIT_FUNCTIONS = {
+	"wait", "select", "poll", "epoll", "recv", "recv_into", "read", "readinto", "acquire",
+	"sleep", "accept", "connect", "_worker", "get", "do_handshake", "getaddrinfo",
+}
+_WAIT_MODULES = ("socket.py", "ssl.py", "selectors.py", "threading.py", "queue.py", "base_events.py")
+
+current_profiler: ContextVar[Optional["RequestProfiler"]] = ContextVar("current_profiler", default=None)
+
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+
+
+def _location(frame) -> str:
+	code = frame.f_code
+	return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+
+def _is_waiting(frame) -> bool:
+	code = frame.f_code
+	return code.co_name in _WAIT_FUNCTIONS or code.co_filename.endswith(_WAIT_MODULES)
+
+
+class ProfilingCallbackHandler(BaseCallbackHandler):
+	"""Tells the profiler which threads run this request and which team/node they are in.
+
+	Runs inline in the thread that starts each chain, model call or tool.
+	"""
+
+	run_inline = True
+
+	def __init__(self, profiler: "RequestProfiler"):
+		self.profiler = profiler
+
+	def on_chain_start(self, serialized: Any, inputs: Any, **kwargs: Any) -> None:
+		self.profiler.enter()
+
+	def on_chain_end(self, outputs: Any, **kwargs: Any) -> None:
+		self.profiler.exit()
+
+	def on_chain_error(self, error: BaseException, **kwargs: Any) -> None:
+		self.profiler.exit()
+
+	def on_chat_model_start(self, serialized: Any, messages: Any, **kwargs: Any) -> None:
+		self.profiler.mark()
+
+	def on_tool_start(self, serialized: Any, input_str: str, **kwargs: Any) -> None:
+		self.profiler.mark()
+
+
+class RequestProfiler:
+	"""Sampled CPU profile and allocation snapshot for a single request.
+
+	A sampler thread reads the stacks of the threads this request runs on
+	every ``interval`` seconds and attributes each sample to the team/node the
+	thread last reported, split into CPU and waiting (model I/O, locks) by the
+	thread's CPU clock where the platform has one. The
+	event loop thread is shared with concurrent requests, and tracemalloc sees
+	the whole process, so both are most precise when profiling one request at
+	a time.
+	"""
+
+	def __init__(self, request_id: str, interval: float = PROFILE_SAMPLE_INTERVAL_S):
+		self.request_id = request_id
+		self.interval = interval
+		self.handler = ProfilingCallbackHandler(self)
+		self._loop_thread = threading.get_ident()
+		self._labels: Dict[int, Tuple[str, str]] = {self._loop_thread: ("api", "event_loop")}
+		# Chains running per thread; pooled threads are only sampled while working for this request
+		self._depth: Counter = Counter()
+		self._stages: Dict[Tuple[str, str], Counter] = {}
+		self._functions: Counter = Counter()
+		self._folded: Counter = Counter()
+		self._samples = 0
+		self._stop = threading.Event()
+		self._sampler = threading.Thread(target=self._run, name=f"profiler-{request_id[:8]}", daemon=True)
+		self._started = 0.0
+		self._snapshot: Optional[tracemalloc.Snapshot] = None
+
+	def mark(self) -> None:
+		"""Record the calling thread's current team/node."""
+		tid = threading.get_ident()
+		if tid in self._labels:
+			self._labels[tid] = (current_team.get("") or "graph", current_node.get("") or "-")
+
+	def enter(self) -> None:
+		"""A chain of this request started on the calling thread."""
+		tid = threading.get_ident()
+		self._depth[tid] += 1
+		self._labels[tid] = (current_team.get("") or "graph", current_node.get("") or "-")
+
+	def exit(self) -> None:
+		tid = threading.get_ident()
+		self._depth[tid] -= 1
+		if self._depth[tid] <= 0 and tid != self._loop_thread:
+			del self._depth[tid]
+			self._labels.pop(tid, None)
+
+	def start(self) -> "RequestProfiler":
+		global _tracemalloc_users
+		with _tracemalloc_lock:
+			if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+				tracemalloc.start(16)
+			_tracemalloc_users += 1
+		self._snapshot = tracemalloc.take_snapshot()
+		self._started = time.perf_counter()
+		self._sampler.start()
+		return self
+
+	def _cpu_time(self, tid: int) -> Optional[float]:
+		try:
+			return time.clock_gettime(time.pthread_getcpuclockid(tid))
+		except (AttributeError, OSError, ValueError):
+			return None
+
+	def _run(self) -> None:
+		own = threading.get_ident()
+		cpu_seen: Dict[int, float] = {}
+		last = time.perf_counter()
+		while not self._stop.wait(self.interval):
+			now = time.perf_counter()
+			elapsed, last = now - last, now
+			frames = sys._current_frames()
+			for tid, label in list(self._labels.items()):
+				frame = frames.get(tid)
+				if frame is None or tid == own:
+					continue
+				# Thread CPU clocks split the interval exactly; the innermost frame is the fallback
+				cpu = self._cpu_time(tid)
+				if cpu is not None and tid in cpu_seen:
+					busy = min(max((cpu - cpu_seen[tid]) / elapsed, 0.0), 1.0)
+				else:
+					busy = 0.0 if _is_waiting(frame) else 1.0
+				if cpu is not None:
+					cpu_seen[tid] = cpu
+				stage = self._stages.setdefault(label, Counter())
+				stage["cpu"] += busy * elapsed
+				stage["wait"] += (1 - busy) * elapsed
+				self._samples += 1
+				if busy > 0:
+					self._functions[_location(frame)] += busy * elapsed
+				stack = []
+				while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+					code = frame.f_code
+					stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+					frame = frame.f_back
+				self._folded[";".join([*label, *reversed(stack)])] += 1
+
+	def finish(self) -> Dict[str, Any]:
+		"""Stop sampling, diff allocations and return the report."""
+		global _tracemalloc_users
+		self._stop.set()
+		self._sampler.join(timeout=1.0)
+		duration = time.perf_counter() - self._started
+		allocations = []
+		if self._snapshot is not None and tracemalloc.is_tracing():
+			filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+			after = tracemalloc.take_snapshot().filter_traces(filters)
+			for stat in after.compare_to(self._snapshot.filter_traces(filters), "lineno")[:25]:
+				frame = stat.traceback[0]
+				allocations.append({
+					"location": f"{frame.filename}:{frame.lineno}",
+					"size_diff_kb": round(stat.size_diff / 1024, 1),
+					"count_diff": stat.count_diff,
+				})
+		with _tracemalloc_lock:
+			_tracemalloc_users -= 1
+			if _tracemalloc_users == 0:
+				tracemalloc.stop()
+		stages = [
+			{
+				"team": team,
+				"node": node,
+				"cpu_s": round(counts["cpu"], 3),
+				"wait_s": round(counts["wait"], 3),
+			}
+			for (team, node), counts in sorted(self._stages.items(), key=lambda item: -sum(item[1].values()))
+		]
+		return {
+			"request_id": self.request_id,
+			"duration_s": round(duration, 3),
+			"interval_ms": self.interval * 1000,
+			"samples": self._samples,
+			"stages": stages,
+			"top_functions": [
+				{"function": name, "cpu_s": round(seconds, 3)}
+				for name, seconds in self._functions.most_common(30)
+			],
+			"allocations": allocations,
+			"folded": "\n".join(f"{stack} {count}" for stack, count in self._folded.most_common()),
+		}
+
+
+def start_profiling(request_id: str) -> RequestProfiler:
+	"""Start profiling the current request; threads and stages are reported via ``current_profiler``."""
+	profiler = RequestProfiler(request_id).start()
+	current_profiler.set(profiler)
+	return profiler
+
+
+def finish_profiling(profiler: RequestProfiler) -> Dict[str, Any]:
+	"""Stop ``profiler`` and keep its report in the shared state store for the admin endpoints."""
+	current_profiler.set(None)
+	report = profiler.finish()
+	get_state_store().set_json(f"profile:{profiler.request_id}", report, PROFILE_TTL_SECONDS)
+	logger.info(f"Profiled request {profiler.request_id}: {report['samples']} samples over {report['duration_s']}s")
+	return report
+
+
+def mark_stage() -> None:
+	"""Attribute the calling thread to the current team/node of the request being profiled, if any."""
+	profiler = current_profiler.get()
+	if profiler is not None:
+		profiler.mark()
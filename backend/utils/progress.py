@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from .context import current_team, current_node, current_request_id
+from .registry import get_registry
+from .profiling import mark_stage
+from .sse import StreamEvent, dumps
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressEmitter:
+	"""Publish rate-limited progress events onto a request's stream queue.
+
+	Event kinds are ``node_start``, ``node_end``, ``tool_call`` and ``route``;
+	they are streamed as ``{"type": "progress"}`` separately from token events.
+
+	Events carry the current team/node from the context vars. They may be
+	emitted from graph worker threads, so they are handed to the event loop
+	thread-safely. A token bucket caps events per stream; events over the
+	budget are dropped and counted rather than delaying the agents.
+	"""
+
+	def __init__(
+		self,
+		queue: asyncio.Queue[StreamEvent],
+		loop: Optional[asyncio.AbstractEventLoop] = None,
+		max_per_second: float = 10.0,
+		burst: int = 20,
+	):
+		self.queue = queue
+		self.loop = loop or asyncio.get_running_loop()
+		self.rate = max_per_second
+		self.burst = burst
+		self.dropped = 0
+		self._tokens = float(burst)
+		self._last = time.monotonic()
+		self._lock = threading.Lock()
+
+	def _acquire(self) -> bool:
+		with self._lock:
+			now = time.monotonic()
+			self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+			self._last = now
+			if self._tokens < 1:
+				self.dropped += 1
+				return False
+			self._tokens -= 1
+			return True
+
+	def emit(self, event: str, **fields: Any) -> None:
+		if not self._acquire():
+			return
+		payload: Dict[str, Any] = {"type": "progress", "event": event}
+		team = current_team.get("")
+		if team:
+			payload["team"] = team
+		node = current_node.get("")
+		if node:
+			payload["node"] = node
+		payload.update(fields)
+		payload["ts"] = round(time.time(), 3)
+		try:
+			self.loop.call_soon_threadsafe(self.queue.put_nowait, dumps(payload))
+		except RuntimeError:
+			pass  # Stream already closed
+
+
+current_progress: ContextVar[Optional[ProgressEmitter]] = ContextVar("current_progress", default=None)
+
+
+def init_progress(queue: asyncio.Queue[StreamEvent]) -> Optional[ProgressEmitter]:
+	"""Attach a progress emitter to the current request unless disabled via PROGRESS_EVENTS."""
+	if os.getenv("PROGRESS_EVENTS", "1").lower() not in {"1", "true", "yes"}:
+		return None
+	emitter = ProgressEmitter(
+		queue,
+		max_per_second=float(os.getenv("PROGRESS_MAX_EVENTS_PER_SEC", "10")),
+	)
+	current_progress.set(emitter)
+	return emitter
+
+
+def emit_progress(event: str, **fields: Any) -> None:
+	"""Emit a progress event for the current request, if it has an emitter.
+
+	Stage changes are always recorded in the request registry, even when
+	progress streaming is disabled.
+	"""
+	if event in ("node_start", "node_end"):
+		get_registry().record_stage(current_request_id.get(""), current_team.get(""), current_node.get(""), event)
+		mark_stage()
+	emitter = current_progress.get()
+	if emitter is not None:
+		emitter.emit(event, **fields)
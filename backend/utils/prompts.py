@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from string import Formatter
+from typing import Any, Dict, List, Tuple
+
+# Kept free of LangChain imports so the API can build direct-answer prompts
+# before the agent graphs are loaded.
+
+
+def _compile(template: str) -> Tuple[Tuple[str, str], ...]:
+	segments = []
+	for literal, field, spec, conversion in Formatter().parse(template):
+		if spec or conversion:
+			raise ValueError(f"Prompt fields take no format spec or conversion: {{{field}}}")
+		segments.append((literal, field or ""))
+	return tuple(segments)
+
+
+class PromptTemplate:
+	"""A prompt split into static instructions and a variable tail, parsed once at import.
+
+	The instructions become the system message, identical byte for byte on
+	every call, and everything that varies (the request, agent outputs) comes
+	after them in a user message. Providers with automatic prompt caching
+	(OpenAI-compatible APIs cache on the longest shared prefix) then reuse the
+	instructions across calls and requests. ``bind`` fills per-graph constants
+	such as a team name into the instructions once.
+	"""
+
+	__slots__ = ("system", "_segments", "_bound")
+
+	def __init__(self, system: str, variable: str):
+		self.system = system
+		self._segments = _compile(variable)
+		self._bound: Dict[Tuple[Tuple[str, Any], ...], PromptTemplate] = {}
+
+	def bind(self, **constants: Any) -> "PromptTemplate":
+		"""This template with ``constants`` filled into the instructions; cached per value set."""
+		key = tuple(sorted(constants.items()))
+		bound = self._bound.get(key)
+		if bound is None:
+			bound = PromptTemplate.__new__(PromptTemplate)
+			bound.system = self.system.format(**constants)
+			bound._segments = self._segments
+			bound._bound = {}
+			self._bound[key] = bound
+		return bound
+
+	def render(self, **values: Any) -> str:
+		"""The variable tail with ``values`` filled in."""
+		return "".join(literal + (str(values[field]) if field else "") for literal, field in self._segments)
+
+	def messages(self, **values: Any) -> List[Dict[str, str]]:
+		"""Model input: the static system message, then the rendered variable part."""
+		return [{"role": "system", "content": self.system}, {"role": "user", "content": self.render(**values)}]
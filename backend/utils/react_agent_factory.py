@@ -1,90 +1,153 @@
 from __future__ import annotations
 from typing import Any, Dict, Iterable, List, Mapping, Sequence, Optional, Callable
 from typing_extensions import TypedDict, Annotated
-from langchain_core.messages import AnyMessage, BaseMessage, SystemMessage, ToolMessage
+from langchain_core.messages import AIMessage, AnyMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
 from langchain_core.tools import BaseTool
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
-from langgraph.graph.message import add_messages
+import logging
 import os
 
+from .progress import emit_progress
+from .budget import get_budget, with_budget
+from .tool_memo import get_tool_memo
+from .messages import append_messages, to_langchain
+from .tool_calling import parse_text_tool_calls, stream_tool_calls, text_protocol_prompt, to_text_protocol, tool_call_mode
+
+logger = logging.getLogger(__name__)
+
+# Closes a loop cut short while the model still wanted tools
+FINISH_INSTRUCTION = "No more tools can be used. Answer now with the information you already have."
+
 
 class AgentState(TypedDict):
-	messages: Annotated[Sequence[BaseMessage], add_messages]
+	messages: Annotated[Sequence[BaseMessage], append_messages]
+	iterations: int
+	# Latest non-empty content the model produced, the fallback answer
+	answer: str
 
 
 def create_react_agent(
 	model: Any,
 	tools: Iterable[BaseTool],
 	prompt: Optional[str] = None,
+	max_iterations: Optional[int] = None,
 ):
+	"""Build a ReAct loop alternating between the model and its tools.
+
+	The loop stops after ``max_iterations`` model calls (``REACT_MAX_ITERATIONS``
+	by default) or when the latency budget runs out. If the model still had
+	tool calls pending then, it is asked once more to answer without tools, or,
+	with no budget left, its latest non-empty content is the answer. Repeated
+	calls to idempotent tools are answered from the run's ``ToolMemo`` when one
+	is carried in the run config. How tool calls are obtained from the model
+	(provider tool calling, the streaming adapter or a text protocol) is
+	decided by ``tool_calling.tool_call_mode``.
+	"""
+	if max_iterations is None:
+		max_iterations = int(os.getenv("REACT_MAX_ITERATIONS", "6"))
 	tools = list(tools)
 	tools_by_name: Dict[str, BaseTool] = {t.name: t for t in tools if getattr(t, "name", None)}
 
-	# Enhanced DashScope detection
-	bailian_base = os.getenv("BAILIAN_BASE_URL", "").lower()
-	model_base = str(getattr(model, "base_url", "")).lower()
-	model_config = getattr(model, "_default_params", {})
-	model_name = str(model_config.get("model", "")).lower()
-	
-	is_dashscope = (
-		"dashscope" in bailian_base or 
-		"dashscope" in model_base or 
-		"aliyun" in model_base or
-		"dashscope" in model_name or
-		"qwen" in model_name or
-		"moonshot" in model_name
-	)
-	
-	env_disable = os.getenv("DISABLE_TOOL_CALLS", "").lower() in {"1", "true", "yes"}
-	env_force = os.getenv("FORCE_TOOL_CALLS", "").lower() in {"1", "true", "yes"}
-	enable_tools = (not is_dashscope and not env_disable) or env_force
-
-	# Debug logging (remove in production)
+	mode = tool_call_mode(model) if tools_by_name else "off"
+	enable_tools = mode != "off"
 	if os.getenv("DEBUG_TOOLS"):
-		print(f"DashScope detection: {is_dashscope}")
-		print(f"  bailian_base: {bailian_base}")
-		print(f"  model_base: {model_base}")
-		print(f"  model_name: {model_name}")
-		print(f"  enable_tools: {enable_tools}")
+		logger.info(f"Tool-call mode: {mode}")
 
 	bound_model = model
-	if enable_tools and hasattr(model, "bind_tools") and tools_by_name:
+	if mode in {"native", "adapter"} and hasattr(model, "bind_tools"):
 		bound_model = model.bind_tools(list(tools_by_name.values()))
 
-	def call_model(state: AgentState) -> Dict[str, List[AnyMessage]]:
-		msgs: List[AnyMessage] = list(state["messages"])  # type: ignore
-		if prompt:
-			msgs = [SystemMessage(content=prompt), *msgs]
-		resp = bound_model.invoke(msgs)
-		return {"messages": [resp]}
+	if mode == "text":
+		prompt = "\n\n".join(p for p in (prompt, text_protocol_prompt(tools_by_name.values())) if p)
+	system_message = SystemMessage(content=prompt) if prompt else None
+
+	def invoke(msgs: List[AnyMessage]) -> AIMessage:
+		if system_message:
+			msgs.insert(0, system_message)
+		if mode == "adapter":
+			return stream_tool_calls(bound_model, msgs)
+		if mode == "text":
+			return parse_text_tool_calls(bound_model.invoke(to_text_protocol(msgs)))
+		return bound_model.invoke(msgs)
 
-	def tool_node(state: AgentState) -> Dict[str, List[ToolMessage]]:
+	def call_model(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+		# Single materialization of the log into the LLM's input list
+		resp = invoke(to_langchain(state["messages"]))
+		return {
+			"messages": [resp],
+			"iterations": state.get("iterations", 0) + 1,
+			"answer": resp.content or state.get("answer", ""),
+		}
+
+	def finish(state: AgentState, config: RunnableConfig) -> Dict[str, List[AnyMessage]]:
+		# The pending tool calls never run, so that message is not an answer to publish
+		answer = state.get("answer", "")
+		budget = get_budget(config)
+		if not (budget and budget.expired()):
+			msgs = to_langchain(state["messages"])[:-1]
+			msgs.append(HumanMessage(content=FINISH_INSTRUCTION))
+			answer = invoke(msgs).content or answer
+		return {"messages": [AIMessage(content=answer)]}
+
+	def tool_node(state: AgentState, config: RunnableConfig) -> Dict[str, List[ToolMessage]]:
 		outputs: List[ToolMessage] = []
 		last = state["messages"][-1]
+		budget = get_budget(config)
+		memo = get_tool_memo(config)
 		for call in getattr(last, "tool_calls", []) or []:
 			name = call.get("name")
 			args = call.get("args", {})
 			tool = tools_by_name.get(name)
 			if tool is None:
 				continue
-			result = tool.invoke(args)
+			if budget and budget.expired():
+				# Let the agent answer with what it has instead of running more tools
+				result = "Skipped: the latency budget for this step is exhausted. Answer with the information you already have."
+				outputs.append(ToolMessage(content=result, name=name, tool_call_id=call.get("id")))
+				continue
+			result = memo.lookup(name, args) if memo else None
+			if result is not None:
+				emit_progress("tool_call", tool=name, memoized=True)
+				outputs.append(ToolMessage(content=result, name=name, tool_call_id=call.get("id")))
+				continue
+			emit_progress("tool_call", tool=name)
+			tool_budget = budget.child(f"tool:{name}", "tool") if budget else None
+			try:
+				result = tool.invoke(args, with_budget(config, tool_budget))
+			finally:
+				if tool_budget:
+					tool_budget.finish()
+			if memo:
+				memo.store(name, args, str(result))
 			outputs.append(ToolMessage(content=str(result), name=name, tool_call_id=call.get("id")))
 		return {"messages": outputs}
 
-	def should_continue(state: AgentState) -> str:
+	def should_continue(state: AgentState, config: RunnableConfig) -> str:
 		if not enable_tools:
 			return "end"
 		last = state["messages"][-1]
-		return "continue" if getattr(last, "tool_calls", []) else "end"
+		if not getattr(last, "tool_calls", []):
+			return "end"
+		budget = get_budget(config)
+		if budget and budget.expired():
+			return "finish"
+		if state.get("iterations", 0) >= max_iterations:
+			logger.warning(f"ReAct agent stopped after {max_iterations} iterations")
+			return "finish"
+		return "continue"
 
 	workflow = StateGraph(AgentState)
 	workflow.add_node("agent", call_model)
 	if enable_tools and tools_by_name:
 		workflow.add_node("tools", tool_node)
+		workflow.add_node("finish", finish)
 		workflow.set_entry_point("agent")
-		workflow.add_conditional_edges("agent", should_continue, {"continue": "tools", "end": END})
+		workflow.add_conditional_edges("agent", should_continue, {"continue": "tools", "finish": "finish", "end": END})
 		workflow.add_edge("tools", "agent")
+		workflow.add_edge("finish", END)
 	else:
 		workflow.set_entry_point("agent")
 		workflow.add_edge("agent", END)
-	return workflow.compile() 
\ No newline at end of file
+	# Runs inside a team step; only the super graph is checkpointed
+	return workflow.compile(checkpointer=False)
\ No newline at end of file
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Statuses after which a request moves from the active set to recent history
+FINISHED_STATUSES = {"completed", "failed", "cancelled"}
+
+
+class RequestRegistry:
+	"""In-process registry of active and recently finished requests.
+
+	Entries are the live request metadata dicts, so status, stage and metrics
+	updates are O(1) mutations. Finished requests are kept in insertion order
+	and the oldest are evicted beyond ``retention``.
+	"""
+
+	def __init__(self, retention: int = 200):
+		self.retention = retention
+		self._active: Dict[str, dict] = {}
+		self._finished: "OrderedDict[str, dict]" = OrderedDict()
+		self._lock = threading.Lock()
+
+	def start(self, metadata: dict) -> None:
+		with self._lock:
+			self._active[metadata["request_id"]] = metadata
+
+	def update_status(self, request_id: str, status: str) -> None:
+		if status not in FINISHED_STATUSES:
+			return
+		with self._lock:
+			metadata = self._active.pop(request_id, None)
+			if metadata is None:
+				return
+			self._finished[request_id] = metadata
+			while len(self._finished) > self.retention:
+				self._finished.popitem(last=False)
+
+	def record_stage(self, request_id: str, team: str, node: str, event: str) -> None:
+		metadata = self._active.get(request_id)
+		if metadata is not None:
+			metadata["team"] = team
+			metadata["node"] = node
+			metadata["stage_event"] = event
+			metadata["stage_time"] = time.time()
+
+	def _view(self, metadata: dict, now: float) -> dict:
+		view = dict(metadata)
+		end = metadata.get("updated_time", now) if metadata.get("status") in FINISHED_STATUSES else now
+		view["elapsed_s"] = round(end - metadata["start_time"], 3)
+		if metadata.get("status") not in FINISHED_STATUSES:
+			last_activity = max(metadata.get("stage_time", 0), metadata.get("updated_time", 0), metadata["start_time"])
+			view["idle_s"] = round(now - last_activity, 3)
+		return view
+
+	def get(self, request_id: str) -> Optional[dict]:
+		with self._lock:
+			metadata = self._active.get(request_id) or self._finished.get(request_id)
+		return self._view(metadata, time.time()) if metadata else None
+
+	def snapshot(self, limit: int = 50) -> Dict[str, List[dict]]:
+		"""Active requests (longest running first) and the most recently finished ones."""
+		now = time.time()
+		with self._lock:
+			active = list(self._active.values())
+			finished = list(self._finished.values())[-limit:]
+		active.sort(key=lambda m: m["start_time"])
+		return {
+			"active": [self._view(m, now) for m in active[:limit]],
+			"recent": [self._view(m, now) for m in reversed(finished)],
+		}
+
+
+_registry = RequestRegistry(retention=int(os.getenv("REQUEST_REGISTRY_RETENTION", "200")))
+
+
+def get_registry() -> RequestRegistry:
+	"""Return the process-wide request registry."""
+	return _registry
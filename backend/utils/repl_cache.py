@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import ast
+import builtins
+import hashlib
+import importlib
+import json
+import logging
+import os
+import pickle
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Dict, Optional, Set, Tuple
+
+from .artifacts import workspace_root
+from .context import get_request_metadata, record_metric
+
+logger = logging.getLogger(__name__)
+
+REPL_CACHE_ENABLED = os.getenv("REPL_CACHE_ENABLED", "1").lower() in {"1", "true", "yes"}
+# Defaults to a hidden directory in the workspace, so workers sharing WORKSPACE_DIR share the cache
+REPL_CACHE_DIR = os.getenv("REPL_CACHE_DIR", "")
+REPL_CACHE_MAX_BYTES = int(float(os.getenv("REPL_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+# Code touching these names can give a different result on every run
+_NONDETERMINISTIC = {
+	"random", "secrets", "uuid", "time", "datetime", "now", "today",
+	"requests", "httpx", "urllib", "socket", "subprocess", "input",
+}
+# ``WORKING_DIRECTORY`` is deliberately absent: it names the request's own workspace, so a stored
+# run that printed it or bound a path under it would leak that workspace into other requests
+_BUILTINS = set(dir(builtins))
+_FENCE_RE = re.compile(r"^(\s|`)*(?i:python)?\s*|(\s|`)*$")
+_FILE_NAME_RE = re.compile(r"/?[\w-][\w./-]*\.\w+")
+# PythonREPL returns ``repr(exception)`` in place of stdout when the code raises
+_EXCEPTION_RE = re.compile(r"^[A-Z]\w*(Error|Exception|Exit|Interrupt)\(.*\)$", re.DOTALL)
+_metrics_lock = threading.Lock()
+_MISSING = object()
+
+
+def normalize_code(code: str) -> Tuple[str, Optional[ast.Module]]:
+	"""Canonical form of ``code``: its AST dump, so formatting and comments do not change the key."""
+	code = _FENCE_RE.sub("", code)
+	try:
+		tree = ast.parse(code)
+	except SyntaxError:
+		return code, None
+	return ast.dump(tree), tree
+
+
+def _is_self_contained(tree: ast.Module) -> bool:
+	"""Whether the code only reads names it defines, so earlier REPL state cannot change its output,
+	and touches no clock, randomness or network."""
+	defined: Set[str] = set()
+	loaded: Set[str] = set()
+	used: Set[str] = set()
+	for node in ast.walk(tree):
+		if isinstance(node, ast.Name):
+			(loaded if isinstance(node.ctx, ast.Load) else defined).add(node.id)
+		elif isinstance(node, ast.alias):
+			defined.add((node.asname or node.name).split(".")[0])
+			used.update(node.name.split("."))
+		elif isinstance(node, ast.ImportFrom) and node.module:
+			used.update(node.module.split("."))
+		elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+			defined.add(node.name)
+		elif isinstance(node, ast.arg):
+			defined.add(node.arg)
+		elif isinstance(node, ast.Attribute):
+			used.add(node.attr)
+	if (loaded | used) & _NONDETERMINISTIC:
+		return False
+	return not loaded - defined - _BUILTINS
+
+
+def _referenced_files(tree: ast.Module) -> Set[str]:
+	"""File-like names in the code's string literals, e.g. ``"data.csv"`` or the tail of an f-string."""
+	names = set()
+	for node in ast.walk(tree):
+		if isinstance(node, ast.Constant) and isinstance(node.value, str) and _FILE_NAME_RE.fullmatch(node.value):
+			names.add(node.value.lstrip("/"))
+	return names
+
+
+def _sha256_file(path: Path) -> str:
+	digest = hashlib.sha256()
+	with path.open("rb") as file:
+		for block in iter(lambda: file.read(1024 * 1024), b""):
+			digest.update(block)
+	return digest.hexdigest()
+
+
+def _digest(path: Path) -> Optional[str]:
+	return _sha256_file(path) if path.is_file() else None
+
+
+def _snapshot(directory: Path) -> Dict[str, Tuple[int, int]]:
+	"""``name -> (mtime_ns, size)`` of the visible files under ``directory``."""
+	files = {}
+	for path in directory.rglob("*"):
+		relative = path.relative_to(directory)
+		if any(part.startswith(".") for part in relative.parts) or not path.is_file():
+			continue
+		stat_result = path.stat()
+		files[relative.as_posix()] = (stat_result.st_mtime_ns, stat_result.st_size)
+	return files
+
+
+def _bindings(repl: Any) -> Dict[str, Dict[str, Any]]:
+	"""Shallow copy of the REPL's namespaces; ``exec`` binds top-level names in ``locals``."""
+	return {"globals": dict(repl.globals), "locals": dict(repl.locals)}
+
+
+def _encode_bindings(before: Dict[str, Dict[str, Any]], repl: Any) -> Optional[bytes]:
+	"""Pickle of the names a run bound or rebound, or None if one of them cannot be stored.
+
+	Modules are kept by name and imported again on a hit.
+	"""
+	changed = {}
+	for scope, namespace in (("globals", repl.globals), ("locals", repl.locals)):
+		for name, value in namespace.items():
+			if name == "__builtins__" or before[scope].get(name, _MISSING) is value:
+				continue
+			if isinstance(value, ModuleType):
+				changed[(scope, name)] = ("module", value.__name__)
+			else:
+				changed[(scope, name)] = ("value", value)
+	try:
+		return pickle.dumps(changed)
+	except Exception:
+		# Functions and classes defined by the code, open files and the like
+		return None
+
+
+def _restore_bindings(data: bytes, repl: Any) -> None:
+	for (scope, name), (kind, value) in pickle.loads(data).items():
+		namespace = repl.globals if scope == "globals" else repl.locals
+		namespace[name] = importlib.import_module(value) if kind == "module" else value
+
+
+def record_cache_use(outcome: str, saved_s: float = 0.0) -> None:
+	"""Add a lookup to the request's ``repl_cache`` metric: hits, misses, uncacheable runs and execution time saved."""
+	with _metrics_lock:
+		stats = dict(get_request_metadata().get("metrics", {}).get("repl_cache") or {})
+		stats[outcome] = stats.get(outcome, 0) + 1
+		if outcome in ("hits", "misses"):
+			stats["lookups"] = stats.get("lookups", 0) + 1
+			stats["hit_rate"] = round(stats.get("hits", 0) / stats["lookups"], 3)
+		stats["saved_s"] = round(stats.get("saved_s", 0.0) + saved_s, 3)
+		record_metric("repl_cache", stats)
+
+
+class ReplCache:
+	"""Content-addressed store of ``python_repl_tool`` results on disk.
+
+	An entry is keyed on the normalized code plus the SHA-256 (or absence) of
+	every workspace file the code names, and holds the stdout, the files the
+	run wrote and the names it bound in the REPL. Entries of one code hash sit
+	in one directory, so a lookup hashes only the inputs its candidates
+	recorded. A hit copies the stored files into the current workspace and
+	binds the stored names in the REPL instead of running the code, so later
+	calls can use them; runs binding values that cannot be pickled are not
+	stored. Entries are evicted least recently used once the cache exceeds
+	``max_bytes``; only self-contained code without clocks, randomness or
+	network access is cached.
+	"""
+
+	def __init__(self, directory: Path, max_bytes: int = REPL_CACHE_MAX_BYTES):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self._lock = threading.Lock()
+		self._entries: "OrderedDict[Path, int]" = OrderedDict()
+		self._size = 0
+		self.directory.mkdir(parents=True, exist_ok=True)
+		self._load()
+
+	def _load(self) -> None:
+		# Rebuild the LRU order from entry access times left by this or earlier processes
+		entries = []
+		for meta in self.directory.glob("*/*/meta.json"):
+			if meta.parent.name.startswith("."):
+				continue
+			try:
+				entries.append((meta.stat().st_mtime_ns, meta.parent, json.loads(meta.read_text())["size"]))
+			except (OSError, ValueError, KeyError):
+				continue
+		for _, entry, size in sorted(entries):
+			self._entries[entry] = size
+			self._size += size
+
+	def _candidates(self, code_hash: str):
+		for meta in (self.directory / code_hash).glob("*/meta.json"):
+			if meta.parent.name.startswith("."):
+				continue  # Still being written
+			try:
+				yield meta.parent, json.loads(meta.read_text())
+			except (OSError, ValueError):
+				continue
+
+	def _lookup(self, code_hash: str, workspace: Path) -> Optional[Tuple[Path, dict]]:
+		for entry, meta in self._candidates(code_hash):
+			if all(_digest(workspace / name) == digest for name, digest in meta["inputs"].items()):
+				return entry, meta
+		return None
+
+	def _restore(self, entry: Path, meta: dict, workspace: Path, repl: Any) -> None:
+		_restore_bindings((entry / "bindings.pickle").read_bytes(), repl)
+		for name in meta["outputs"]:
+			target = workspace / name
+			target.parent.mkdir(parents=True, exist_ok=True)
+			shutil.copyfile(entry / "files" / name, target)
+		with self._lock:
+			if entry in self._entries:
+				self._entries.move_to_end(entry)
+		os.utime(entry / "meta.json")
+
+	def _store(
+		self, code_hash: str, inputs: Dict[str, Optional[str]], outputs: Set[str], bindings: bytes,
+		stdout: str, elapsed: float, workspace: Path,
+	) -> None:
+		variant = hashlib.sha256(json.dumps(sorted(inputs.items())).encode()).hexdigest()[:16]
+		entry = self.directory / code_hash / variant
+		if entry.exists():
+			return
+		partial = self.directory / code_hash / f".{variant}.{os.getpid()}.{threading.get_ident()}"
+		try:
+			for name in outputs:
+				target = partial / "files" / name
+				target.parent.mkdir(parents=True, exist_ok=True)
+				shutil.copyfile(workspace / name, target)
+			size = len(stdout.encode("utf-8")) + len(bindings) + sum((workspace / name).stat().st_size for name in outputs)
+			meta = {"inputs": inputs, "outputs": sorted(outputs), "stdout": stdout, "elapsed_s": elapsed, "size": size}
+			partial.mkdir(parents=True, exist_ok=True)
+			(partial / "bindings.pickle").write_bytes(bindings)
+			(partial / "meta.json").write_text(json.dumps(meta, ensure_ascii=False))
+			os.rename(partial, entry)
+		except OSError as e:
+			# Another worker stored the same entry first, or the outputs vanished mid-copy
+			logger.debug(f"Not caching REPL run {code_hash[:12]}: {e}")
+			shutil.rmtree(partial, ignore_errors=True)
+			return
+		with self._lock:
+			self._entries[entry] = size
+			self._size += size
+			evicted = []
+			while self._size > self.max_bytes and len(self._entries) > 1:
+				old, old_size = self._entries.popitem(last=False)
+				self._size -= old_size
+				evicted.append(old)
+		for old in evicted:
+			shutil.rmtree(old, ignore_errors=True)
+			try:
+				old.parent.rmdir()
+			except OSError:
+				pass
+
+	def run(self, code: str, workspace: Path, repl: Any) -> str:
+		"""Stdout of ``code`` in ``repl``, from the cache when an identical run on identical inputs is stored."""
+		normalized, tree = normalize_code(code)
+		if tree is None or not _is_self_contained(tree):
+			record_cache_use("uncacheable")
+			return repl.run(code)
+		code_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+		hit = self._lookup(code_hash, workspace)
+		if hit is not None:
+			entry, meta = hit
+			try:
+				self._restore(entry, meta, workspace, repl)
+				record_cache_use("hits", meta["elapsed_s"])
+				return meta["stdout"]
+			except (OSError, ImportError, pickle.UnpicklingError) as e:
+				logger.warning(f"Failed to restore cached REPL run {code_hash[:12]}: {e}")
+
+		before = _snapshot(workspace)
+		# Named files that do not exist are inputs too: the result may change once they do
+		inputs = {name: _digest(workspace / name) for name in _referenced_files(tree)}
+		namespace = _bindings(repl)
+		started = time.perf_counter()
+		stdout = repl.run(code)
+		elapsed = time.perf_counter() - started
+		record_cache_use("misses")
+		if _EXCEPTION_RE.match(stdout):
+			# Failures often depend on the environment (a missing package); let the next attempt run
+			return stdout
+		after = _snapshot(workspace)
+		outputs = {name for name, stat in after.items() if before.get(name) != stat}
+		inputs = {name: digest for name, digest in inputs.items() if name not in outputs}
+		bindings = _encode_bindings(namespace, repl)
+		if bindings is None:
+			# A hit could not give later calls the names this run defined
+			return stdout
+		self._store(code_hash, inputs, outputs, bindings, stdout, elapsed, workspace)
+		return stdout
+
+
+_cache: Optional[ReplCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_repl_cache() -> Optional[ReplCache]:
+	"""The process-wide REPL cache, or None when ``REPL_CACHE_ENABLED`` is off."""
+	global _cache
+	if not REPL_CACHE_ENABLED:
+		return None
+	if _cache is None:
+		with _cache_lock:
+			if _cache is None:
+				_cache = ReplCache(Path(REPL_CACHE_DIR) if REPL_CACHE_DIR else workspace_root() / ".repl-cache")
+	return _cache
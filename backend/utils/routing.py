@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+from .prompts import PromptTemplate
+
+# Kept free of LangChain/LangGraph imports so the API can classify a request
+# before the agent graphs are loaded.
+
+# Simple greetings and basic interactions should get direct answers
+SIMPLE_INTERACTIONS = (
+	"hi", "hello", "hey", "good morning", "good afternoon", "good evening",
+	"你好", "嗨", "早上好", "下午好", "晚上好", "how are you", "what's up",
+	"sup", "greetings", "howdy", "thanks", "thank you", "谢谢", "再见", "bye",
+	"goodbye", "what is", "what are", "who is", "who are", "how to", "why",
+	"when", "where", "explain", "define", "tell me about"
+)
+
+# Keywords indicating simple document tasks
+SIMPLE_DOC_KEYWORDS = (
+	"整理", "总结", "撰写", "编写", "文档", "报告", "记录", "笔记",
+	"organize", "summarize", "write", "document", "report", "note",
+	"format", "create document", "draft"
+)
+
+# Keywords indicating research is needed
+RESEARCH_KEYWORDS = (
+	"搜索", "查找", "调研", "分析", "研究", "收集信息", "最新",
+	"search", "find", "research", "analyze", "investigate", "gather", "latest",
+	"compare", "评估", "市场", "趋势", "数据"
+)
+
+QUESTION_WORDS = ("what", "how", "why", "when", "where", "who", "什么", "怎么", "为什么", "什么时候", "哪里", "谁")
+
+
+def analyze_task_complexity(user_message: str) -> str:
+	"""Analyze if task needs research, document team, or direct answer."""
+	if not user_message:
+		return "research_team"
+
+	user_message = str(user_message).lower()
+	user_words = user_message.strip().split()
+
+	# Check if this is a simple interaction (should be answered directly)
+	if len(user_words) <= 5:  # Short questions/greetings
+		for interaction in SIMPLE_INTERACTIONS:
+			if interaction in user_message:
+				return "direct_answer"
+
+	# Check for research indicators
+	for keyword in RESEARCH_KEYWORDS:
+		if keyword in user_message:
+			return "research_team"
+
+	# Check for simple document tasks
+	for keyword in SIMPLE_DOC_KEYWORDS:
+		if keyword in user_message:
+			return "writing_team"
+
+	# For short, simple questions, provide direct answers
+	if len(user_words) <= 10 and any(word in user_message for word in QUESTION_WORDS):
+		return "direct_answer"
+
+	# Default to research for complex/ambiguous tasks
+	return "research_team"
+
+
+DIRECT_ANSWER_PROMPT = PromptTemplate(
+	"You are a helpful AI assistant. Please provide a direct, concise answer to the user's question or greeting.\n\n"
+	"Keep your response natural, friendly, and appropriate to the context. For greetings, respond warmly. "
+	"For simple questions, provide clear, helpful answers.",
+	"{message}",
+)
+
+
+def direct_answer_messages(user_msg: str) -> List[Dict[str, str]]:
+	"""Model input for answering a greeting or simple question directly."""
+	return DIRECT_ANSWER_PROMPT.messages(message=user_msg)
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+import zlib
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Optional, Union
+
+try:
+	import orjson
+except ImportError:  # Optional: the stdlib encoder produces the same JSON
+	orjson = None
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+# Compress the event stream for clients that send a matching Accept-Encoding: "auto", "gzip", "br" or "off"
+SSE_COMPRESSION = os.getenv("SSE_COMPRESSION", "off").lower()
+SSE_GZIP_LEVEL = int(os.getenv("SSE_GZIP_LEVEL", "6"))
+
+DONE_FRAME = b"data: [DONE]\n\n"
+
+# An event on the stream queue: a JSON string, or a pre-framed ``data: ...\n\n`` line from ``token_frame``
+StreamEvent = Union[str, bytes]
+
+
+class StreamQueue(asyncio.Queue):
+	"""A request's stream queue that can hold back the run feeding it.
+
+	With ``limit`` set, ``put`` waits while that many events are queued: on
+	the queue's own event loop by awaiting, and on other threads (sync graph
+	nodes run their callbacks on a throwaway loop) by blocking the thread,
+	which pauses the model stream behind it. ``put_nowait`` never waits; it
+	carries the rate-limited progress events and events relayed from team
+	worker processes. After ``close`` the consumer is gone and puts are
+	dropped.
+	"""
+
+	def __init__(self, limit: int = 0):
+		super().__init__()
+		self.limit = limit
+		self.closed = False
+		self._loop = asyncio.get_running_loop()
+		self._room = threading.Condition()
+		self._drained = asyncio.Event()
+		# Events handed to the loop by other threads but not queued yet
+		self._in_flight = 0
+
+	def _full(self) -> bool:
+		return bool(self.limit) and self.qsize() + self._in_flight >= self.limit and not self.closed
+
+	async def put(self, item: StreamEvent) -> None:
+		if self.closed:
+			return
+		try:
+			on_loop = asyncio.get_running_loop() is self._loop
+		except RuntimeError:
+			on_loop = False
+		if on_loop:
+			while self._full():
+				self._drained.clear()
+				await self._drained.wait()
+			if not self.closed:
+				self.put_nowait(item)
+			return
+		with self._room:
+			self._room.wait_for(lambda: not self._full())
+			if self.closed:
+				return
+			self._in_flight += 1
+		self._loop.call_soon_threadsafe(self._arrive, item)
+
+	def _arrive(self, item: StreamEvent) -> None:
+		with self._room:
+			self._in_flight -= 1
+		if not self.closed:
+			self.put_nowait(item)
+
+	def get_nowait(self) -> StreamEvent:
+		item = super().get_nowait()
+		if self.limit and self.qsize() < self.limit:
+			self._signal_room()
+		return item
+
+	def close(self) -> None:
+		"""Release waiting producers and drop later puts."""
+		self.closed = True
+		self._signal_room()
+
+	def _signal_room(self) -> None:
+		self._drained.set()
+		with self._room:
+			self._room.notify_all()
+
+
+def _dumps_bytes(value: Any) -> bytes:
+	if orjson is not None:
+		try:
+			return orjson.dumps(value)
+		except TypeError:
+			pass  # Types orjson does not serialize natively; the stdlib may still manage
+	return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(payload: Any) -> str:
+	"""Compact JSON of an event payload, with orjson when installed."""
+	return _dumps_bytes(payload).decode("utf-8")
+
+
+@lru_cache(maxsize=256)
+def _token_suffix(team: str, node: str) -> bytes:
+	# The constant tail of a token event, encoded once per team/node
+	tail = b""
+	if team:
+		tail += b',"team":' + _dumps_bytes(team)
+	if node:
+		tail += b',"node":' + _dumps_bytes(node)
+	return tail + b"}\n\n"
+
+
+_TOKEN_PREFIX = b'data: {"type":"token","content":'
+
+
+def token_frame(content: str, team: str = "", node: str = "") -> bytes:
+	"""SSE frame of a token event; only ``content`` is encoded per call."""
+	return _TOKEN_PREFIX + _dumps_bytes(content) + _token_suffix(team, node)
+
+
+def frame(event: StreamEvent) -> bytes:
+	"""SSE frame for a queued event."""
+	if isinstance(event, bytes):
+		return event
+	if event == "[DONE]":
+		return DONE_FRAME
+	return b"data: " + event.encode("utf-8") + b"\n\n"
+
+
+def unframe(event: StreamEvent) -> str:
+	"""The JSON payload of a queued event, as stored for stream replay."""
+	if isinstance(event, bytes):
+		return event[6:-2].decode("utf-8")
+	return event
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+	"""Content codings named in an Accept-Encoding header, with their q-values."""
+	weights: Dict[str, float] = {}
+	for part in accept_encoding.split(","):
+		coding, *params = part.split(";")
+		coding = coding.strip().lower()
+		if not coding:
+			continue
+		q = 1.0
+		for param in params:
+			name, _, value = param.partition("=")
+			if name.strip().lower() == "q":
+				try:
+					q = float(value)
+				except ValueError:
+					q = 0.0
+		weights[coding] = q
+	return weights
+
+
+def accepts_encoding(accept_encoding: Optional[str], coding: str) -> bool:
+	"""Whether the header allows ``coding``, explicitly or through ``*``; ``q=0`` refuses it."""
+	weights = accepted_encodings(accept_encoding or "")
+	return weights.get(coding, weights.get("*", 0.0)) > 0
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+	"""Content-Encoding to stream with, given ``SSE_COMPRESSION`` and the client's Accept-Encoding."""
+	if SSE_COMPRESSION == "off" or not accept_encoding:
+		return None
+	if SSE_COMPRESSION in ("auto", "br") and brotli is not None and accepts_encoding(accept_encoding, "br"):
+		return "br"
+	if SSE_COMPRESSION in ("auto", "gzip") and accepts_encoding(accept_encoding, "gzip"):
+		return "gzip"
+	return None
+
+
+class _Compressor:
+	"""Streaming compressor flushed after every event, so clients never wait on a partial block."""
+
+	def __init__(self, encoding: str):
+		if encoding == "br":
+			self._br = brotli.Compressor(mode=brotli.MODE_TEXT, quality=5)
+		else:
+			self._br = None
+			self._gz = zlib.compressobj(SSE_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+	def compress(self, data: bytes) -> bytes:
+		if self._br is not None:
+			return self._br.process(data) + self._br.flush()
+		return self._gz.compress(data) + self._gz.flush(zlib.Z_SYNC_FLUSH)
+
+	def finish(self) -> bytes:
+		if self._br is not None:
+			return self._br.finish()
+		return self._gz.flush(zlib.Z_FINISH)
+
+
+async def compress_stream(frames: AsyncIterator[bytes], encoding: Optional[str]) -> AsyncIterator[bytes]:
+	"""Pass ``frames`` through, compressed with ``encoding`` when one was negotiated."""
+	if encoding is None:
+		async for data in frames:
+			yield data
+		return
+	compressor = _Compressor(encoding)
+	async for data in frames:
+		yield compressor.compress(data)
+	yield compressor.finish()
@@ -0,0 +1,422 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore(ABC):
+	"""Key/value and append-only list storage shared across API workers.
+
+	Keys are namespaced by the callers:
+	- ``request:<id>``    request registry entries
+	- ``profile:<id>``    profiling reports
+	- ``stream:<id>``     stream events kept for replay
+	- ``checkpoint:<id>:...``, ``checkpoints:<id>:...``, ``writes:<id>:...``
+	                      super graph checkpoints (``utils.checkpoints``)
+	- ``page:<sha256>``   fetched web pages shared across requests
+	"""
+
+	# True when calls never leave the process, so they are cheap enough for the event loop
+	local = False
+
+	@abstractmethod
+	def get(self, key: str) -> Optional[str]:
+		...
+
+	@abstractmethod
+	def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+		...
+
+	@abstractmethod
+	def delete(self, key: str) -> None:
+		...
+
+	@abstractmethod
+	def append(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+		"""Append to the list at ``key``; ``ttl`` applies when the list is created."""
+
+	def extend(self, key: str, values: List[str], ttl: Optional[float] = None) -> None:
+		"""Append several values at once; backends override this to do it in one round trip."""
+		for value in values:
+			self.append(key, value, ttl)
+
+	@abstractmethod
+	def range(self, key: str, start: int = 0, end: int = -1) -> List[str]:
+		"""Return list items ``start`` through ``end`` inclusive (negative counts from the end)."""
+
+	@abstractmethod
+	def keys(self, prefix: str) -> List[str]:
+		...
+
+	def get_json(self, key: str) -> Any:
+		value = self.get(key)
+		return json.loads(value) if value is not None else None
+
+	def set_json(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+		self.set(key, json.dumps(value, ensure_ascii=False), ttl)
+
+
+def _slice(items: List[str], start: int, end: int) -> List[str]:
+	"""Redis LRANGE semantics: inclusive end, negative indexes from the end."""
+	stop = len(items) + end + 1 if end < 0 else end + 1
+	return items[start:stop]
+
+
+class InMemoryStateStore(StateStore):
+	"""Process-local store; the default for single-worker deployments."""
+
+	local = True
+
+	def __init__(self):
+		self._values: Dict[str, Tuple[Any, Optional[float]]] = {}
+		self._lock = threading.Lock()
+
+	def _live(self, key: str) -> Any:
+		entry = self._values.get(key)
+		if entry is None:
+			return None
+		value, expires_at = entry
+		if expires_at is not None and expires_at <= time.time():
+			del self._values[key]
+			return None
+		return value
+
+	def get(self, key: str) -> Optional[str]:
+		with self._lock:
+			value = self._live(key)
+		return value if isinstance(value, str) else None
+
+	def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+		with self._lock:
+			self._values[key] = (value, time.time() + ttl if ttl else None)
+
+	def delete(self, key: str) -> None:
+		with self._lock:
+			self._values.pop(key, None)
+
+	def append(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+		self.extend(key, [value], ttl)
+
+	def extend(self, key: str, values: List[str], ttl: Optional[float] = None) -> None:
+		with self._lock:
+			items = self._live(key)
+			if not isinstance(items, list):
+				items = []
+				self._values[key] = (items, time.time() + ttl if ttl else None)
+			items.extend(values)
+
+	def range(self, key: str, start: int = 0, end: int = -1) -> List[str]:
+		with self._lock:
+			items = self._live(key)
+			return _slice(items, start, end) if isinstance(items, list) else []
+
+	def keys(self, prefix: str) -> List[str]:
+		with self._lock:
+			return [key for key in list(self._values) if key.startswith(prefix) and self._live(key) is not None]
+
+
+class SQLiteStateStore(StateStore):
+	"""Store backed by a SQLite file, shared by workers on the same host."""
+
+	# Expired rows are purged every this many list appends
+	PURGE_EVERY = 1000
+
+	def __init__(self, path: str):
+		self.path = path
+		self._appends = 0
+		self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+		self._lock = threading.Lock()
+		with self._lock:
+			self._conn.execute("PRAGMA journal_mode=WAL")
+			self._conn.execute("PRAGMA synchronous=NORMAL")
+			self._conn.execute(
+				"CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+			)
+			self._conn.execute(
+				"CREATE TABLE IF NOT EXISTS lists ("
+				"id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT, value TEXT, expires_at REAL)"
+			)
+			self._conn.execute("CREATE INDEX IF NOT EXISTS lists_key ON lists (key, id)")
+
+	def _execute(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+		with self._lock:
+			return self._conn.execute(sql, params).fetchall()
+
+	def get(self, key: str) -> Optional[str]:
+		rows = self._execute(
+			"SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+			(key, time.time()),
+		)
+		return rows[0][0] if rows else None
+
+	def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+		self._execute(
+			"INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+			(key, value, time.time() + ttl if ttl else None),
+		)
+
+	def delete(self, key: str) -> None:
+		with self._lock:
+			self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+			self._conn.execute("DELETE FROM lists WHERE key = ?", (key,))
+
+	def append(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+		self.extend(key, [value], ttl)
+
+	def extend(self, key: str, values: List[str], ttl: Optional[float] = None) -> None:
+		expires_at = time.time() + ttl if ttl else None
+		with self._lock:
+			self._appends += len(values)
+			if self._appends >= self.PURGE_EVERY:
+				self._appends = 0
+				now = time.time()
+				self._conn.execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+				self._conn.execute("DELETE FROM lists WHERE expires_at <= ?", (now,))
+			# One transaction, so a batch costs one commit
+			self._conn.execute("BEGIN")
+			try:
+				self._conn.executemany(
+					"INSERT INTO lists (key, value, expires_at) VALUES (?, ?, ?)",
+					[(key, value, expires_at) for value in values],
+				)
+			except BaseException:
+				self._conn.execute("ROLLBACK")
+				raise
+			self._conn.execute("COMMIT")
+
+	def range(self, key: str, start: int = 0, end: int = -1) -> List[str]:
+		rows = self._execute(
+			"SELECT value FROM lists WHERE key = ? AND (expires_at IS NULL OR expires_at > ?) ORDER BY id",
+			(key, time.time()),
+		)
+		return _slice([row[0] for row in rows], start, end)
+
+	def keys(self, prefix: str) -> List[str]:
+		now = time.time()
+		pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+		rows = self._execute(
+			"SELECT key FROM kv WHERE key LIKE ? ESCAPE '\\' AND (expires_at IS NULL OR expires_at > ?) "
+			"UNION SELECT DISTINCT key FROM lists WHERE key LIKE ? ESCAPE '\\' AND (expires_at IS NULL OR expires_at > ?)",
+			(pattern, now, pattern, now),
+		)
+		return [row[0] for row in rows]
+
+
+class RedisStateStore(StateStore):
+	"""Store speaking the Redis protocol (RESP) over a plain socket.
+
+	Only GET/SET/DEL/RPUSH/LRANGE/PEXPIRE/KEYS are used, so any
+	Redis-compatible server works, including a local stand-in for tests.
+	"""
+
+	def __init__(self, url: str):
+		parsed = urlparse(url)
+		self.host = parsed.hostname or "localhost"
+		self.port = parsed.port or 6379
+		self.db = int((parsed.path or "/0").lstrip("/") or 0)
+		self.password = parsed.password
+		self._sock: Optional[socket.socket] = None
+		self._reader = None
+		self._lock = threading.Lock()
+
+	def _connect(self) -> None:
+		self._sock = socket.create_connection((self.host, self.port), timeout=10)
+		self._reader = self._sock.makefile("rb")
+		if self.password:
+			self._send("AUTH", self.password)
+		if self.db:
+			self._send("SELECT", str(self.db))
+
+	def _send(self, *args: str) -> Any:
+		parts = [f"*{len(args)}\r\n".encode()]
+		for arg in args:
+			data = arg.encode("utf-8")
+			parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+		self._sock.sendall(b"".join(parts))
+		return self._read()
+
+	def _read(self) -> Any:
+		line = self._reader.readline()
+		if not line:
+			raise ConnectionError("Redis connection closed")
+		kind, rest = line[:1], line[1:-2]
+		if kind == b"+":
+			return rest.decode()
+		if kind == b"-":
+			raise RuntimeError(f"Redis error: {rest.decode()}")
+		if kind == b":":
+			return int(rest)
+		if kind == b"$":
+			size = int(rest)
+			if size < 0:
+				return None
+			data = self._reader.read(size + 2)
+			return data[:-2].decode("utf-8")
+		if kind == b"*":
+			size = int(rest)
+			return None if size < 0 else [self._read() for _ in range(size)]
+		raise RuntimeError(f"Unexpected Redis reply: {line!r}")
+
+	def _command(self, *args: str) -> Any:
+		with self._lock:
+			for attempt in range(2):
+				try:
+					if self._sock is None:
+						self._connect()
+					return self._send(*args)
+				except (ConnectionError, OSError):
+					self._sock = None
+					if attempt:
+						raise
+
+	def get(self, key: str) -> Optional[str]:
+		return self._command("GET", key)
+
+	def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+		if ttl:
+			self._command("SET", key, value, "PX", str(int(ttl * 1000)))
+		else:
+			self._command("SET", key, value)
+
+	def delete(self, key: str) -> None:
+		self._command("DEL", key)
+
+	def append(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+		self.extend(key, [value], ttl)
+
+	def extend(self, key: str, values: List[str], ttl: Optional[float] = None) -> None:
+		length = self._command("RPUSH", key, *values)
+		if ttl and length == len(values):
+			self._command("PEXPIRE", key, str(int(ttl * 1000)))
+
+	def range(self, key: str, start: int = 0, end: int = -1) -> List[str]:
+		return self._command("LRANGE", key, str(start), str(end)) or []
+
+	def keys(self, prefix: str) -> List[str]:
+		pattern = "".join("\\" + c if c in "*?[]\\" else c for c in prefix) + "*"
+		return self._command("KEYS", pattern) or []
+
+
+_store: Optional[StateStore] = None
+_store_lock = threading.Lock()
+
+
+def create_state_store(backend: str, url: str = "") -> StateStore:
+	"""Create a store for ``backend`` (``memory``, ``sqlite`` or ``redis``)."""
+	backend = backend.lower()
+	if backend == "sqlite":
+		return SQLiteStateStore(url or "state.sqlite3")
+	if backend == "redis":
+		return RedisStateStore(url or "redis://localhost:6379/0")
+	if backend != "memory":
+		raise ValueError(f"Unknown state backend: {backend}")
+	return InMemoryStateStore()
+
+
+def get_state_store() -> StateStore:
+	"""Return the process-wide store configured by STATE_BACKEND / STATE_BACKEND_URL."""
+	global _store
+	if _store is None:
+		with _store_lock:
+			if _store is None:
+				backend = os.getenv("STATE_BACKEND", "memory")
+				_store = create_state_store(backend, os.getenv("STATE_BACKEND_URL", ""))
+				logger.info(f"Using {backend} state backend")
+	return _store
+
+
+class StoreWriter:
+	"""Applies writes to a state store from a background thread.
+
+	Callers on the event loop enqueue instead of waiting on SQLite or Redis.
+	Writes are applied in order; consecutive appends to one list go out as
+	one ``extend`` and a ``set`` overwritten later in the same batch is
+	skipped. Writes to a process-local store are applied immediately.
+	"""
+
+	def __init__(self, store: StateStore):
+		self.store = store
+		self._queue: "queue.SimpleQueue[Optional[Tuple]]" = queue.SimpleQueue()
+		self._idle = threading.Condition()
+		self._pending = 0
+		self._thread: Optional[threading.Thread] = None
+		if not store.local:
+			self._thread = threading.Thread(target=self._run, name="state-store-writer", daemon=True)
+			self._thread.start()
+
+	def set_json(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+		# Serialized now, so later changes to ``value`` do not leak into the write
+		self._submit(("set", key, json.dumps(value, ensure_ascii=False), ttl))
+
+	def append(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+		self._submit(("append", key, value, ttl))
+
+	def _submit(self, write: Tuple) -> None:
+		if self._thread is None:
+			self._apply([write])
+			return
+		with self._idle:
+			self._pending += 1
+		self._queue.put(write)
+
+	def flush(self, timeout: Optional[float] = None) -> bool:
+		"""Wait until every queued write is applied; False on timeout."""
+		with self._idle:
+			return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+	def _run(self) -> None:
+		while True:
+			batch = [self._queue.get()]
+			while True:
+				try:
+					batch.append(self._queue.get_nowait())
+				except queue.Empty:
+					break
+			self._apply(batch)
+			with self._idle:
+				self._pending -= len(batch)
+				self._idle.notify_all()
+
+	def _apply(self, batch: List[Tuple]) -> None:
+		last_set = {write[1]: index for index, write in enumerate(batch) if write[0] == "set"}
+		index = 0
+		while index < len(batch):
+			kind, key, value, ttl = batch[index]
+			index += 1
+			try:
+				if kind == "set":
+					if last_set[key] == index - 1:
+						self.store.set(key, value, ttl)
+					continue
+				values = [value]
+				while index < len(batch) and batch[index][:2] == ("append", key):
+					values.append(batch[index][2])
+					index += 1
+				self.store.extend(key, values, ttl)
+			except Exception as e:
+				logger.warning(f"Failed to write {key} to the state store: {e}")
+
+
+_writer: Optional[StoreWriter] = None
+
+
+def get_store_writer() -> StoreWriter:
+	"""Return the process-wide background writer for the configured store."""
+	global _writer
+	if _writer is None:
+		store = get_state_store()
+		with _store_lock:
+			if _writer is None:
+				_writer = StoreWriter(store)
+	return _writer
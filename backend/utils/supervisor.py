@@ -1,16 +1,58 @@
 from typing import List, Literal
+from typing_extensions import Annotated
 import json
 import logging
+import os
 from langchain_core.language_models.chat_models import BaseChatModel  # type: ignore
 from langgraph.graph import MessagesState, END  # type: ignore
 from langgraph.types import Command  # type: ignore
-from .context import current_team, current_node
+from langchain_core.runnables import RunnableConfig
+from .context import current_team, current_node, record_metric
+from .progress import emit_progress
+from .budget import get_budget, stage_budget
+from .messages import append_messages, to_langchain
+from .routing import analyze_task_complexity, direct_answer_messages
+from .prompts import PromptTemplate
 
 logger = logging.getLogger(__name__)
 
+# Research is skipped when its share of the latency budget would be shorter than this
+MIN_RESEARCH_BUDGET_S = float(os.getenv("MIN_RESEARCH_BUDGET_S", "5"))
+
+# Static instructions first, request and agent outputs last, so the provider can cache the prefix
+FINAL_DOCUMENT_PROMPT = PromptTemplate(
+	"As the document team supervisor in a hierarchical agent system, provide the FINAL deliverable "
+	"for the user's request below.\n\n"
+	"Generate a comprehensive, polished final deliverable that:\n"
+	"1. Synthesizes all agent contributions professionally\n"
+	"2. Provides complete coverage of the user's request\n"
+	"3. Maintains high quality standards\n"
+	"4. Is ready for immediate user consumption\n\n"
+	"This is the FINAL output that will be presented to the user.",
+	"Request: \"{request}\"\n\nAgent Work Completed:\n{agent_work}\n\nAgent Performance Summary: {summary}",
+)
+
+FINAL_TEAM_PROMPT = PromptTemplate(
+	"As the {team_name} supervisor, provide a comprehensive final response to the user's request below.\n\n"
+	"Generate a complete, professional response addressing the user's request.",
+	"Request: \"{request}\"\n\nTeam Work Completed:\n{team_work}",
+)
+
+MERGE_PROMPT = PromptTemplate(
+	"As the document team supervisor, you are given a document that has already been delivered to the user "
+	"and additional agent contributions.\n\n"
+	"Write ONLY the new material from the additional contributions that the document does not already cover, "
+	"formatted so it can be appended to the end of the document. Do not repeat the document. "
+	"If nothing needs to be added, reply with an empty message.",
+	"Request: \"{request}\"\n\nDocument:\n{document}\n\nAdditional agent contributions:\n{contributions}",
+)
+
 
 class State(MessagesState):
 	"""Enhanced state for hierarchical agent teams."""
+	# Append-only message log; converted to LangChain messages only at LLM calls
+	messages: Annotated[list, append_messages]  # type: ignore[assignment]
+
 	# Workflow progress tracking
 	research_done: bool  # type: ignore[assignment]
 	writing_done: bool  # type: ignore[assignment]
@@ -21,6 +63,9 @@ class State(MessagesState):
 	task_complexity: str = ""  # type: ignore[assignment]
 	task_priority: str = "normal"  # type: ignore[assignment]
 
+	# Outline drafted by the writing team while research was still running
+	outline_draft: str = ""  # type: ignore[assignment]
+
 
 def make_team_supervisor_node(llm: BaseChatModel, members: List[str], team_name: str):
 	"""Create intelligent team supervisor with hierarchical coordination.
@@ -46,10 +91,19 @@ def make_team_supervisor_node(llm: BaseChatModel, members: List[str], team_name:
 		"- Complete when team objectives are fully accomplished\n\n"
 		"Respond in JSON format: {\"next\": \"agent_name\"} or {\"next\": \"COMPLETE\"}"
 	)
+	# Built once per team rather than per routing decision, so every call sends the same prefix
+	routing_prompt = system_prompt.replace(
+		"Respond in JSON format: {\"next\": \"agent_name\"} or {\"next\": \"COMPLETE\"}",
+		"Analyze the task and decide which agent should handle it next. "
+		"Consider the task complexity and agent specializations. "
+		"Respond with a JSON object containing the agent name (one of: " + ", ".join(members) + ") or COMPLETE."
+	)
 
-	def team_supervisor_node(state: State) -> Command[Literal[*members, "__end__"]]:
+	def team_supervisor_node(state: State, config: RunnableConfig) -> Command[Literal[*members, "__end__"]]:
 		"""Enhanced team supervisor with intelligent coordination and quality control."""
 		messages = state["messages"]
+		# Remember whether this team delivers the final output before overriding the context
+		is_final_team = current_team.get("") == "final"
 		
 		# Set team context
 		team_token = current_team.set(team_name.lower().replace(" ", "_"))
@@ -68,15 +122,35 @@ def make_team_supervisor_node(llm: BaseChatModel, members: List[str], team_name:
 					agent_responses.append(f"{msg.name}: {msg.content}")
 					agent_work_summary[msg.name] = len(msg.content)
 			
+			# A prefetched outline hands the team straight to the writer
+			if not agent_responses and "doc_writer" in members and any(
+				getattr(msg, "name", None) == "outline_draft" for msg in messages
+			):
+				logger.info(f"Routing {team_name} to prefetched outline writer: doc_writer")
+				emit_progress("route", goto="doc_writer")
+				return Command(goto="doc_writer", update={"next": "doc_writer"})
+
+			# Out of time before any agent ran: hand back what the team was given
+			budget = get_budget(config)
+			if not agent_responses and budget and budget.expired():
+				logger.warning(f"{team_name} latency budget exhausted before any agent ran")
+				return Command(goto=END, update={"next": "__end__"})
+
+			# The final team delivers the writer's document; notes and charts from others feed into it
+			if is_final_team and agent_responses and "doc_writer" in members and "doc_writer" not in agent_work_summary:
+				logger.info(f"Routing {team_name} to doc_writer for the deliverable")
+				emit_progress("route", goto="doc_writer")
+				return Command(goto="doc_writer", update={"next": "doc_writer"})
+
 			# Check if team has sufficient work completed
 			if len(agent_responses) >= 1:
 				return _generate_team_response(
-					llm, team_name, messages, agent_responses, agent_work_summary
+					llm, team_name, messages, agent_responses, agent_work_summary, is_final_team
 				)
 			
 			# Route to next agent using intelligent decision making
 			return _route_to_next_agent(
-				llm, system_prompt, members, messages, team_name
+				llm, routing_prompt, members, messages, team_name
 			)
 			
 		except Exception as e:
@@ -91,37 +165,40 @@ def make_team_supervisor_node(llm: BaseChatModel, members: List[str], team_name:
 	return team_supervisor_node
 
 
-def _generate_team_response(llm, team_name: str, messages, agent_responses, agent_work_summary):
-	"""Generate comprehensive team response based on agent work."""
+def _generate_team_response(llm, team_name: str, messages, agent_responses, agent_work_summary, is_final_team: bool = False):
+	"""Generate comprehensive team response based on agent work.
+
+	With ``STREAM_DELIVERABLE`` on (the default) the final team does not
+	regenerate what its agents already streamed: the writer's document is the
+	deliverable, and other agents' contributions are merged into it
+	incrementally. Otherwise the synthesis is not streamed, as the client
+	already received the agents' output.
+	"""
+	from langchain_core.messages import AIMessage
+
 	user_msg = messages[0].content if messages else ""
+	stream_deliverable = os.getenv("STREAM_DELIVERABLE", "1").lower() in {"1", "true", "yes"}
 	
-	# Check if this is the final team
-	is_final_team = current_team.get("") == "final"
-	
+	if is_final_team and stream_deliverable and "doc_writer" in agent_work_summary:
+		contributions = [response.split(": ", 1) for response in agent_responses]
+		# The writer's latest draft was already streamed to the client as it was written
+		document = [content for name, content in contributions if name == "doc_writer"][-1]
+		others = [content for name, content in contributions if name != "doc_writer"]
+		if not others:
+			logger.info(f"Team {team_name} delivered the writer's output without synthesis")
+			return Command(update={"messages": [AIMessage(content=document)]}, goto=END)
+		return _merge_team_response(llm, team_name, user_msg, document, others)
+
 	if is_final_team:
 		# Generate comprehensive final response for user
 		if "document" in team_name.lower() or "writing" in team_name.lower():
-			final_prompt = f"""As the document team supervisor in a hierarchical agent system, provide the FINAL deliverable for: "{user_msg}"
-
-Agent Work Completed:
-{chr(10).join(agent_responses)}
-
-Agent Performance Summary: {agent_work_summary}
-
-Generate a comprehensive, polished final deliverable that:
-1. Synthesizes all agent contributions professionally
-2. Provides complete coverage of the user's request
-3. Maintains high quality standards
-4. Is ready for immediate user consumption
-
-This is the FINAL output that will be presented to the user."""
+			final_messages = FINAL_DOCUMENT_PROMPT.messages(
+				request=user_msg, agent_work="\n".join(agent_responses), summary=agent_work_summary
+			)
 		else:
-			final_prompt = f"""As the {team_name} supervisor, provide comprehensive final response to: "{user_msg}"
-
-Team Work Completed:
-{chr(10).join(agent_responses)}
-
-Generate a complete, professional response addressing the user's request."""
+			final_messages = FINAL_TEAM_PROMPT.bind(team_name=team_name).messages(
+				request=user_msg, team_work="\n".join(agent_responses)
+			)
 	else:
 		# For intermediate teams, just complete without generating visible output
 		logger.info(f"Team {team_name} completed work")
@@ -132,8 +209,8 @@ Generate a complete, professional response addressing the user's request."""
 		)
 	
 	try:
-		final_response = llm.invoke([{"role": "system", "content": final_prompt}])
-		from langchain_core.messages import AIMessage
+		# Runs under this team's context, so the agents' already streamed work is not streamed twice
+		final_response = llm.invoke(final_messages)
 		
 		logger.info(f"Team {team_name} generated final response")
 		
@@ -146,7 +223,6 @@ Generate a complete, professional response addressing the user's request."""
 		# Fallback to last agent response
 		if agent_responses:
 			last_response = agent_responses[-1].split(": ", 1)[-1]
-			from langchain_core.messages import AIMessage
 			return Command(
 				update={"messages": [AIMessage(content=last_response)]},
 				goto=END
@@ -154,19 +230,33 @@ Generate a complete, professional response addressing the user's request."""
 		return Command(goto=END)
 
 
-def _route_to_next_agent(llm, system_prompt: str, members: List[str], messages, team_name: str):
+def _merge_team_response(llm, team_name: str, user_msg: str, document: str, others: List[str]):
+	"""Merge other agents' contributions into the streamed document by streaming only the additions."""
+	from langchain_core.messages import AIMessage
+
+	merge_messages = MERGE_PROMPT.messages(request=user_msg, document=document, contributions="\n".join(others))
+
+	try:
+		final_token = current_team.set("final")
+		try:
+			addition = llm.invoke(merge_messages).content.strip()
+		finally:
+			current_team.reset(final_token)
+	except Exception as e:
+		logger.error(f"Failed to merge team response for {team_name}: {e}")
+		addition = ""
+
+	logger.info(f"Team {team_name} merged {len(others)} contributions into the document incrementally")
+	content = f"{document}\n\n{addition}" if addition else document
+	return Command(update={"messages": [AIMessage(content=content)]}, goto=END)
+
+
+def _route_to_next_agent(llm, routing_prompt: str, members: List[str], messages, team_name: str):
 	"""Intelligent routing to next agent based on task analysis."""
-	# Modify system prompt to request internal decision only
-	internal_prompt = system_prompt.replace(
-		"Respond in JSON format: {\"next\": \"agent_name\"} or {\"next\": \"COMPLETE\"}",
-		"Analyze the task and decide which agent should handle it next. "
-		"Consider the task complexity and agent specializations. "
-		"Respond with a JSON object containing the agent name (one of: " + ", ".join(members) + ") or COMPLETE."
-	)
-	
+	# Static instructions first; the append-only history extends the cached prefix
 	routing_messages = [
-		{"role": "system", "content": internal_prompt},
-	] + messages
+		{"role": "system", "content": routing_prompt},
+	] + to_langchain(messages)
 	
 	try:
 		# Use simple text response and parse (more reliable)
@@ -193,6 +283,7 @@ def _route_to_next_agent(llm, system_prompt: str, members: List[str], messages,
 	
 	# Log routing decision
 	logger.info(f"Routing {team_name} to: {goto}")
+	emit_progress("route", goto=str(goto))
 	
 	return Command(goto=goto, update={"next": goto})
 
@@ -207,60 +298,6 @@ def make_supervisor_node(llm: BaseChatModel, members: List[str]):
 	"""
 	options = ["COMPLETE"] + members
 	
-	def analyze_task_complexity(messages: List) -> str:
-		"""Analyze if task needs research, document team, or direct answer."""
-		if not messages:
-			return "research_team"
-
-		user_message = messages[0].content.lower() if messages else ""
-		user_words = user_message.strip().split()
-
-		# Simple greetings and basic interactions should get direct answers
-		simple_interactions = [
-			"hi", "hello", "hey", "good morning", "good afternoon", "good evening",
-			"你好", "嗨", "早上好", "下午好", "晚上好", "how are you", "what's up",
-			"sup", "greetings", "howdy", "thanks", "thank you", "谢谢", "再见", "bye",
-			"goodbye", "what is", "what are", "who is", "who are", "how to", "why",
-			"when", "where", "explain", "define", "tell me about"
-		]
-
-		# Check if this is a simple interaction (should be answered directly)
-		if len(user_words) <= 5:  # Short questions/greetings
-			for interaction in simple_interactions:
-				if interaction in user_message:
-					return "direct_answer"
-
-		# Keywords indicating simple document tasks
-		simple_doc_keywords = [
-			"整理", "总结", "撰写", "编写", "文档", "报告", "记录", "笔记",
-			"organize", "summarize", "write", "document", "report", "note",
-			"format", "create document", "draft"
-		]
-
-		# Keywords indicating research is needed
-		research_keywords = [
-			"搜索", "查找", "调研", "分析", "研究", "收集信息", "最新",
-			"search", "find", "research", "analyze", "investigate", "gather", "latest",
-			"compare", "评估", "市场", "趋势", "数据"
-		]
-
-		# Check for research indicators
-		for keyword in research_keywords:
-			if keyword in user_message:
-				return "research_team"
-
-		# Check for simple document tasks
-		for keyword in simple_doc_keywords:
-			if keyword in user_message:
-				return "writing_team"
-
-		# For short, simple questions, provide direct answers
-		if len(user_words) <= 10 and any(word in user_message for word in ["what", "how", "why", "when", "where", "who", "什么", "怎么", "为什么", "什么时候", "哪里", "谁"]):
-			return "direct_answer"
-
-		# Default to research for complex/ambiguous tasks
-		return "research_team"
-
 	system_prompt = (
 		"You are a top-level supervisor managing research and document teams. "
 		f"Available teams: {members}. "
@@ -272,7 +309,16 @@ def make_supervisor_node(llm: BaseChatModel, members: List[str]):
 		"Respond with a JSON object containing the next team."
 	)
 
-	def supervisor_node(state: State) -> Command[Literal[*members, "__end__"]]:
+	def supervisor_node(state: State, config: RunnableConfig) -> Command[Literal[*members, "__end__"]]:
+		"""Intelligent task router, accounted against the supervisor's share of the latency budget."""
+		budget = stage_budget(config, "supervisor")
+		try:
+			return route(state, config)
+		finally:
+			if budget:
+				budget.finish()
+
+	def route(state: State, config: RunnableConfig) -> Command[Literal[*members, "__end__"]]:
 		"""Intelligent task router."""
 		messages = state["messages"]
 		
@@ -296,23 +342,16 @@ def make_supervisor_node(llm: BaseChatModel, members: List[str]):
 			goto = "writing_team"
 		elif not research_completed and not writing_completed:
 			# Initial routing - analyze task complexity
-			task_route = analyze_task_complexity(messages)
+			task_route = analyze_task_complexity(messages[0].content if messages else "")
 
 			# Handle direct answers for simple questions
 			if task_route == "direct_answer":
 				from langchain_core.messages import AIMessage
 
-				# Set context for direct response
-				current_team.set("final")
-
-				# Generate direct response using LLM
-				user_msg = messages[0].content if messages else ""
-				direct_prompt = f"""You are a helpful AI assistant. Please provide a direct, concise answer to the user's question or greeting: "{user_msg}"
-
-Keep your response natural, friendly, and appropriate to the context. For greetings, respond warmly. For simple questions, provide clear, helpful answers."""
-
+				# Stream the direct response as the final team, restoring the context afterwards
+				team_token = current_team.set("final")
 				try:
-					response = llm.invoke([{"role": "system", "content": direct_prompt}])
+					response = llm.invoke(direct_answer_messages(messages[0].content))
 					return Command(
 						update={"messages": [AIMessage(content=response.content)]},
 						goto=END
@@ -321,17 +360,26 @@ Keep your response natural, friendly, and appropriate to the context. For greeti
 					logger.error(f"Direct answer generation failed: {e}")
 					# Fallback to writing team
 					goto = "writing_team"
+				finally:
+					current_team.reset(team_token)
 			else:
 				goto = task_route
 		else:
 			# Fallback
 			goto = END
 		
+		# Too little time for research to be useful: write with what we have
+		research_budget = stage_budget(config, "research_team") if goto == "research_team" else None
+		if research_budget and research_budget.remaining() < MIN_RESEARCH_BUDGET_S:
+			logger.warning(f"Research would get {research_budget.remaining():.1f}s of the latency budget, skipping it")
+			record_metric("research_skipped", True)
+			goto = "writing_team"
+
 		# Use LLM for complex routing decisions when needed
 		if goto not in [END, "writing_team"] and len(messages) > 1:
 			routing_messages = [
 				{"role": "system", "content": system_prompt},
-			] + messages
+			] + to_langchain(messages)
 			try:
 				response = llm.invoke(routing_messages)
 				content = response.content.strip().lower()
@@ -348,6 +396,7 @@ Keep your response natural, friendly, and appropriate to the context. For greeti
 		
 		# Log routing decision  
 		logger.info(f"Super supervisor routing to: {goto}")
+		emit_progress("route", goto=str(goto))
 		
 		return Command(goto=goto, update={"next": goto})
 
@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import importlib
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextvars import Context, copy_context
+from typing import Any, Callable, Dict, List, Optional
+
+from .budget import CONFIG_KEY as BUDGET_KEY
+from .callbacks import AsyncQueueCallbackHandler
+from .context import current_node, current_team, get_request_metadata, record_metric, restore_request_context
+from .dedup import CONFIG_KEY as DEDUP_KEY
+from .passage_index import CONFIG_KEY as PASSAGE_INDEX_KEY
+from .progress import current_progress, emit_progress
+from .tool_memo import CONFIG_KEY as TOOL_MEMO_KEY, ToolMemo
+
+logger = logging.getLogger(__name__)
+
+# "inline" runs team subgraphs in the calling process; "process" dispatches them to worker processes
+TEAM_EXECUTION = os.getenv("TEAM_EXECUTION", "inline").lower()
+TEAM_WORKERS = int(os.getenv("TEAM_WORKERS", str(os.cpu_count() or 2)))
+# Team runs per worker process at once; they mostly wait on the model, so a few threads share each process
+TEAM_WORKER_THREADS = int(os.getenv("TEAM_WORKER_THREADS", "4"))
+# ``module:function`` returning the chat model the workers build their team graphs with
+TEAM_WORKER_LLM = os.getenv("TEAM_WORKER_LLM", "app:get_streaming_llm")
+TEAM_WORKER_START_METHOD = os.getenv("TEAM_WORKER_START_METHOD", "forkserver")
+# Longest wait for a team run without a latency budget, and the slack past a budget's deadline
+TEAM_JOB_TIMEOUT_S = float(os.getenv("TEAM_JOB_TIMEOUT_S", "900"))
+TEAM_JOB_GRACE_S = float(os.getenv("TEAM_JOB_GRACE_S", "30"))
+
+# Run config entries shipped to a worker by value; the passage index and page deduplicator come back with the worker's additions
+_SHIPPED_KEYS = (BUDGET_KEY, PASSAGE_INDEX_KEY, DEDUP_KEY)
+
+
+def run_team(teams: Dict[str, Callable[[list, Any], Any]], team: str, messages: list, config: Dict[str, Any]) -> Any:
+	"""Run ``teams[team](messages, config)`` here or, with ``TEAM_EXECUTION=process``, on the worker pool."""
+	if TEAM_EXECUTION != "process":
+		return teams[team](messages, config)
+	return get_team_pool().run(team, messages, config)
+
+
+# --- Worker process side -------------------------------------------------------
+
+class _EventSink:
+	"""Stands in for a request's stream queue and callbacks inside a worker; forwards over the IPC queue."""
+
+	def __init__(self, events, job_id: str):
+		self._events = events
+		self._job_id = job_id
+
+	def send(self, kind: str, data: Any) -> None:
+		self._events.put((self._job_id, kind, data))
+
+	# asyncio.Queue interface used by AsyncQueueCallbackHandler
+	async def put(self, item: Any) -> None:
+		self.send("stream", item)
+
+	def put_nowait(self, item: Any) -> None:
+		self.send("stream", item)
+
+	# ProgressEmitter interface used by emit_progress
+	def emit(self, event: str, **fields: Any) -> None:
+		self.send("progress", (current_team.get(""), current_node.get(""), event, fields))
+
+
+def _forwarding_handler(sink: _EventSink):
+	from langchain_core.callbacks import BaseCallbackHandler
+
+	class ForwardingCallbackHandler(BaseCallbackHandler):
+		"""Replays model starts and results on the originating request's callbacks (usage, counters)."""
+
+		run_inline = True
+
+		def on_chat_model_start(self, serialized: Any, messages: Any, **kwargs: Any) -> None:
+			# The prompt stays in the worker; handlers here only count and time calls
+			sink.send("callback", ("on_chat_model_start", (None, []), kwargs.get("run_id")))
+
+		def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+			sink.send("callback", ("on_llm_end", (response,), kwargs.get("run_id")))
+
+	return ForwardingCallbackHandler()
+
+
+_worker_teams: Dict[str, Callable[[list, Any], Any]] = {}
+
+
+def _run_job(events, job: Dict[str, Any]) -> None:
+	sink = _EventSink(events, job["id"])
+	sink.send("started", os.getpid())
+	metadata = dict(job["metadata"], metrics={})
+	restore_request_context(metadata)
+	current_team.set(job["team_context"])
+	current_node.set(job["node_context"])
+	current_progress.set(sink if job["progress"] else None)
+
+	configurable = dict(job["configurable"])
+	if job["tool_memo"]:
+		configurable[TOOL_MEMO_KEY] = ToolMemo()
+	budget = configurable.get(BUDGET_KEY)
+	ledger_start = len(budget.ledger) if budget else 0
+	callbacks = []
+	if job["stream"]:
+		callbacks.append(AsyncQueueCallbackHandler(sink))  # type: ignore[arg-type]
+	if job["forward_callbacks"]:
+		callbacks.append(_forwarding_handler(sink))
+	try:
+		result = _worker_teams[job["team"]](job["messages"], {"configurable": configurable, "callbacks": callbacks})
+		outcome = {
+			"result": result,
+			"metrics": metadata["metrics"],
+			"ledger": budget.ledger[ledger_start:] if budget else [],
+			"passage_index": configurable.get(PASSAGE_INDEX_KEY),
+			"page_dedup": configurable.get(DEDUP_KEY),
+		}
+		sink.send("result", pickle.dumps(outcome))
+	except Exception as e:
+		try:
+			error = pickle.dumps(e)
+		except Exception:
+			error = pickle.dumps(RuntimeError(f"{type(e).__name__}: {e}"))
+		sink.send("error", error)
+
+
+def _worker_main(jobs, events, llm_factory: str, threads: int) -> None:
+	"""Build the team graphs once, then run jobs from ``jobs`` on ``threads`` threads until told to stop."""
+	module, _, attr = llm_factory.partition(":")
+	from graph import build_team_runners
+
+	_worker_teams.update(build_team_runners(getattr(importlib.import_module(module), attr)()))
+	events.put((None, "ready", os.getpid()))
+
+	def loop() -> None:
+		while True:
+			job = jobs.get()
+			if job is None:
+				return
+			# A fresh context per job so team/node and request metadata never leak between jobs
+			Context().run(_run_job, events, job)
+
+	workers = [threading.Thread(target=loop, name=f"team-worker-{i}", daemon=True) for i in range(threads)]
+	for worker in workers:
+		worker.start()
+	for worker in workers:
+		worker.join()
+
+
+# --- API process side ----------------------------------------------------------
+
+class _Job:
+	__slots__ = ("future", "context", "stream_handlers", "callbacks", "pid")
+
+	def __init__(self, context: Context, stream_handlers: List[AsyncQueueCallbackHandler], callbacks: List[Any]):
+		self.future: Future = Future()
+		self.context = context
+		self.stream_handlers = stream_handlers
+		self.callbacks = callbacks
+		self.pid: Optional[int] = None
+
+
+def _relay_progress(team: str, node: str, event: str, fields: Dict[str, Any]) -> None:
+	current_team.set(team)
+	current_node.set(node)
+	emit_progress(event, **fields)
+
+
+def _is_count(value: Any) -> bool:
+	return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+# Ratios derived from counters, recomputed after the counters are summed: ratio -> (numerator, denominator)
+_DERIVED_RATIOS = {"cache_hit_ratio": ("cached_tokens", "input_tokens"), "hit_rate": ("hits", "lookups")}
+
+
+def _merge_metrics(metrics: Dict[str, Any]) -> None:
+	"""Fold a worker's metrics into the current request's, summing counters both sides recorded."""
+	existing = get_request_metadata().get("metrics", {})
+	for name, value in metrics.items():
+		before = existing.get(name)
+		if isinstance(value, dict) and isinstance(before, dict):
+			merged = dict(before)
+			for key, v in value.items():
+				if _is_count(v) and _is_count(merged.get(key)) and key not in _DERIVED_RATIOS:
+					merged[key] += v
+				else:
+					merged[key] = v
+			for ratio, (numerator, denominator) in _DERIVED_RATIOS.items():
+				if ratio in merged and merged.get(denominator):
+					merged[ratio] = round(merged.get(numerator, 0) / merged[denominator], 3)
+			value = merged
+		record_metric(name, value)
+
+
+class TeamPool:
+	"""Local pool of worker processes running team subgraphs for the API process.
+
+	Jobs go out over one IPC queue and any idle worker thread picks them up;
+	stream events, progress, model usage and the result come back over
+	another, read by a dispatcher thread that hands them to the originating
+	request's stream queue and callbacks. Add capacity with ``TEAM_WORKERS``
+	and ``TEAM_WORKER_THREADS``. Latency budgets carry their deadline across
+	processes because ``time.monotonic`` is system-wide on Linux.
+	"""
+
+	def __init__(self, workers: int = TEAM_WORKERS, threads: int = TEAM_WORKER_THREADS, llm_factory: str = TEAM_WORKER_LLM):
+		self._mp = multiprocessing.get_context(TEAM_WORKER_START_METHOD)
+		self._jobs_queue = self._mp.Queue()
+		self._events = self._mp.Queue()
+		self._threads = threads
+		self._llm_factory = llm_factory
+		self._jobs: Dict[str, _Job] = {}
+		self._lock = threading.Lock()
+		self._ready = threading.Semaphore(0)
+		self._closed = False
+		self._processes = [self._spawn() for _ in range(workers)]
+		self._dispatcher = threading.Thread(target=self._dispatch, name="team-pool-dispatcher", daemon=True)
+		self._dispatcher.start()
+		logger.info(f"Started team pool: {workers} worker processes x {threads} threads")
+
+	def _spawn(self):
+		process = self._mp.Process(
+			target=_worker_main,
+			args=(self._jobs_queue, self._events, self._llm_factory, self._threads),
+			name="team-worker",
+			daemon=True,
+		)
+		process.start()
+		return process
+
+	def wait_ready(self, timeout: float = 120.0) -> bool:
+		"""Block until every worker has built its team graphs, or ``timeout`` passes."""
+		return all(self._ready.acquire(timeout=timeout) for _ in self._processes)
+
+	def run(self, team: str, messages: list, config: Dict[str, Any]) -> Any:
+		"""Run ``team`` on a worker and return its result; blocks the calling (graph) thread."""
+		configurable = (config or {}).get("configurable") or {}
+		callbacks = (config or {}).get("callbacks") or []
+		handlers = list(getattr(callbacks, "handlers", callbacks))
+		stream_handlers = [h for h in handlers if isinstance(h, AsyncQueueCallbackHandler)]
+		others = [h for h in handlers if not isinstance(h, AsyncQueueCallbackHandler)]
+		job_id = uuid.uuid4().hex
+		job = _Job(copy_context(), stream_handlers, others)
+		with self._lock:
+			if self._closed:
+				raise RuntimeError("Team pool is shut down")
+			self._jobs[job_id] = job
+		self._jobs_queue.put({
+			"id": job_id,
+			"team": team,
+			"messages": list(messages),
+			"configurable": {key: configurable[key] for key in _SHIPPED_KEYS if configurable.get(key) is not None},
+			"tool_memo": TOOL_MEMO_KEY in configurable,
+			"metadata": {k: v for k, v in get_request_metadata().items() if k != "metrics"},
+			"team_context": current_team.get(""),
+			"node_context": current_node.get(""),
+			"progress": current_progress.get() is not None,
+			"stream": bool(stream_handlers),
+			"forward_callbacks": bool(others),
+		})
+		budget = configurable.get(BUDGET_KEY)
+		timeout = budget.remaining() + TEAM_JOB_GRACE_S if budget is not None else TEAM_JOB_TIMEOUT_S
+		try:
+			outcome = job.future.result(timeout=timeout)
+		except FutureTimeout:
+			raise TimeoutError(f"{team} did not finish on a team worker within {timeout:.0f}s") from None
+		finally:
+			with self._lock:
+				self._jobs.pop(job_id, None)
+
+		_merge_metrics(outcome["metrics"])
+		if budget is not None:
+			budget.ledger.extend(outcome["ledger"])
+		index = configurable.get(PASSAGE_INDEX_KEY)
+		if index is not None and outcome["passage_index"] is not None:
+			index.merge(outcome["passage_index"])
+		dedup = configurable.get(DEDUP_KEY)
+		if dedup is not None and outcome["page_dedup"] is not None:
+			dedup.merge(outcome["page_dedup"])
+		return outcome["result"]
+
+	def _dispatch(self) -> None:
+		while True:
+			try:
+				job_id, kind, data = self._events.get(timeout=1.0)
+			except queue.Empty:
+				self._reap()
+				continue
+			except (EOFError, OSError):
+				return
+			if kind == "stop":
+				return
+			if kind == "ready":
+				self._ready.release()
+				continue
+			with self._lock:
+				job = self._jobs.get(job_id)
+			if job is None:
+				continue
+			try:
+				self._deliver(job, kind, data)
+			except Exception as e:
+				logger.warning(f"Failed to relay {kind} event from team worker: {e}")
+
+	def _deliver(self, job: _Job, kind: str, data: Any) -> None:
+		if kind == "started":
+			job.pid = data
+		elif kind == "stream":
+			for handler in job.stream_handlers:
+				if handler.loop is not None:
+					handler.loop.call_soon_threadsafe(handler.queue.put_nowait, data)
+				else:
+					handler.queue.put_nowait(data)
+		elif kind == "progress":
+			job.context.copy().run(_relay_progress, *data)
+		elif kind == "callback":
+			name, args, run_id = data
+			for handler in job.callbacks:
+				method = getattr(handler, name, None)
+				if method is None:
+					continue
+				try:
+					job.context.copy().run(method, *args, run_id=run_id)
+				except NotImplementedError:
+					pass  # LangChain's default for handlers without chat model hooks
+		elif kind == "result":
+			job.future.set_result(pickle.loads(data))
+		elif kind == "error":
+			job.future.set_exception(pickle.loads(data))
+
+	def _reap(self) -> None:
+		"""Fail the jobs of worker processes that died and start replacements."""
+		for i, process in enumerate(self._processes):
+			if process.is_alive() or self._closed:
+				continue
+			logger.error(f"Team worker {process.pid} exited with code {process.exitcode}, restarting it")
+			with self._lock:
+				# Only jobs this worker reported ``started``; queued jobs wait for a live worker. Reaping
+				# runs once the event queue is idle, so a worker killed between taking a job and
+				# reporting it is the only one missed, and the run's timeout covers that
+				lost = [job for job in self._jobs.values() if job.pid == process.pid]
+			for job in lost:
+				if not job.future.done():
+					job.future.set_exception(RuntimeError(f"Team worker {process.pid} exited while running the team"))
+			self._processes[i] = self._spawn()
+
+	def shutdown(self) -> None:
+		with self._lock:
+			self._closed = True
+		for _ in self._processes:
+			self._jobs_queue.put(None)
+		self._events.put((None, "stop", None))
+		for process in self._processes:
+			process.join(timeout=5)
+			if process.is_alive():
+				process.terminate()
+
+
+_pool: Optional[TeamPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_team_pool() -> TeamPool:
+	"""Return the process-wide team pool, starting its workers on first use."""
+	global _pool
+	if _pool is None:
+		with _pool_lock:
+			if _pool is None:
+				_pool = TeamPool()
+	return _pool
+
+
+def shutdown_team_pool() -> None:
+	global _pool
+	with _pool_lock:
+		if _pool is not None:
+			_pool.shutdown()
+			_pool = None
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import uuid
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.tools import BaseTool
+
+logger = logging.getLogger(__name__)
+
+# How an agent gets tool calls out of its model:
+# - native:  provider tool calling, merged by LangChain
+# - adapter: provider tool calling, streamed deltas merged by stream_tool_calls()
+# - text:    no provider tools; the model writes <tool_call> blocks parsed from its text
+# - off:     tools disabled
+TOOL_CALL_MODES = ("native", "adapter", "text", "off")
+
+_TOOL_CALL_RE = re.compile(r"<tool_call>\s*(.*?)\s*</tool_call>", re.DOTALL)
+_OPEN_TAG, _CLOSE_TAG = "<tool_call>", "</tool_call>"
+
+
+def _model_identity(model: Any) -> tuple:
+	base = getattr(model, "openai_api_base", None) or getattr(model, "base_url", None) or ""
+	model_config = getattr(model, "_default_params", {}) or {}
+	name = model_config.get("model") or getattr(model, "model_name", "") or ""
+	return str(base).lower(), str(name).lower()
+
+
+@lru_cache(maxsize=64)
+def _detect_tool_mode(base_url: str, model_name: str, bailian_base: str) -> str:
+	"""Default tool-call mode for a provider/model pair, computed once per model."""
+	is_dashscope = (
+		"dashscope" in bailian_base or
+		"dashscope" in base_url or
+		"aliyun" in base_url or
+		"dashscope" in model_name or
+		"qwen" in model_name or
+		"moonshot" in model_name
+	)
+	# DashScope streams tool-call deltas LangChain cannot merge reliably
+	mode = "adapter" if is_dashscope else "native"
+	logger.info(f"Tool-call mode for {model_name or 'model'} at {base_url or bailian_base}: {mode}")
+	return mode
+
+
+def tool_call_mode(model: Any) -> str:
+	"""Resolve the tool-call mode for ``model``; env overrides win over cached detection."""
+	override = os.getenv("TOOL_CALL_MODE", "").lower()
+	if override in TOOL_CALL_MODES:
+		return override
+	if os.getenv("FORCE_TOOL_CALLS", "").lower() in {"1", "true", "yes"}:
+		return "native"
+	if os.getenv("DISABLE_TOOL_CALLS", "").lower() in {"1", "true", "yes"}:
+		return "off"
+	base_url, model_name = _model_identity(model)
+	return _detect_tool_mode(base_url, model_name, os.getenv("BAILIAN_BASE_URL", "").lower())
+
+
+def _parse_args(raw: Any) -> Dict[str, Any]:
+	if isinstance(raw, dict):
+		return raw
+	try:
+		args = json.loads(raw or "{}")
+		return args if isinstance(args, dict) else {}
+	except (TypeError, ValueError):
+		logger.warning(f"Unparseable tool-call arguments: {str(raw)[:200]}")
+		return {}
+
+
+def stream_tool_calls(bound_model: Any, messages: List[Any]) -> AIMessage:
+	"""Stream a tool-enabled model call, merging tool-call deltas without relying on their index.
+
+	Content tokens still reach the stream callbacks as they arrive. Deltas are
+	matched by index when present, otherwise by id, otherwise to the call in
+	progress; argument fragments that repeat the arguments so far are treated
+	as cumulative rather than appended again.
+	"""
+	content: List[str] = []
+	calls: List[Dict[str, Any]] = []
+	by_index: Dict[int, Dict[str, Any]] = {}
+	for chunk in bound_model.stream(messages):
+		if chunk.content:
+			content.append(str(chunk.content))
+		deltas = getattr(chunk, "tool_call_chunks", None)
+		if deltas is None:
+			# Models without native streaming yield their complete message once
+			deltas = [
+				{"index": None, "id": c.get("id"), "name": c.get("name"), "args": json.dumps(c.get("args", {}))}
+				for c in getattr(chunk, "tool_calls", None) or []
+			]
+		for delta in deltas:
+			index, call_id, name = delta.get("index"), delta.get("id"), delta.get("name")
+			call = by_index.get(index) if index is not None else None
+			if call is None and call_id:
+				call = next((c for c in calls if c["id"] == call_id), None)
+			if call is None and (index is not None or call_id or name or not calls):
+				call = {"id": call_id, "name": name or "", "args": ""}
+				calls.append(call)
+			elif call is None:
+				call = calls[-1]
+			if index is not None:
+				by_index[index] = call
+			if call_id and not call["id"]:
+				call["id"] = call_id
+			if name and not call["name"]:
+				call["name"] = name
+			fragment = delta.get("args") or ""
+			if fragment and call["args"] and fragment.startswith(call["args"]):
+				call["args"] = fragment
+			else:
+				call["args"] += fragment
+	tool_calls = [
+		{"name": c["name"], "args": _parse_args(c["args"]), "id": c["id"] or f"call_{uuid.uuid4().hex[:12]}", "type": "tool_call"}
+		for c in calls if c["name"]
+	]
+	return AIMessage(content="".join(content), tool_calls=tool_calls)
+
+
+def text_protocol_prompt(tools: Iterable[BaseTool]) -> str:
+	"""Instructions for models without provider tool calling."""
+	specs = [
+		{"name": t.name, "description": t.description, "parameters": t.tool_call_schema.model_json_schema().get("properties", {})}
+		for t in tools
+	]
+	return (
+		"You can call these tools:\n"
+		+ json.dumps(specs, ensure_ascii=False)
+		+ "\nTo call a tool, reply with one or more blocks exactly like "
+		'<tool_call>{"name": "tool_name", "arguments": {...}}</tool_call> and nothing after them. '
+		"Tool results are sent back to you as messages starting with 'Tool result'. "
+		"When you have everything you need, reply normally without tool_call blocks."
+	)
+
+
+def parse_text_tool_calls(message: AIMessage) -> AIMessage:
+	"""Extract <tool_call> blocks from a text-protocol reply into structured tool calls."""
+	text = str(message.content or "")
+	tool_calls = []
+	for block in _TOOL_CALL_RE.findall(text):
+		payload = _parse_args(block)
+		if payload.get("name"):
+			tool_calls.append({
+				"name": payload["name"],
+				"args": _parse_args(payload.get("arguments", {})),
+				"id": f"call_{uuid.uuid4().hex[:12]}",
+				"type": "tool_call",
+			})
+	if not tool_calls:
+		return message
+	return AIMessage(content=_TOOL_CALL_RE.sub("", text).strip(), tool_calls=tool_calls)
+
+
+class ToolCallFilter:
+	"""Removes text-protocol ``<tool_call>`` blocks from a reply as it streams.
+
+	Text that could be the start of a tag is held back until the next chunk
+	shows whether it is one, so a tag split across chunks never leaks.
+	"""
+
+	def __init__(self):
+		self._pending = ""
+		self._in_block = False
+
+	def feed(self, text: str) -> str:
+		"""The part of ``text`` (plus earlier held-back text) that is safe to emit now."""
+		pending = self._pending + text
+		out = []
+		while pending:
+			if self._in_block:
+				end = pending.find(_CLOSE_TAG)
+				if end < 0:
+					# Keep only what could be the start of the closing tag
+					pending = pending[-(len(_CLOSE_TAG) - 1):]
+					break
+				pending = pending[end + len(_CLOSE_TAG):]
+				self._in_block = False
+				continue
+			start = pending.find(_OPEN_TAG)
+			if start >= 0:
+				out.append(pending[:start])
+				pending = pending[start + len(_OPEN_TAG):]
+				self._in_block = True
+				continue
+			held = _partial_tag(pending)
+			out.append(pending[:len(pending) - held])
+			pending = pending[len(pending) - held:]
+			break
+		self._pending = pending
+		return "".join(out)
+
+	def flush(self) -> str:
+		"""Held-back text that turned out not to be a tag, at the end of the reply."""
+		rest, self._pending = ("" if self._in_block else self._pending), ""
+		return rest
+
+
+def _partial_tag(text: str) -> int:
+	"""Length of the longest suffix of ``text`` that is a proper prefix of the opening tag."""
+	for size in range(min(len(text), len(_OPEN_TAG) - 1), 0, -1):
+		if _OPEN_TAG.startswith(text[-size:]):
+			return size
+	return 0
+
+
+def to_text_protocol(messages: List[BaseMessage]) -> List[BaseMessage]:
+	"""Rewrite tool-call history as plain messages for providers that reject tool roles."""
+	converted: List[BaseMessage] = []
+	for m in messages:
+		if isinstance(m, ToolMessage):
+			converted.append(HumanMessage(content=f"Tool result ({m.name}):\n{m.content}"))
+		elif isinstance(m, AIMessage) and m.tool_calls:
+			blocks = "".join(
+				f'<tool_call>{json.dumps({"name": c["name"], "arguments": c["args"]}, ensure_ascii=False)}</tool_call>'
+				for c in m.tool_calls
+			)
+			converted.append(AIMessage(content=f"{m.content}{blocks}"))
+		else:
+			converted.append(m)
+	return converted
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import json
+import re
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from .context import record_metric
+
+# Tools whose result depends only on their arguments within a run
+IDEMPOTENT_TOOLS = {"read_document", "scrape_webpages", "search_web"}
+
+# Tools that change a workspace file, invalidating memoized reads of it
+FILE_WRITING_TOOLS = {"write_document", "edit_document", "create_outline"}
+
+CONFIG_KEY = "tool_memo"
+
+# A failed call, or a scraped ``<Document>`` block holding only a fetch error (timeout,
+# exhausted budget); a retry should run again. Page text with an "ERROR:" line does not count
+_FAILED = re.compile(r'\AERROR:|<Document url="[^"]*">\nERROR: [^\n]*\n</Document>')
+
+
+class ToolMemo:
+	"""Per-run memo of idempotent tool results keyed on ``(tool name, canonical args)``.
+
+	Agents often repeat identical calls (re-reading a document, re-scraping a
+	URL); those are answered from the memo and counted as saved calls.
+	Results reporting a failure are not memoized.
+	"""
+
+	def __init__(self):
+		self.saved_calls = 0
+		self._results: Dict[Tuple[str, str], str] = {}
+		self._lock = threading.Lock()
+
+	@staticmethod
+	def _key(name: str, args: Dict[str, Any]) -> Tuple[str, str]:
+		return name, json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)
+
+	def lookup(self, name: str, args: Dict[str, Any]) -> Optional[str]:
+		if name not in IDEMPOTENT_TOOLS:
+			return None
+		with self._lock:
+			result = self._results.get(self._key(name, args))
+			if result is not None:
+				self.saved_calls += 1
+				record_metric("tool_calls_saved", self.saved_calls)
+		return result
+
+	def store(self, name: str, args: Dict[str, Any], result: str) -> None:
+		with self._lock:
+			if name in IDEMPOTENT_TOOLS:
+				if _FAILED.search(result):
+					return
+				self._results[self._key(name, args)] = result
+			elif name in FILE_WRITING_TOOLS:
+				file_name = args.get("file_name")
+				for key in [k for k in self._results if k[0] == "read_document"]:
+					if json.loads(key[1]).get("file_name") == file_name:
+						del self._results[key]
+
+
+def get_tool_memo(config: Optional[Dict[str, Any]]) -> Optional[ToolMemo]:
+	"""Return the tool memo carried in a run config, if any."""
+	return ((config or {}).get("configurable") or {}).get(CONFIG_KEY)
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .context import record_metric
+
+
+def usage_of(message: Any) -> Dict[str, int]:
+	"""Input, output and cached prompt tokens from a model response's usage metadata."""
+	usage = getattr(message, "usage_metadata", None) or {}
+	details = usage.get("input_token_details") or {}
+	return {
+		"input_tokens": usage.get("input_tokens", 0),
+		"output_tokens": usage.get("output_tokens", 0),
+		# OpenAI-compatible providers report prompt-cache hits as prompt_tokens_details.cached_tokens
+		"cached_tokens": details.get("cache_read", 0) or 0,
+	}
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+	"""Totals model calls and tokens of a request into its ``llm_usage`` metric.
+
+	``cached_tokens`` counts prompt tokens the provider served from its prompt
+	cache; ``cache_hit_ratio`` is their share of all input tokens.
+	"""
+
+	run_inline = True
+
+	def __init__(self):
+		self.totals = {"llm_calls": 0, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0}
+		self._lock = threading.Lock()
+
+	def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+		with self._lock:
+			for generations in response.generations:
+				for generation in generations:
+					self.totals["llm_calls"] += 1
+					for key, value in usage_of(getattr(generation, "message", None)).items():
+						self.totals[key] += value
+			report = dict(self.totals)
+		if report["input_tokens"]:
+			report["cache_hit_ratio"] = round(report["cached_tokens"] / report["input_tokens"], 3)
+		record_metric("llm_usage", report)